@@ -0,0 +1,277 @@
+"""
+Load test for bot_logic command handlers.
+
+Drives the real CommandRouter and handlers with synthetic NewMessage events at a fixed rate.
+Telegram is replaced by a client that only counts messages, the server by an in-memory
+httpx.MockTransport behind the real ServerClient, and Redis by fakeredis when it is installed
+(pip install "fakeredis[lua]"); without it conversation state is kept in memory and pages are not cached.
+
+    PYTHONPATH=./ python -m benchmarks.bot_load --rate 500 --duration 10 --users 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+os.makedirs("logs", exist_ok=True)
+
+import httpx
+
+from src.bot_logic import server_client, subscription_cache
+from src.bot_logic.conversation_state import (
+    ConversationStateStore,
+    MemoryConversationStateStore,
+    RedisConversationStateStore,
+)
+from src.bot_logic.handlers.list_handler import ListCommandHandler
+from src.bot_logic.handlers.track_handler import TrackCommandHandler, WAITING_FOR_URL
+from src.bot_logic.handlers.untrack_handler import UntrackCommandHandler
+from src.bot_logic.router import CommandRouter
+from src.bot_logic.server_client import ServerClient
+from src.bot_logic.subscription_cache import SubscriptionPageCache
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+COMMANDS = ("track", "list", "untrack")
+DEFAULT_MIX = "track=1,list=3,untrack=1"
+
+class FakeTelegramClient:
+    def __init__(self):
+        self.sent = 0
+        self.errors = 0
+
+    async def send_message(self, chat_id: int, message: str, **kwargs) -> None:
+        self.sent += 1
+        if message.startswith(("Произошла ошибка", "Сервер временно", "Сервис временно")):
+            self.errors += 1
+
+class FakeServer:
+    """
+    In-memory stand-in for the server's subscription API, with optional latency per request.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.subscriptions: Dict[int, Dict[int, str]] = defaultdict(dict)
+        self.next_id = 1
+
+    def urls(self, user_id: int) -> List[str]:
+        return list(self.subscriptions[user_id].values())
+
+    def _page(self, user_id: int, params: httpx.QueryParams) -> dict:
+        ids = sorted(self.subscriptions[user_id])
+        limit = int(params["limit"])
+        if "before" in params:
+            before = int(params["before"])
+            chunk = [i for i in ids if i < before][-(limit + 1):]
+            has_more = len(chunk) > limit
+            chunk = chunk[-limit:]
+            prev_cursor = chunk[0] if has_more and chunk else None
+            next_cursor = chunk[-1] if chunk else None
+        else:
+            after = int(params.get("after", 0))
+            chunk = [i for i in ids if i > after][:limit + 1]
+            has_more = len(chunk) > limit
+            chunk = chunk[:limit]
+            next_cursor = chunk[-1] if has_more else None
+            prev_cursor = chunk[0] if "after" in params and chunk else None
+        items = [{"id": i, "url": self.subscriptions[user_id][i]} for i in chunk]
+        return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = request.url.path
+        if request.method == "POST" and path == "/api/v1/subscriptions/":
+            body = json.loads(request.content)
+            self.subscriptions[body["user_id"]][self.next_id] = body["url"]
+            self.next_id += 1
+            return httpx.Response(200, json={"status": "ok"})
+
+        user_id = int(path.rsplit("/", 1)[1])
+        if request.method == "DELETE":
+            url = request.url.params["url"]
+            owned = self.subscriptions[user_id]
+            for subscription_id, subscription_url in list(owned.items()):
+                if subscription_url == url:
+                    del owned[subscription_id]
+            # The server's delete endpoint returns no value, which FastAPI serializes as null.
+            return httpx.Response(200, content=b"null", headers={"Content-Type": "application/json"})
+        if "limit" in request.url.params:
+            return httpx.Response(200, json=self._page(user_id, request.url.params))
+        return httpx.Response(200, json=[{"url": url} for url in self.urls(user_id)])
+
+class PassThroughPageCache:
+    async def get_or_load(self, user_id, page, loader):
+        return await loader()
+
+    async def add(self, user_id, subscription):
+        pass
+
+    async def remove(self, user_id, url):
+        pass
+
+def make_event(chat_id: int, text: str) -> SimpleNamespace:
+    return SimpleNamespace(chat_id=chat_id, message=SimpleNamespace(text=text))
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        command, weight = part.split("=")
+        if command not in COMMANDS:
+            raise ValueError(f"Unknown command in mix: {command}. Must be one of {COMMANDS}.")
+        weights[command] = float(weight)
+    return weights
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+class BotLoad:
+    def __init__(self, users: int, server_latency: float, seed: Optional[int], use_redis: bool = True):
+        self.random = random.Random(seed)
+        self.users = users
+        self.telegram = FakeTelegramClient()
+        self.server = FakeServer(latency=server_latency)
+
+        states: ConversationStateStore
+        if use_redis and fakeredis is not None:
+            client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+            states = RedisConversationStateStore(client)
+            page_cache = SubscriptionPageCache(client)
+        else:
+            states = MemoryConversationStateStore()
+            page_cache = PassThroughPageCache()
+        self.backend = "fakeredis" if isinstance(states, RedisConversationStateStore) else "memory"
+
+        # Handlers resolve these through module-level singletons.
+        server_client._server_client = ServerClient(
+            "http://server", transport=httpx.MockTransport(self.server.handle), backoff_factor=0,
+        )
+        subscription_cache._subscription_cache = page_cache
+
+        self.router = CommandRouter(states)
+        track_handler = TrackCommandHandler(self.telegram, states)
+        self.router.add_handler(track_handler)
+        self.router.add_handler(UntrackCommandHandler(self.telegram))
+        self.router.add_handler(ListCommandHandler(self.telegram))
+        self.router.add_state(WAITING_FOR_URL, track_handler.handle_url)
+
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    async def run_command(self, command: str) -> None:
+        user_id = self.random.randrange(1, self.users + 1)
+        started = time.perf_counter()
+        if command == "track":
+            await self.router.dispatch(make_event(user_id, "/track"))
+            url = f"https://github.com/user{user_id}/repo{self.random.randrange(1_000_000)}"
+            await self.router.dispatch(make_event(user_id, url))
+        elif command == "untrack":
+            urls = self.server.urls(user_id)
+            url = self.random.choice(urls) if urls else "https://github.com/missing/repo"
+            await self.router.dispatch(make_event(user_id, f"/untrack {url}"))
+        else:
+            await self.router.dispatch(make_event(user_id, "/list"))
+        self.latencies[command].append(time.perf_counter() - started)
+
+    async def run(self, rate: float, duration: float, mix: Dict[str, float]) -> dict:
+        """
+        Open-loop load: commands start every 1/rate seconds whether or not earlier ones finished,
+        so a slow handler shows up as latency instead of silently lowering the offered rate.
+        """
+        commands, weights = zip(*mix.items())
+        total = int(rate * duration)
+        tasks = []
+        started = time.perf_counter()
+        for i in range(total):
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.run_command(self.random.choices(commands, weights)[0])))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await server_client.close_server_client()
+            subscription_cache._subscription_cache = None
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> dict:
+        result = {"backend": self.backend, "elapsed_seconds": elapsed, "commands": {}}
+        completed = 0
+        for command, latencies in sorted(self.latencies.items()):
+            latencies.sort()
+            completed += len(latencies)
+            result["commands"][command] = {
+                "count": len(latencies),
+                "p50_ms": percentile(latencies, 50) * 1000,
+                "p99_ms": percentile(latencies, 99) * 1000,
+                "max_ms": latencies[-1] * 1000,
+            }
+        result["completed"] = completed
+        result["throughput_per_second"] = completed / elapsed if elapsed else 0.0
+        result["messages_sent"] = self.telegram.sent
+        result["error_replies"] = self.telegram.errors
+        return result
+
+async def run_benchmark(
+    rate: float = 200,
+    duration: float = 5,
+    users: int = 1000,
+    mix: str = DEFAULT_MIX,
+    server_latency_ms: float = 0,
+    seed: Optional[int] = 0,
+    use_redis: bool = True,
+) -> dict:
+    load = BotLoad(users, server_latency_ms / 1000, seed, use_redis=use_redis)
+    return await load.run(rate, duration, parse_mix(mix))
+
+def print_report(result: dict) -> None:
+    print(f"backend: {result['backend']}, elapsed: {result['elapsed_seconds']:.2f}s")
+    print(f"{'command':<10}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for command, stats in result["commands"].items():
+        print(f"{command:<10}{stats['count']:>8}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['max_ms']:>10.2f}")
+    print(f"throughput: {result['throughput_per_second']:.1f} commands/s, "
+          f"messages sent: {result['messages_sent']}, error replies: {result['error_replies']}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test bot_logic command handlers offline.")
+    parser.add_argument("--rate", type=float, default=200, help="commands started per second")
+    parser.add_argument("--duration", type=float, default=5, help="seconds to generate load for")
+    parser.add_argument("--users", type=int, default=1000, help="number of distinct chats")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="relative command weights, e.g. track=1,list=3,untrack=1")
+    parser.add_argument("--server-latency-ms", type=float, default=0, help="simulated server response time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-redis", action="store_true", help="use in-memory state even if fakeredis is installed")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    # Handlers log every command at INFO; keep the log file from dominating the measurement.
+    logging.getLogger().setLevel(logging.WARNING)
+
+    result = asyncio.run(run_benchmark(
+        rate=args.rate,
+        duration=args.duration,
+        users=args.users,
+        mix=args.mix,
+        server_latency_ms=args.server_latency_ms,
+        seed=args.seed,
+        use_redis=not args.no_redis,
+    ))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
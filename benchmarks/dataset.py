@@ -0,0 +1,210 @@
+"""
+Synthetic dataset generator for Postgres.
+
+Bulk-loads users, links, subscriptions and updates into the migrated schema with COPY. Link
+popularity and subscriptions per user both follow a power law, so there are a few links with
+huge fan-out and a few users with thousands of subscriptions. The same seed always produces the
+same rows. Benchmarks and the query-plan tests use it as their data source.
+
+    PYTHONPATH=./ python -m benchmarks.dataset --users 200000 --links 1000000 \\
+        --subscriptions 10000000 --updates 1000000 --seed 42 --truncate
+"""
+import argparse
+import io
+import os
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COPY_CHUNK_ROWS = int(os.getenv("DATASET_COPY_CHUNK_ROWS", 100000))
+TELEGRAM_ID_BASE = 100000
+# Timestamps are drawn from this many minutes before `now`.
+TIMESTAMP_SPAN_MINUTES = 30 * 24 * 60
+
+@dataclass
+class DatasetSpec:
+    users: int = 10000
+    links: int = 10000
+    subscriptions: int = 100000
+    updates: int = 10000
+    seed: int = 0
+    stackoverflow_share: float = 0.4
+    # Larger skew concentrates subscriptions and updates on fewer links.
+    link_skew: float = 3.0
+    # Pareto shape of subscriptions per user; smaller means heavier power users.
+    user_shape: float = 1.5
+
+def database_url() -> str:
+    return (
+        f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}"
+        f"@{os.getenv('DB_HOST', 'db')}:{os.getenv('DB_PORT', '5432')}/{os.getenv('DB_NAME')}"
+    )
+
+def table_random(spec: DatasetSpec, table: str) -> random.Random:
+    # One stream per table, so changing one table's size does not reshuffle the others.
+    return random.Random(f"{spec.seed}:{table}")
+
+def timestamps(now: float) -> list:
+    return [
+        time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - minute * 60))
+        for minute in range(TIMESTAMP_SPAN_MINUTES)
+    ]
+
+def popular_link(rng: random.Random, spec: DatasetSpec) -> int:
+    return 1 + int(spec.links * rng.random() ** spec.link_skew)
+
+def link_url(link_id: int, stackoverflow: bool) -> str:
+    if stackoverflow:
+        return f"https://stackoverflow.com/questions/{link_id}/question-{link_id}"
+    return f"https://github.com/owner{link_id}/repo{link_id}"
+
+def user_rows(spec: DatasetSpec, stamps: list) -> Iterator[str]:
+    for user_id in range(1, spec.users + 1):
+        yield f"{user_id}\t{TELEGRAM_ID_BASE + user_id}\n"
+
+def link_rows(spec: DatasetSpec, stamps: list) -> Iterator[str]:
+    rng = table_random(spec, "links")
+    for link_id in range(1, spec.links + 1):
+        stackoverflow = rng.random() < spec.stackoverflow_share
+        link_type = "stackoverflow" if stackoverflow else "github"
+        # The sweep checks every link at least daily.
+        yield f"{link_id}\t{link_url(link_id, stackoverflow)}\t{link_type}\t{stamps[rng.randrange(1440)]}\n"
+
+def subscriptions_per_user(rng: random.Random, spec: DatasetSpec) -> int:
+    mean_pareto = spec.user_shape / (spec.user_shape - 1)
+    scale = spec.subscriptions / spec.users / mean_pareto
+    return min(spec.links, max(1, round(scale * rng.paretovariate(spec.user_shape))))
+
+def subscription_rows(spec: DatasetSpec, stamps: list) -> Iterator[str]:
+    rng = table_random(spec, "subscriptions")
+    subscription_id = 0
+    for user_id in range(1, spec.users + 1):
+        count = subscriptions_per_user(rng, spec)
+        links = set()
+        # Power users can ask for more distinct links than the skewed draw reaches quickly.
+        for _ in range(count * 4):
+            links.add(popular_link(rng, spec))
+            if len(links) == count:
+                break
+        for link_id in sorted(links):
+            subscription_id += 1
+            yield f"{subscription_id}\t{user_id}\t{link_id}\t{stamps[rng.randrange(len(stamps))]}\n"
+
+def update_rows(spec: DatasetSpec, stamps: list) -> Iterator[str]:
+    rng = table_random(spec, "updates")
+    for update_id in range(1, spec.updates + 1):
+        link_id = popular_link(rng, spec)
+        author = f"user{rng.randrange(100000)}"
+        yield (
+            f"{update_id}\t{link_id}\t{stamps[rng.randrange(len(stamps))]}"
+            f"\tUpdate {update_id}\t{author}\tSynthetic update {update_id} of link {link_id}\n"
+        )
+
+TABLES = (
+    ("users", "user_id, telegram_id", "user_id", user_rows),
+    ("links", "link_id, url, type, last_checked_at", "link_id", link_rows),
+    ("subscriptions", "subscription_id, user_id, link_id, created_at", "subscription_id", subscription_rows),
+    ("updates", "update_id, link_id, created_at, title, user_name, preview", "update_id", update_rows),
+)
+
+def copy_rows(cur, table: str, columns: str, rows: Iterator[str]) -> int:
+    count = 0
+    while True:
+        chunk = io.StringIO()
+        written = 0
+        for row in rows:
+            chunk.write(row)
+            written += 1
+            if written == COPY_CHUNK_ROWS:
+                break
+        if not written:
+            return count
+        chunk.seek(0)
+        cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN", chunk)
+        count += written
+
+def generate(
+    conn,
+    spec: DatasetSpec,
+    truncate: bool = False,
+    progress: Optional[Callable[[str, int, float], None]] = None,
+) -> dict:
+    """
+    Loads the dataset in one transaction and returns the number of rows per table. The tables must
+    be empty unless `truncate` is set. Ids are assigned here, and the sequences are moved past them afterwards.
+    """
+    stamps = timestamps(time.time())
+    counts = {}
+    with conn.cursor() as cur:
+        if truncate:
+            cur.execute("TRUNCATE users, links, subscriptions, updates RESTART IDENTITY CASCADE")
+        # Generated rows reference only generated ids, so foreign key checks and the per-row NOTIFY
+        # trigger are pure overhead. Skipping FK triggers needs superuser; otherwise only NOTIFY is disabled.
+        cur.execute("SELECT rolsuper FROM pg_roles WHERE rolname = current_user")
+        skip_triggers = cur.fetchone()[0]
+        if skip_triggers:
+            cur.execute("SET LOCAL session_replication_role = replica")
+        else:
+            cur.execute("ALTER TABLE subscriptions DISABLE TRIGGER USER")
+        for table, columns, id_column, rows in TABLES:
+            started = time.monotonic()
+            counts[table] = copy_rows(cur, table, columns, rows(spec, stamps))
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', '{id_column}'), GREATEST(MAX({id_column}), 1)) FROM {table}"
+            )
+            if progress:
+                progress(table, counts[table], time.monotonic() - started)
+        if not skip_triggers:
+            cur.execute("ALTER TABLE subscriptions ENABLE TRIGGER USER")
+    conn.commit()
+
+    # Fresh planner statistics, so plans measured right after loading reflect the new sizes.
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE users, links, subscriptions, updates")
+    conn.commit()
+    return counts
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk-load a synthetic dataset with COPY.")
+    parser.add_argument("--dsn", default=None, help="Postgres URL; defaults to the DB_* environment variables")
+    parser.add_argument("--users", type=int, default=DatasetSpec.users)
+    parser.add_argument("--links", type=int, default=DatasetSpec.links)
+    parser.add_argument("--subscriptions", type=int, default=DatasetSpec.subscriptions, help="approximate total")
+    parser.add_argument("--updates", type=int, default=DatasetSpec.updates)
+    parser.add_argument("--seed", type=int, default=DatasetSpec.seed)
+    parser.add_argument("--stackoverflow-share", type=float, default=DatasetSpec.stackoverflow_share)
+    parser.add_argument("--link-skew", type=float, default=DatasetSpec.link_skew)
+    parser.add_argument("--user-shape", type=float, default=DatasetSpec.user_shape)
+    parser.add_argument("--truncate", action="store_true", help="empty the tables before loading")
+    args = parser.parse_args()
+
+    spec = DatasetSpec(
+        users=args.users,
+        links=args.links,
+        subscriptions=args.subscriptions,
+        updates=args.updates,
+        seed=args.seed,
+        stackoverflow_share=args.stackoverflow_share,
+        link_skew=args.link_skew,
+        user_shape=args.user_shape,
+    )
+
+    def report(table: str, count: int, seconds: float) -> None:
+        print(f"{table:<14}{count:>12} rows {seconds:>8.1f}s {count / seconds if seconds else 0:>12.0f} rows/s")
+
+    started = time.monotonic()
+    conn = psycopg2.connect(args.dsn or database_url())
+    try:
+        counts = generate(conn, spec, truncate=args.truncate, progress=report)
+    finally:
+        conn.close()
+    print(f"loaded {sum(counts.values())} rows in {time.monotonic() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
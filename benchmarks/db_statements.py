@@ -0,0 +1,127 @@
+"""
+Microbenchmark of the raw-SQL database services with and without prepared statements.
+
+Calls each hot DatabaseService method many times on one connection, first as plain queries
+(a new cursor and a full parse and plan per call, as before) and then through PreparedStatements,
+and reports per-call latency. Load a dataset first, e.g. with benchmarks.dataset:
+
+    PYTHONPATH=./ python -m benchmarks.dataset --truncate
+    PYTHONPATH=./ python -m benchmarks.db_statements --calls 5000
+"""
+import argparse
+import asyncio
+import datetime
+import inspect
+import json
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+os.makedirs("logs", exist_ok=True)
+
+import psycopg2
+
+from benchmarks.bot_load import percentile
+from benchmarks.dataset import TELEGRAM_ID_BASE, database_url
+from src.db_replicas import ReplicaRouter
+from src.notification_service.database import sql_db as notification_sql_db
+from src.prepared_statements import PreparedStatements
+from src.scrapper.database import sql_db as scrapper_sql_db
+
+MODES = ("plain", "prepared")
+WARMUP_CALLS = 20
+
+def make_service(module, dsn: str, options: Optional[str], prepared: bool):
+    # Bypasses __init__, which connects through the DB_* variables instead of `dsn`.
+    service = object.__new__(module.SqlDatabaseService)
+    service.conn = psycopg2.connect(dsn, options=options) if options else psycopg2.connect(dsn)
+    service.router = ReplicaRouter(())
+    service.replica_conns = {}
+    service.statements = PreparedStatements(module.STATEMENTS, enabled=prepared)
+    return service
+
+def cases(telegram_id: int, link_id: int) -> Dict[str, tuple]:
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=7)
+    return {
+        "subscriptions_page": (scrapper_sql_db, lambda s: s.get_subscriptions_page(telegram_id, 20)),
+        "subscriptions": (scrapper_sql_db, lambda s: s.get_subscriptions(telegram_id)),
+        "links": (scrapper_sql_db, lambda s: s.get_links(0, 100)),
+        "link_updates": (scrapper_sql_db, lambda s: s.get_link_updates(link_id, 20, since)),
+        "subscribers": (notification_sql_db, lambda s: s.get_users_by_link_id(link_id, 0, 500)),
+        "all_subscribers": (notification_sql_db, lambda s: s.get_all_users_by_link_id(link_id, 500)),
+    }
+
+async def call(method: Callable, service) -> None:
+    result = method(service)
+    if inspect.isawaitable(result):
+        await result
+
+async def measure(module, method: Callable, dsn: str, options: Optional[str], prepared: bool, calls: int) -> List[float]:
+    service = make_service(module, dsn, options, prepared)
+    try:
+        for _ in range(WARMUP_CALLS):
+            await call(method, service)
+        latencies = []
+        for _ in range(calls):
+            started = time.perf_counter()
+            await call(method, service)
+            latencies.append(time.perf_counter() - started)
+        return sorted(latencies)
+    finally:
+        service.conn.close()
+
+async def run_benchmark(
+    dsn: Optional[str] = None,
+    options: Optional[str] = None,
+    calls: int = 2000,
+    telegram_id: int = TELEGRAM_ID_BASE + 1,
+    link_id: int = 1,
+) -> dict:
+    dsn = dsn or database_url()
+    result = {"calls": calls, "cases": {}}
+    for name, (module, method) in cases(telegram_id, link_id).items():
+        stats = {}
+        for mode in MODES:
+            latencies = await measure(module, method, dsn, options, mode == "prepared", calls)
+            stats[mode] = {
+                "mean_us": sum(latencies) / len(latencies) * 1e6,
+                "p50_us": percentile(latencies, 50) * 1e6,
+                "p99_us": percentile(latencies, 99) * 1e6,
+            }
+        stats["p50_speedup"] = stats["plain"]["p50_us"] / stats["prepared"]["p50_us"]
+        result["cases"][name] = stats
+    return result
+
+def print_report(result: dict) -> None:
+    print(f"{result['calls']} calls per case and mode")
+    print(f"{'case':<20}{'mode':<10}{'mean us':>10}{'p50 us':>10}{'p99 us':>10}")
+    for name, stats in result["cases"].items():
+        for mode in MODES:
+            row = stats[mode]
+            print(f"{name:<20}{mode:<10}{row['mean_us']:>10.1f}{row['p50_us']:>10.1f}{row['p99_us']:>10.1f}")
+        print(f"{'':<20}{'speedup':<10}{stats['p50_speedup']:>20.2f}x")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare per-call latency of plain and prepared statements.")
+    parser.add_argument("--dsn", default=None, help="Postgres URL; defaults to the DB_* environment variables")
+    parser.add_argument("--options", default=None, help="libpq options, e.g. '-c search_path=myschema'")
+    parser.add_argument("--calls", type=int, default=2000, help="timed calls per case and mode")
+    parser.add_argument("--telegram-id", type=int, default=TELEGRAM_ID_BASE + 1, help="user whose subscriptions are read")
+    parser.add_argument("--link-id", type=int, default=1, help="link whose updates and subscribers are read")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(
+        dsn=args.dsn,
+        options=args.options,
+        calls=args.calls,
+        telegram_id=args.telegram_id,
+        link_id=args.link_id,
+    ))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+if __name__ == "__main__":
+    main()
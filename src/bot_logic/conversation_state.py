@@ -0,0 +1,111 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+from src.bot_logic.redis_pool import get_redis
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "bot.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+CONVERSATION_STATE_TTL_SECONDS = int(os.getenv("CONVERSATION_STATE_TTL_SECONDS", 600))
+CONVERSATION_STATE_MAX_CHATS = int(os.getenv("CONVERSATION_STATE_MAX_CHATS", 10000))
+
+class ConversationStateStore(ABC):
+    """
+    chat_id -> state of a multi-step command (e.g. /track waiting for a URL). States expire
+    after `ttl` seconds so an abandoned conversation does not capture the user's next message forever.
+    """
+
+    @abstractmethod
+    async def get(self, chat_id: int) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def set(self, chat_id: int, state: str) -> None:
+        pass
+
+    @abstractmethod
+    async def clear(self, chat_id: int) -> None:
+        pass
+
+class RedisConversationStateStore(ConversationStateStore):
+    """
+    Shared by all bot replicas, so a conversation can continue on whichever replica gets the next message.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int = CONVERSATION_STATE_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+
+    @staticmethod
+    def key(chat_id: int) -> str:
+        return f"conversation_state:{chat_id}"
+
+    async def get(self, chat_id: int) -> Optional[str]:
+        return await self.client.get(self.key(chat_id))
+
+    async def set(self, chat_id: int, state: str) -> None:
+        await self.client.set(self.key(chat_id), state, ex=self.ttl)
+
+    async def clear(self, chat_id: int) -> None:
+        await self.client.delete(self.key(chat_id))
+
+class MemoryConversationStateStore(ConversationStateStore):
+    """
+    Single-replica store for local runs: bounded LRU with the same TTL semantics as the Redis store.
+    """
+
+    def __init__(self, ttl: int = CONVERSATION_STATE_TTL_SECONDS, max_chats: int = CONVERSATION_STATE_MAX_CHATS):
+        self.ttl = ttl
+        self.max_chats = max_chats
+        self.states: OrderedDict[int, tuple[str, float]] = OrderedDict()
+
+    async def get(self, chat_id: int) -> Optional[str]:
+        entry = self.states.get(chat_id)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self.states[chat_id]
+            return None
+        return entry[0]
+
+    async def set(self, chat_id: int, state: str) -> None:
+        self.states[chat_id] = (state, time.monotonic() + self.ttl)
+        self.states.move_to_end(chat_id)
+        while len(self.states) > self.max_chats:
+            self.states.popitem(last=False)
+
+    async def clear(self, chat_id: int) -> None:
+        self.states.pop(chat_id, None)
+
+def create_conversation_state_store() -> ConversationStateStore:
+    store_type = os.getenv("CONVERSATION_STATE_STORE", "REDIS").upper()
+
+    if store_type == "REDIS":
+        return RedisConversationStateStore(get_redis())
+    elif store_type == "MEMORY":
+        return MemoryConversationStateStore()
+    else:
+        raise ValueError(f"Invalid conversation state store: {store_type}. Must be 'REDIS' or 'MEMORY'.")
+
+_conversation_state_store: Optional[ConversationStateStore] = None
+
+def get_conversation_state_store() -> ConversationStateStore:
+    global _conversation_state_store
+    if _conversation_state_store is None:
+        _conversation_state_store = create_conversation_state_store()
+    return _conversation_state_store
@@ -0,0 +1,53 @@
+from telethon import TelegramClient
+from telethon.events import NewMessage
+import os
+from dotenv import load_dotenv
+import logging
+
+from src.bot_logic.handlers.base_handler import CommandHandler
+from src.bot_logic.server_client import get_server_client, is_fallback
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "bot.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+class DigestCommandHandler(CommandHandler):
+    def __init__(self, client: TelegramClient):
+        super().__init__(client)
+
+    async def execute(self, event: NewMessage.Event):
+        chat_id = event.chat_id
+        parts = event.message.text.split(' ')
+        if len(parts) < 2 or parts[1].lower() not in ("on", "off"):
+            await self.client.send_message(chat_id, "Используйте /digest on или /digest off.")
+            return
+
+        enable = parts[1].lower() == "on"
+        try:
+            server_client = get_server_client()
+            if enable:
+                result = await server_client.enable_digest(chat_id)
+            else:
+                result = await server_client.disable_digest(chat_id)
+            if is_fallback(result):
+                raise RuntimeError(result.get("message"))
+
+            if enable:
+                await self.client.send_message(chat_id, "Режим дайджеста включен: обновления будут приходить одним сообщением.")
+            else:
+                await self.client.send_message(chat_id, "Режим дайджеста выключен.")
+            logger.info(f"Digest mode set to {enable} for user_id={chat_id}")
+
+        except Exception as e:
+            logger.exception("Failed to change digest mode.")
+            await self.client.send_message(chat_id, "Произошла ошибка при изменении режима дайджеста.")
+
+    def pattern(self):
+        return "/digest"
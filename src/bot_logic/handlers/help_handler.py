@@ -16,6 +16,7 @@ class HelpCommandHandler(CommandHandler):
             /track - Добавить подписку на отслеживание
             /untrack - Удалить подписку
             /list - Показать список подписок
+            /digest on|off - Получать обновления одним сообщением-дайджестом
             """,
         )
 
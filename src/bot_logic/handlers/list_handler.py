@@ -1,14 +1,13 @@
-from telethon import TelegramClient
-from telethon.events import NewMessage
+from telethon import TelegramClient, Button
+from telethon.events import NewMessage, CallbackQuery
 import os
+from typing import Optional
 from dotenv import load_dotenv
 import logging
-import requests
-import asyncio
-import redis.asyncio as aioredis
 
 from src.bot_logic.handlers.base_handler import CommandHandler
-from src.bot_logic.server_client import get_server_client
+from src.bot_logic.server_client import get_server_client, is_fallback
+from src.bot_logic.subscription_cache import get_subscription_cache, page_key
 load_dotenv()
 
 LOG_FILE = os.path.join("logs", "bot.log")
@@ -20,51 +19,107 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+LIST_PAGE_SIZE = int(os.getenv("LIST_PAGE_SIZE", 20))
+LIST_CALLBACK_PREFIX = "list"
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def render_page(items: list, first_number: int) -> tuple[str, int]:
+    """
+    Renders as many items as fit into one Telegram message; returns the text and how many were shown.
+    """
+    message = "Вот список ваших подписок:"
+    shown = 0
+    for i, subscription in enumerate(items):
+        line = f"\n{first_number + i}. {subscription['url']}"
+        if shown and len(message) + len(line) > TELEGRAM_MESSAGE_LIMIT:
+            break
+        message += line
+        shown += 1
+    return message, shown
+
 class ListCommandHandler(CommandHandler):
     def __init__(self, client: TelegramClient):
         super().__init__(client)
-        self.redis = aioredis.from_url("redis://redis:6379", decode_responses=True)
+        self.subscription_cache = get_subscription_cache()
+
+    async def load_page(self, chat_id: int, after: Optional[int] = None, before: Optional[int] = None):
+        return await self.subscription_cache.get_or_load(
+            chat_id,
+            page_key(LIST_PAGE_SIZE, after, before),
+            lambda: get_server_client().get_subscriptions_page(chat_id, LIST_PAGE_SIZE, after=after, before=before),
+        )
+
+    def build_message(self, page: dict, first_number: int):
+        items = page["items"]
+        message, shown = render_page(items, first_number)
+        next_cursor = page["next_cursor"]
+        if shown < len(items):
+            next_cursor = items[shown - 1]["id"]
+
+        buttons = []
+        if page["prev_cursor"] is not None:
+            buttons.append(Button.inline("◀ Назад", data=f"{LIST_CALLBACK_PREFIX}:b:{page['prev_cursor']}:{first_number}"))
+        if next_cursor is not None:
+            buttons.append(Button.inline("Далее ▶", data=f"{LIST_CALLBACK_PREFIX}:a:{next_cursor}:{first_number + shown}"))
+        return message, [buttons] if buttons else None
 
     async def execute(self, event: NewMessage.Event):
         chat_id = event.chat_id
-        redis_key = f"user_subscriptions:{chat_id}"
-        server_client = get_server_client()
 
         try:
-            cached = await self.redis.get(redis_key)
-            if cached:
-                await self.client.send_message(chat_id, f"Вот список ваших подписок (из кэша):\n{cached}")
-                logger.info(f"Returned cached subscriptions for user_id={chat_id}")
-                return
-
-            try:
-                subscriptions = await asyncio.to_thread(server_client.get_subscriptions, chat_id)
-            except requests.exceptions.HTTPError as http_err:
-                if http_err.response.status_code == 404:
-                    await self.client.send_message(chat_id, "У вас нет подписок.")
-                    return
-                else:
-                    logger.error(f"HTTP error: {http_err}")
-                    await self.client.send_message(chat_id, "Ошибка при получении данных с сервера.")
-                    return
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Request failed: {e}")
+            page = await self.load_page(chat_id)
+            if is_fallback(page):
+                logger.error(f"Failed to get subscriptions for user_id={chat_id}: {page['message']}")
                 await self.client.send_message(chat_id, "Сервер временно недоступен. Попробуйте позже.")
                 return
 
-            if not subscriptions:
+            if not page["items"]:
                 await self.client.send_message(chat_id, "У вас нет подписок.")
                 return
 
-            message = "\n".join(f"{i+1}. {s['url']}" for i, s in enumerate(subscriptions))
-            await self.client.send_message(chat_id, f"Вот список ваших подписок:\n{message}")
-
-            await self.redis.set(redis_key, message, ex=300)
-            logger.info(f"Cached subscriptions for user_id={chat_id}")
+            message, buttons = self.build_message(page, 1)
+            await self.client.send_message(chat_id, message, buttons=buttons)
 
         except Exception as e:
             logger.exception("Ошибка при обработке команды /list")
             await self.client.send_message(chat_id, "Произошла ошибка при обработке запроса.")
 
+    async def handle_callback(self, event: CallbackQuery.Event):
+        """
+        Handles the "next"/"prev" buttons. Callback data is list:<a|b>:<cursor>:<number>, where <number>
+        is the position of the first item of the requested page (after) or of the current page (before).
+        """
+        chat_id = event.chat_id
+
+        try:
+            _, direction, cursor, number = event.data.decode().split(":")
+            cursor, number = int(cursor), int(number)
+        except ValueError:
+            await event.answer()
+            return
+
+        try:
+            if direction == "a":
+                page = await self.load_page(chat_id, after=cursor)
+            else:
+                page = await self.load_page(chat_id, before=cursor)
+            if is_fallback(page):
+                logger.error(f"Failed to get subscriptions for user_id={chat_id}: {page['message']}")
+                await event.answer("Сервер временно недоступен. Попробуйте позже.")
+                return
+
+            if not page["items"]:
+                await event.answer("Подписок больше нет.")
+                return
+
+            first_number = number if direction == "a" else max(1, number - len(page["items"]))
+            message, buttons = self.build_message(page, first_number)
+            await event.answer()
+            await event.edit(message, buttons=buttons)
+
+        except Exception as e:
+            logger.exception("Ошибка при переключении страницы /list")
+            await event.answer("Произошла ошибка при обработке запроса.")
+
     def pattern(self):
-        return "/list"
\ No newline at end of file
+        return "/list"
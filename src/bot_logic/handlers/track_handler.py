@@ -2,14 +2,15 @@ import asyncio
 import logging
 import os
 import json
-import redis.asyncio as redis
+from redis.exceptions import RedisError
 
-import requests
-from telethon import TelegramClient, events
+from telethon import TelegramClient
 from telethon.events import NewMessage
 
 from src.bot_logic.handlers.base_handler import CommandHandler
-from src.bot_logic.server_client import get_server_client
+from src.bot_logic.server_client import get_server_client, is_fallback
+from src.bot_logic.subscription_cache import get_subscription_cache
+from src.bot_logic.conversation_state import ConversationStateStore, get_conversation_state_store
 
 from dotenv import load_dotenv
 
@@ -24,21 +25,23 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+WAITING_FOR_URL = "waiting_for_url"
+
 class TrackCommandHandler(CommandHandler):
-    def __init__(self, client: TelegramClient):
+    def __init__(self, client: TelegramClient, conversation_states: ConversationStateStore = None):
         super().__init__(client)
-        self.conversation_states = {}
-        self.redis = redis.Redis(
-            host=os.getenv("REDIS_HOST", "redis"),
-            port=int(os.getenv("REDIS_PORT", "6379")),
-            decode_responses=True
-        )
+        self.conversation_states = conversation_states or get_conversation_state_store()
+        self.subscription_cache = get_subscription_cache()
 
     async def execute(self, event: NewMessage.Event):
         chat_id = event.chat_id
-        self.conversation_states[chat_id] = "waiting_for_url"
+        try:
+            await self.conversation_states.set(chat_id, WAITING_FOR_URL)
+        except RedisError as e:
+            logger.error(f"Failed to save conversation state for chat_id={chat_id}: {e}")
+            await self.client.send_message(chat_id, "Сервис временно недоступен. Попробуйте позже.")
+            return
         await self.client.send_message(chat_id, "Пожалуйста, введите URL для отслеживания:")
-        raise events.StopPropagation
 
     def pattern(self):
         return "/track"
@@ -46,22 +49,30 @@ class TrackCommandHandler(CommandHandler):
     async def handle_url(self, event: NewMessage.Event):
         chat_id = event.chat_id
         url = event.message.text
+        await self.clear_state(chat_id)
 
         if not url:
             await self.client.send_message(chat_id, "Вы должны ввести URL.")
-            self.conversation_states.pop(chat_id, None)
             return
 
         try:
-            server_client = get_server_client()
-            result = await asyncio.to_thread(server_client.create_subscription, url, chat_id)
+            result = await get_server_client().create_subscription(url, chat_id)
+            if is_fallback(result):
+                raise RuntimeError(result["message"])
             await self.client.send_message(chat_id, "URL успешно добавлен для отслеживания!")
             logger.info(f"Subscription created: {result}")
 
-            await self.redis.delete(f"user_subscriptions:{chat_id}")
+            try:
+                await self.subscription_cache.add(chat_id, result.get("subscription"))
+            except RedisError as e:
+                logger.warning(f"Failed to update subscription cache for user_id={chat_id}: {e}")
 
         except Exception as e:
             logger.exception("Failed to send URL to server.")
             await self.client.send_message(chat_id, f"Произошла ошибка при отправке URL.")
-        finally:
-            self.conversation_states.pop(chat_id, None)
\ No newline at end of file
+
+    async def clear_state(self, chat_id: int):
+        try:
+            await self.conversation_states.clear(chat_id)
+        except RedisError as e:
+            logger.warning(f"Failed to clear conversation state for chat_id={chat_id}: {e}")
\ No newline at end of file
@@ -3,12 +3,11 @@ from telethon.events import NewMessage
 import os
 from dotenv import load_dotenv
 import logging
-import requests
-import asyncio
-import redis.asyncio as redis
+from redis.exceptions import RedisError
 
 from src.bot_logic.handlers.base_handler import CommandHandler
-from src.bot_logic.server_client import get_server_client
+from src.bot_logic.server_client import get_server_client, is_fallback
+from src.bot_logic.subscription_cache import get_subscription_cache
 
 load_dotenv()
 
@@ -24,11 +23,7 @@ logger = logging.getLogger(__name__)
 class UntrackCommandHandler(CommandHandler):
     def __init__(self, client: TelegramClient):
         super().__init__(client)
-        self.redis = redis.Redis(
-            host=os.getenv("REDIS_HOST", "redis"),
-            port=int(os.getenv("REDIS_PORT", "6379")),
-            decode_responses=True
-        )
+        self.subscription_cache = get_subscription_cache()
 
     async def execute(self, event: NewMessage.Event):
         chat_id = event.chat_id
@@ -41,11 +36,15 @@ class UntrackCommandHandler(CommandHandler):
         logger.info(f"Get untrack url: {url}")
 
         try:
-            server_client = get_server_client()
-            await asyncio.to_thread(server_client.delete_subscription, url, chat_id)
+            result = await get_server_client().delete_subscription(url, chat_id)
+            if is_fallback(result):
+                raise RuntimeError(result["message"])
             await self.client.send_message(chat_id, "URL успешно удален!")
             logger.info(f"Subscription deleted: user_id={chat_id}, url={url}")
-            await self.redis.delete(f"user_subscriptions:{chat_id}")
+            try:
+                await self.subscription_cache.remove(chat_id, url)
+            except RedisError as e:
+                logger.warning(f"Failed to update subscription cache for user_id={chat_id}: {e}")
 
         except Exception as e:
             logger.exception("Failed to delete subscription.")
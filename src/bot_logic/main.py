@@ -10,13 +10,19 @@ import requests
 
 from src.bot_logic.handlers import chat_id_cmd_handler
 from src.settings import TGBotSettings
+from src.peer_cache import PeerCache, create_peer_store
+from src.bot_logic.server_client import get_server_client, close_server_client
+from src.bot_logic.redis_pool import close_redis
+from src.bot_logic.router import CommandRouter
+from src.bot_logic.conversation_state import get_conversation_state_store
 
 from src.bot_logic.handlers.base_handler import CommandHandler
 from src.bot_logic.handlers.start_handler import StartCommandHandler
 from src.bot_logic.handlers.help_handler import HelpCommandHandler
-from src.bot_logic.handlers.track_handler import TrackCommandHandler
+from src.bot_logic.handlers.track_handler import TrackCommandHandler, WAITING_FOR_URL
 from src.bot_logic.handlers.untrack_handler import UntrackCommandHandler
-from src.bot_logic.handlers.list_handler import ListCommandHandler
+from src.bot_logic.handlers.list_handler import ListCommandHandler, LIST_CALLBACK_PREFIX
+from src.bot_logic.handlers.digest_handler import DigestCommandHandler
 
 load_dotenv()
 
@@ -35,43 +41,40 @@ client = TelegramClient("bot_session", settings.api_id, settings.api_hash).start
     bot_token=settings.token,
 )
 
+peer_cache = PeerCache(create_peer_store())
+
 async def register_handlers():
-    start_handler = StartCommandHandler(client)
-    help_handler = HelpCommandHandler(client)
-    track_handler = TrackCommandHandler(client)
-    untrack_handler = UntrackCommandHandler(client)
+    conversation_states = get_conversation_state_store()
+    router = CommandRouter(conversation_states)
+    track_handler = TrackCommandHandler(client, conversation_states)
     list_handler = ListCommandHandler(client)
 
+    router.add_command("/chat_id", chat_id_cmd_handler)
+    router.add_handler(StartCommandHandler(client))
+    router.add_handler(HelpCommandHandler(client))
+    router.add_handler(track_handler)
+    router.add_handler(UntrackCommandHandler(client))
+    router.add_handler(list_handler)
+    router.add_handler(DigestCommandHandler(client))
+    router.add_state(WAITING_FOR_URL, track_handler.handle_url)
+    router.add_button(LIST_CALLBACK_PREFIX, list_handler.handle_callback)
+
+    await peer_cache.warm()
     client.add_event_handler(
-        chat_id_cmd_handler,
-        events.NewMessage(pattern="/chat_id"),
-    )
-    client.add_event_handler(
-        start_handler.execute,
-        events.NewMessage(pattern=start_handler.pattern()),
-    )
-    client.add_event_handler(
-        help_handler.execute,
-        events.NewMessage(pattern=help_handler.pattern()),
-    )
-    client.add_event_handler(
-        track_handler.execute,
-        events.NewMessage(pattern=track_handler.pattern()),
-    )
-    client.add_event_handler(
-        track_handler.handle_url,
-        events.NewMessage(func=lambda e: track_handler.conversation_states.get(e.chat_id) == "waiting_for_url")
+        peer_cache.remember_sender,
+        events.NewMessage(incoming=True),
     )
     client.add_event_handler(
-        untrack_handler.execute,
-        events.NewMessage(pattern=untrack_handler.pattern()),
+        router.dispatch,
+        events.NewMessage(incoming=True),
     )
     client.add_event_handler(
-        list_handler.execute,
-        events.NewMessage(pattern=list_handler.pattern()),
+        router.dispatch_button,
+        events.CallbackQuery(),
     )
 
 async def main() -> None:
+    get_server_client()
     await register_handlers()
     while True:
         try:
@@ -95,5 +98,7 @@ try:
                 extra={"exc": exc},
             )
 finally:
+    client.loop.run_until_complete(close_server_client())
+    client.loop.run_until_complete(close_redis())
     client.disconnect()
     logger.info("Bot stopped")
\ No newline at end of file
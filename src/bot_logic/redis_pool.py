@@ -0,0 +1,33 @@
+import os
+from typing import Optional
+
+import redis.asyncio as redis
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+_redis: Optional[redis.Redis] = None
+
+def get_redis() -> redis.Redis:
+    """
+    Returns the bot-wide Redis client; all handlers share its connection pool.
+    """
+    global _redis
+    if _redis is None:
+        pool = redis.ConnectionPool(
+            host=os.getenv("REDIS_HOST", "redis"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            socket_timeout=float(os.getenv("REDIS_TIMEOUT", 0.5)),
+            max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=True,
+        )
+        _redis = redis.Redis(connection_pool=pool)
+    return _redis
+
+async def close_redis() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
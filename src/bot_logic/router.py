@@ -0,0 +1,96 @@
+import logging
+import os
+from typing import Awaitable, Callable, Dict, Optional
+
+from telethon.events import NewMessage, CallbackQuery
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+
+from src.bot_logic.handlers.base_handler import CommandHandler
+from src.bot_logic.conversation_state import ConversationStateStore
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "bot.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+Callback = Callable[[NewMessage.Event], Awaitable[None]]
+
+def command_token(text: str) -> Optional[str]:
+    """
+    "/track@my_bot https://..." -> "/track"; None for messages that are not commands.
+    """
+    if not text or not text.startswith("/"):
+        return None
+    return text.split(maxsplit=1)[0].split("@", 1)[0].lower()
+
+class CommandRouter:
+    """
+    Single Telethon handler for all incoming messages. Commands are dispatched by a dict lookup
+    on the first token; other messages go to the callback registered for the chat's conversation state.
+    Inline button presses are dispatched the same way on the prefix of their data ("list:..." -> "list").
+    """
+
+    def __init__(self, states: ConversationStateStore):
+        self.states = states
+        self.commands: Dict[str, Callback] = {}
+        self.state_callbacks: Dict[str, Callback] = {}
+        self.button_callbacks: Dict[str, Callable[[CallbackQuery.Event], Awaitable[None]]] = {}
+
+    def add_command(self, command: str, callback: Callback) -> None:
+        if command in self.commands:
+            raise ValueError(f"Command {command} is already registered")
+        self.commands[command] = callback
+
+    def add_handler(self, handler: CommandHandler) -> None:
+        self.add_command(handler.pattern(), handler.execute)
+
+    def add_state(self, state: str, callback: Callback) -> None:
+        self.state_callbacks[state] = callback
+
+    def add_button(self, prefix: str, callback: Callable[[CallbackQuery.Event], Awaitable[None]]) -> None:
+        if prefix in self.button_callbacks:
+            raise ValueError(f"Button prefix {prefix} is already registered")
+        self.button_callbacks[prefix] = callback
+
+    async def dispatch_button(self, event: CallbackQuery.Event) -> None:
+        prefix = event.data.split(b":", 1)[0].decode(errors="replace")
+        callback = self.button_callbacks.get(prefix)
+        if callback is None:
+            await event.answer()
+            return
+        await callback(event)
+
+    async def dispatch(self, event: NewMessage.Event) -> None:
+        chat_id = event.chat_id
+        token = command_token(event.message.text)
+
+        if token is not None:
+            callback = self.commands.get(token)
+            if callback is None:
+                return
+            # A new command abandons whatever the chat was in the middle of.
+            if self.state_callbacks:
+                try:
+                    await self.states.clear(chat_id)
+                except RedisError as e:
+                    logger.warning(f"Failed to clear conversation state for chat_id={chat_id}: {e}")
+            await callback(event)
+            return
+
+        if not self.state_callbacks:
+            return
+        try:
+            state = await self.states.get(chat_id)
+        except RedisError as e:
+            logger.warning(f"Failed to read conversation state for chat_id={chat_id}: {e}")
+            return
+        callback = self.state_callbacks.get(state) if state is not None else None
+        if callback is not None:
+            await callback(event)
@@ -1,15 +1,16 @@
-import requests
-from requests.exceptions import RequestException
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import logging
 import os
-import pybreaker
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
 from dotenv import load_dotenv
 
+from src.http_client import AsyncBaseHTTPClient
+
 load_dotenv()
 
-LOG_FILE = os.path.join("logs", "server.log")
+LOG_FILE = os.path.join("logs", "bot.log")
 
 logging.basicConfig(
     level=logging.INFO,
@@ -18,121 +19,103 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def get_server_client():
-    return ServerClient(os.getenv("SERVER_URL", "http://server:8000"))
-
-class BaseHTTPClient:
-    def __init__(
-        self,
-        base_url: str,
-        timeout: float = 3.0,
-        retries: int = 3,
-        backoff_factor: float = 0.5
-    ):
-        self.base_url = base_url
-        self.timeout = timeout
-
-        retry_strategy = Retry(
-            total=retries,
-            backoff_factor=backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST", "PUT", "DELETE"],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-
-        self.session = requests.Session()
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-
-        self.breaker = pybreaker.CircuitBreaker(
-            fail_max=1,
-            reset_timeout=1,
-            exclude=["ValueError"]
+SERVER_URL = os.getenv("SERVER_URL", "http://server:8000")
+SERVER_MAX_CONNECTIONS = int(os.getenv("SERVER_MAX_CONNECTIONS", 100))
+SERVER_MAX_KEEPALIVE = int(os.getenv("SERVER_MAX_KEEPALIVE", 20))
+SERVER_ETAG_CACHE_SIZE = int(os.getenv("SERVER_ETAG_CACHE_SIZE", 10000))
+
+SERVER_TIMEOUTS = {
+    "create": float(os.getenv("SERVER_CREATE_TIMEOUT", 5.0)),
+    "delete": float(os.getenv("SERVER_DELETE_TIMEOUT", 3.0)),
+    "list": float(os.getenv("SERVER_LIST_TIMEOUT", 2.0)),
+    "digest": float(os.getenv("SERVER_DIGEST_TIMEOUT", 2.0)),
+}
+
+def is_fallback(result) -> bool:
+    return isinstance(result, dict) and result.get("status") == "fallback"
+
+class ServerClient(AsyncBaseHTTPClient):
+    def __init__(self, base_url: str, **kwargs):
+        kwargs.setdefault("max_connections", SERVER_MAX_CONNECTIONS)
+        kwargs.setdefault("max_keepalive_connections", SERVER_MAX_KEEPALIVE)
+        super().__init__(base_url, **kwargs)
+        # user_id -> {page: (etag, body)}; page is None for the full list.
+        self.etags: OrderedDict[int, dict] = OrderedDict()
+
+    def _parse_subscriptions(self, user_id: int, page, response: httpx.Response):
+        cached = self.etags.get(user_id, {}).get(page)
+        if response.status_code == 304 and cached is not None:
+            self.etags.move_to_end(user_id)
+            return cached[1]
+
+        subscriptions = self._handle_response(response)
+        etag = response.headers.get("ETag")
+        if etag and not is_fallback(subscriptions):
+            self.etags.setdefault(user_id, {})[page] = (etag, subscriptions)
+            self.etags.move_to_end(user_id)
+            while len(self.etags) > SERVER_ETAG_CACHE_SIZE:
+                self.etags.popitem(last=False)
+        return subscriptions
+
+    async def _get_subscriptions(self, user_id: int, page=None, params: dict = None):
+        path = f"/api/v1/subscriptions/{user_id}"
+        cached = self.etags.get(user_id, {}).get(page)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        return await self.request(
+            "GET",
+            path,
+            timeout=SERVER_TIMEOUTS["list"],
+            parse=lambda response: self._parse_subscriptions(user_id, page, response),
+            headers=headers,
+            params=params,
         )
 
-    def _build_url(self, path: str) -> str:
-        return f"{self.base_url}{path}"
-
-    def _handle_response(self, response: requests.Response) -> dict:
-        try:
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as err:
-            logger.error(f"HTTP error: {err}")
-            raise
-        except requests.exceptions.JSONDecodeError as err:
-            logger.error(f"Json decode error: {err}")
-            raise
-
-    def _fallback(self, method: str, path: str, **kwargs) -> dict:
-        logger.warning(f"Fallback triggered for {method} {path}. Returning default response.")
-        return {"status": "fallback", "message": f"{method} {path} failed"}
-
-    def get(self, path: str, params: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.get(url, params=params, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"GET request failed: {err}")
-            return self._fallback("GET", path)
-
-    def post(self, path: str, json: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.post(url, json=json, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"POST request failed: {err}")
-            return self._fallback("POST", path)
-
-    def put(self, path: str, json: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.put(url, json=json, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"PUT request failed: {err}")
-            return self._fallback("PUT", path)
-
-    def delete(self, path: str, params: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.delete(url, params=params, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"DELETE request failed: {err}")
-            return self._fallback("DELETE", path)
-
-class ServerClient(BaseHTTPClient):
-    def __init__(self, base_url: str):
-        super().__init__(base_url)
-
-    def get_subscriptions(self, user_id: int):
-        path = f"/api/v1/subscriptions/{user_id}"
-        return self.get(path)
-    
-    def create_subscription(self, url: str, user_id: int):
+    async def get_subscriptions(self, user_id: int):
+        return await self._get_subscriptions(user_id)
+
+    async def get_subscriptions_page(self, user_id: int, limit: int, after: int = None, before: int = None):
+        """
+        Returns {"items", "next_cursor", "prev_cursor"}; pass a cursor back as `after` or `before`.
+        """
+        params = {"limit": limit}
+        if after is not None:
+            params["after"] = after
+        if before is not None:
+            params["before"] = before
+        return await self._get_subscriptions(user_id, (limit, after, before), params)
+
+    async def create_subscription(self, url: str, user_id: int):
         path = f"/api/v1/subscriptions/"
         payload = {"url": url, "user_id": user_id}
-        return self.post(path, json=payload)
-    
-    def delete_subscription(self, url: str, user_id: int):
-        path = f"/api/v1/subscriptions/{user_id}?url={url}"
-        return self.delete(path)
\ No newline at end of file
+        self.etags.pop(user_id, None)
+        return await self.post(path, json=payload, timeout=SERVER_TIMEOUTS["create"])
+
+    async def delete_subscription(self, url: str, user_id: int):
+        path = f"/api/v1/subscriptions/{user_id}"
+        self.etags.pop(user_id, None)
+        return await self.delete(path, params={"url": url}, timeout=SERVER_TIMEOUTS["delete"])
+
+    async def enable_digest(self, user_id: int):
+        path = f"/api/v1/digest/{user_id}"
+        return await self.put(path, timeout=SERVER_TIMEOUTS["digest"])
+
+    async def disable_digest(self, user_id: int):
+        path = f"/api/v1/digest/{user_id}"
+        return await self.delete(path, timeout=SERVER_TIMEOUTS["digest"])
+
+_server_client: Optional[ServerClient] = None
+
+def get_server_client() -> ServerClient:
+    """
+    Returns the bot-wide client; it is created on first use at startup and shared by all handlers.
+    """
+    global _server_client
+    if _server_client is None:
+        _server_client = ServerClient(SERVER_URL)
+    return _server_client
+
+async def close_server_client() -> None:
+    global _server_client
+    if _server_client is not None:
+        await _server_client.aclose()
+        _server_client = None
@@ -0,0 +1,237 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError, WatchError
+from dotenv import load_dotenv
+
+from src.bot_logic.redis_pool import get_redis
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "bot.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTION_CACHE_TTL_SECONDS = int(os.getenv("SUBSCRIPTION_CACHE_TTL_SECONDS", 3600))
+SUBSCRIPTION_LOAD_LOCK_SECONDS = float(os.getenv("SUBSCRIPTION_LOAD_LOCK_SECONDS", 5))
+SUBSCRIPTION_LOAD_WAIT_SECONDS = float(os.getenv("SUBSCRIPTION_LOAD_WAIT_SECONDS", 1))
+SUBSCRIPTION_UPDATE_ATTEMPTS = int(os.getenv("SUBSCRIPTION_UPDATE_ATTEMPTS", 3))
+
+# Stores a page only if no track/untrack happened since the loader read the version.
+STORE_SCRIPT = """
+local current = redis.call('GET', KEYS[2]) or '0'
+if current ~= ARGV[1] then
+    return 0
+end
+redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+def page_key(limit: int, after: Optional[int] = None, before: Optional[int] = None) -> str:
+    return f"{limit}:{'' if after is None else after}:{'' if before is None else before}"
+
+def is_page(value) -> bool:
+    return isinstance(value, dict) and "items" in value
+
+class SubscriptionPageCache:
+    """
+    Per-user pages of the subscription list kept in a Redis hash (page key -> page JSON).
+
+    Pages are keyset ranges of subscription ids, so a track or untrack is written into the
+    cached pages instead of invalidating them. A new subscription gets the highest id and is
+    appended to the pages that reach the end of the list, unless that would overflow the page,
+    which is then dropped. A removed one is deleted from the pages that list it; the cursors of
+    the other items stay valid.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int = SUBSCRIPTION_CACHE_TTL_SECONDS):
+        self.client = client
+        self.ttl = ttl
+        self.in_flight: dict[tuple[int, str], asyncio.Future] = {}
+
+    @staticmethod
+    def key(user_id: int) -> str:
+        return f"user_subscriptions:{user_id}"
+
+    @staticmethod
+    def version_key(user_id: int) -> str:
+        return f"user_subscriptions_version:{user_id}"
+
+    @staticmethod
+    def lock_key(user_id: int, page: str) -> str:
+        return f"user_subscriptions_lock:{user_id}:{page}"
+
+    async def get(self, user_id: int, page: str) -> Optional[dict]:
+        value = await self.client.hget(self.key(user_id), page)
+        return json.loads(value) if value is not None else None
+
+    async def store(self, user_id: int, page: str, value: dict, version: str) -> bool:
+        return bool(await self.client.eval(
+            STORE_SCRIPT, 2, self.key(user_id), self.version_key(user_id),
+            version, self.ttl, page, json.dumps(value),
+        ))
+
+    async def add(self, user_id: int, subscription: Optional[dict]) -> None:
+        """
+        `subscription` is the created item as the server returns it; without its id the pages
+        reaching the end of the list are dropped instead.
+        """
+        fields = ("id", "url", "type", "created_at")
+        item = None
+        if isinstance(subscription, dict) and all(field in subscription for field in fields):
+            item = {field: subscription[field] for field in fields}
+
+        def apply(page: str, value: dict) -> Optional[dict]:
+            items = value["items"]
+            if value["next_cursor"] is not None:
+                return value
+            if item is None or len(items) >= int(page.split(":")[0]) or (items and items[-1]["id"] >= item["id"]):
+                return None
+            if not items and value["prev_cursor"] is not None:
+                # An empty page past the start points back at its own first item.
+                value["prev_cursor"] = item["id"]
+            items.append(item)
+            return value
+
+        await self._update_pages(user_id, apply)
+
+    async def remove(self, user_id: int, url: str) -> None:
+        def apply(page: str, value: dict) -> Optional[dict]:
+            items = [item for item in value["items"] if item["url"] != url]
+            if not items and (value["next_cursor"] is not None or value["prev_cursor"] is not None):
+                # Would render as an empty page between others; let the next /list reload it.
+                return None
+            value["items"] = items
+            return value
+
+        await self._update_pages(user_id, apply)
+
+    async def _update_pages(self, user_id: int, apply: Callable[[str, dict], Optional[dict]]) -> None:
+        """
+        Rewrites every cached page of the user with apply(page, value), which returns the new
+        value or None to drop the page. Concurrent changes retry; if they keep conflicting,
+        all pages of the user are dropped.
+        """
+        # The version goes first: a load that started before the change can no longer store its
+        # page, and any page it stored before the bump is seen by the HGETALL below.
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.incr(self.version_key(user_id))
+            pipe.expire(self.version_key(user_id), self.ttl)
+            await pipe.execute()
+        key = self.key(user_id)
+        for _ in range(SUBSCRIPTION_UPDATE_ATTEMPTS):
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(key)
+                    pages = await pipe.hgetall(key)
+                    changed, stale = {}, []
+                    for page, raw in pages.items():
+                        # apply gets its own copy, since it may edit the page in place.
+                        value = json.loads(raw)
+                        updated = apply(page, json.loads(raw))
+                        if updated is None:
+                            stale.append(page)
+                        elif updated != value:
+                            changed[page] = json.dumps(updated)
+                    if not changed and not stale:
+                        return
+                    pipe.multi()
+                    if changed:
+                        pipe.hset(key, mapping=changed)
+                    if stale:
+                        pipe.hdel(key, *stale)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        logger.info(f"Subscription pages of user_id={user_id} kept changing, dropping them")
+        await self.client.delete(key)
+
+    async def get_or_load(self, user_id: int, page: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        """
+        Returns the cached page, loading it on a miss. Concurrent misses in this process share one
+        load, and a Redis lock makes other replicas wait for that load instead of repeating it.
+        """
+        try:
+            cached = await self.get(user_id, page)
+        except RedisError as e:
+            logger.warning(f"Subscription cache unavailable, loading directly: {e}")
+            return await loader()
+        if cached is not None:
+            return cached
+
+        key = (user_id, page)
+        future = self.in_flight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            result = await self._load(user_id, page, loader)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    async def _load(self, user_id: int, page: str, loader: Callable[[], Awaitable[dict]]) -> dict:
+        locked = False
+        try:
+            locked = await self.client.set(self.lock_key(user_id, page), 1, nx=True, px=int(SUBSCRIPTION_LOAD_LOCK_SECONDS * 1000))
+            if not locked:
+                cached = await self._wait_for_other_loader(user_id, page)
+                if cached is not None:
+                    return cached
+            version = await self.client.get(self.version_key(user_id)) or "0"
+        except RedisError as e:
+            logger.warning(f"Subscription cache unavailable, loading directly: {e}")
+            return await loader()
+
+        try:
+            value = await loader()
+            if is_page(value) and not await self.store(user_id, page, value, version):
+                logger.info(f"Subscriptions of user_id={user_id} changed while loading, not caching")
+            return value
+        except RedisError as e:
+            logger.warning(f"Failed to cache subscriptions of user_id={user_id}: {e}")
+            return value
+        finally:
+            if locked:
+                try:
+                    await self.client.delete(self.lock_key(user_id, page))
+                except RedisError:
+                    pass
+
+    async def _wait_for_other_loader(self, user_id: int, page: str) -> Optional[dict]:
+        deadline = asyncio.get_running_loop().time() + SUBSCRIPTION_LOAD_WAIT_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.05)
+            cached = await self.get(user_id, page)
+            if cached is not None:
+                return cached
+        return None
+
+_subscription_cache: Optional[SubscriptionPageCache] = None
+
+def get_subscription_cache() -> SubscriptionPageCache:
+    global _subscription_cache
+    if _subscription_cache is None:
+        _subscription_cache = SubscriptionPageCache(get_redis())
+    return _subscription_cache
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import psycopg2
+from dotenv import load_dotenv
+
+__all__ = (
+    "ReplicaRouter",
+    "get_replica_router",
+    "parse_replica_dsns",
+)
+
+load_dotenv()
+
+DB_REPLICA_DSNS = os.getenv("DB_REPLICA_DSNS", "")
+# How long reads of a user stay on the primary after that user's own write; should exceed replica lag.
+DB_REPLICA_STICKY_SECONDS = float(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", 5))
+DB_REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", 30))
+DB_REPLICA_CONNECT_TIMEOUT = int(os.getenv("DB_REPLICA_CONNECT_TIMEOUT", 2))
+STICKY_KEYS_MAX = 10000
+
+logger = logging.getLogger(__name__)
+
+def parse_replica_dsns(value: Optional[str] = None) -> List[str]:
+    """
+    Replica DSNs from a comma-separated list, DB_REPLICA_DSNS by default.
+    """
+    value = DB_REPLICA_DSNS if value is None else value
+    return [dsn.strip() for dsn in value.split(",") if dsn.strip()]
+
+class ReplicaRouter:
+    """
+    Chooses where a read runs: a healthy replica in round-robin order, or the primary (None).
+
+    A replica is checked with SELECT 1 at most every `check_interval` seconds. A replica that fails
+    the check, or that a caller reports through mark_down, is skipped for `retry_seconds`. Reads
+    keyed by a user or a link go to the primary for `sticky_seconds` after a write to that key, so
+    changes are seen despite replication lag. Stickiness is per process.
+    """
+
+    def __init__(
+        self,
+        replicas: Sequence[str],
+        check: Optional[Callable[[str], None]] = None,
+        sticky_seconds: float = DB_REPLICA_STICKY_SECONDS,
+        check_interval: float = DB_REPLICA_CHECK_INTERVAL,
+        retry_seconds: float = DB_REPLICA_RETRY_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.replicas = list(replicas)
+        self.check = check or self._select_one
+        self.sticky_seconds = sticky_seconds
+        self.check_interval = check_interval
+        self.retry_seconds = retry_seconds
+        self.clock = clock
+        self.next_index = 0
+        self.checked_at: Dict[str, float] = {}
+        self.down_until: Dict[str, float] = {}
+        self.writes: Dict[object, float] = {}
+        self.check_connections: Dict[str, object] = {}
+        # Sync database services share the router from FastAPI's worker threads.
+        self.lock = threading.Lock()
+
+    def choose(self, key: object = None) -> Optional[str]:
+        if not self.replicas:
+            return None
+        with self.lock:
+            if key is not None and self.clock() - self.writes.get(key, float("-inf")) < self.sticky_seconds:
+                return None
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self.next_index]
+                self.next_index = (self.next_index + 1) % len(self.replicas)
+                if self._healthy(replica):
+                    return replica
+        return None
+
+    def record_write(self, key: object) -> None:
+        if not self.replicas:
+            return
+        with self.lock:
+            now = self.clock()
+            if len(self.writes) >= STICKY_KEYS_MAX:
+                self.writes = {k: t for k, t in self.writes.items() if now - t < self.sticky_seconds}
+            self.writes[key] = now
+
+    def mark_down(self, replica: str) -> None:
+        with self.lock:
+            self._mark_down(replica)
+
+    def _mark_down(self, replica: str) -> None:
+        if self.down_until.get(replica, 0) <= self.clock():
+            logger.warning(f"Replica {self._redacted(replica)} is unavailable, reading from the primary for {self.retry_seconds}s")
+        self.down_until[replica] = self.clock() + self.retry_seconds
+        self.checked_at.pop(replica, None)
+
+    def _healthy(self, replica: str) -> bool:
+        now = self.clock()
+        if self.down_until.get(replica, 0) > now:
+            return False
+        if now - self.checked_at.get(replica, float("-inf")) < self.check_interval:
+            return True
+        try:
+            self.check(replica)
+        except Exception as e:
+            logger.warning(f"Health check of replica {self._redacted(replica)} failed: {e}")
+            self._mark_down(replica)
+            return False
+        self.checked_at[replica] = now
+        return True
+
+    def _select_one(self, replica: str) -> None:
+        conn = self.check_connections.get(replica)
+        try:
+            if conn is None or conn.closed:
+                conn = psycopg2.connect(replica, connect_timeout=DB_REPLICA_CONNECT_TIMEOUT)
+                conn.autocommit = True
+                self.check_connections[replica] = conn
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+        except psycopg2.Error:
+            self.check_connections.pop(replica, None)
+            if conn is not None:
+                conn.close()
+            raise
+
+    @staticmethod
+    def _redacted(replica: str) -> str:
+        # Keep passwords out of the logs.
+        return replica.rsplit("@", 1)[-1]
+
+_replica_routers: Dict[Tuple[str, ...], ReplicaRouter] = {}
+
+def get_replica_router(replica_dsns: Sequence[str]) -> ReplicaRouter:
+    """
+    One router per replica set for the whole process, so health and stickiness survive the
+    database services that are created per request.
+    """
+    key = tuple(replica_dsns)
+    router = _replica_routers.get(key)
+    if router is None:
+        router = _replica_routers.setdefault(key, ReplicaRouter(key))
+    return router
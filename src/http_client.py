@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+import pybreaker
+
+__all__ = (
+    "AsyncCircuitBreaker",
+    "AsyncBaseHTTPClient",
+)
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class AsyncCircuitBreaker:
+    """
+    Opens after `fail_max` consecutive failures and rejects calls for `reset_timeout` seconds.
+    After that a single trial call is let through: success closes the breaker, failure reopens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, fail_max: int = 5, reset_timeout: float = 10.0, is_failure: Callable[[Exception], bool] = None):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.is_failure = is_failure or (lambda e: True)
+        self.state = self.CLOSED
+        self.fail_counter = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+
+    def _before_call(self) -> None:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise pybreaker.CircuitBreakerError("Circuit breaker is open")
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self.trial_in_flight:
+                raise pybreaker.CircuitBreakerError("Circuit breaker is half-open, trial call in progress")
+            self.trial_in_flight = True
+
+    def _on_success(self) -> None:
+        self.state = self.CLOSED
+        self.fail_counter = 0
+        self.trial_in_flight = False
+
+    def _on_failure(self) -> None:
+        self.trial_in_flight = False
+        self.fail_counter += 1
+        if self.state == self.HALF_OPEN or self.fail_counter >= self.fail_max:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit breaker opened after {self.fail_counter} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    async def call(self, func: Callable[[], Awaitable]):
+        self._before_call()
+        try:
+            result = await func()
+        except Exception as e:
+            if self.is_failure(e):
+                self._on_failure()
+            elif self.state == self.HALF_OPEN:
+                self._on_success()
+            raise
+        except BaseException:
+            # A cancelled trial says nothing about the service; let the next call run the trial.
+            self.trial_in_flight = False
+            raise
+        self._on_success()
+        return result
+
+def is_server_failure(e: Exception) -> bool:
+    # Client errors (4xx) mean the request was wrong, not that the service is unhealthy.
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, httpx.HTTPError)
+
+class AsyncBaseHTTPClient:
+    """
+    Async counterpart of the requests-based clients: one pooled httpx.AsyncClient with keep-alive
+    connections and one circuit breaker for the lifetime of the process.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 3.0,
+        retries: int = 3,
+        backoff_factor: float = 0.5,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        breaker: Optional[AsyncCircuitBreaker] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_factor = backoff_factor
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=timeout,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+            ),
+            transport=transport,
+        )
+        self.breaker = breaker or AsyncCircuitBreaker(is_failure=is_server_failure)
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    def _handle_response(self, response: httpx.Response):
+        try:
+            response.raise_for_status()
+            return response.json()
+        except httpx.HTTPStatusError as err:
+            logger.error(f"HTTP error: {err}")
+            raise
+        except ValueError as err:
+            logger.error(f"Json decode error: {err}")
+            raise
+
+    def _fallback(self, method: str, path: str, **kwargs) -> dict:
+        logger.warning(f"Fallback triggered for {method} {path}. Returning default response.")
+        return {"status": "fallback", "message": f"{method} {path} failed"}
+
+    async def _send_with_retries(self, method: str, path: str, timeout: float, **kwargs) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await self.client.request(method, path, timeout=timeout, **kwargs)
+                if response.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    return response
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(self.backoff_factor * 2 ** (attempt - 1))
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        timeout: Optional[float] = None,
+        parse: Optional[Callable[[httpx.Response], Any]] = None,
+        **kwargs,
+    ):
+        timeout = timeout if timeout is not None else self.timeout
+        parse = parse or self._handle_response
+        try:
+            return await self.breaker.call(
+                lambda: self._send_and_parse(method, path, timeout, parse, **kwargs)
+            )
+        except (httpx.HTTPError, ValueError, pybreaker.CircuitBreakerError) as err:
+            logger.error(f"{method} request failed: {err}")
+            return self._fallback(method, path)
+
+    async def _send_and_parse(self, method: str, path: str, timeout: float, parse: Callable[[httpx.Response], Any], **kwargs):
+        return parse(await self._send_with_retries(method, path, timeout, **kwargs))
+
+    async def get(self, path: str, params: dict = None, timeout: Optional[float] = None):
+        return await self.request("GET", path, timeout=timeout, params=params)
+
+    async def post(self, path: str, json: dict = None, timeout: Optional[float] = None):
+        return await self.request("POST", path, timeout=timeout, json=json)
+
+    async def put(self, path: str, json: dict = None, timeout: Optional[float] = None):
+        return await self.request("PUT", path, timeout=timeout, json=json)
+
+    async def delete(self, path: str, params: dict = None, timeout: Optional[float] = None):
+        return await self.request("DELETE", path, timeout=timeout, params=params)
@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import os
+import uuid
+from typing import Awaitable, Callable, List, Optional
+from pydantic import BaseModel
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+COALESCE_WINDOW_SECONDS = float(os.getenv("COALESCE_WINDOW_SECONDS", 0))
+COALESCE_MAX_RETRIES = int(os.getenv("COALESCE_MAX_RETRIES", 3))
+
+class CoalescedUpdate:
+    def __init__(self, update: BaseModel, key: Optional[str] = None):
+        self.latest = update
+        self.changes = 1 + update.more_changes
+        self.attempts = 0
+        # Fixed for the entry's lifetime, so a retry resumes the failed attempt's delivery ledger.
+        self.job_id = f"{key if key is not None else uuid.uuid4().hex}:coalesced"
+        # Dedupe keys of the merged updates, released if the entry is dropped so that resends are accepted.
+        self.keys: List[str] = [key] if key is not None else []
+
+    def merge(self, update: BaseModel, key: Optional[str] = None) -> None:
+        self.latest = update
+        self.changes += 1 + update.more_changes
+        if key is not None:
+            self.keys.append(key)
+
+    def to_update(self) -> BaseModel:
+        return self.latest.model_copy(update={"more_changes": self.changes - 1})
+
+class UpdateCoalescer:
+    """
+    Holds link updates for a window per link_id and emits one merged fan-out per window.
+    `flush_callback` gets the merged update and the entry's job id, which stays the same across
+    retries. When an entry is dropped, `release_callback` gets that job id and the dedupe keys
+    of the updates merged into it.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[BaseModel, str], Awaitable[dict]],
+        window: float = COALESCE_WINDOW_SECONDS,
+        max_retries: int = COALESCE_MAX_RETRIES,
+        release_callback: Optional[Callable[[str, List[str]], Awaitable[None]]] = None,
+    ):
+        self.flush_callback = flush_callback
+        self.release_callback = release_callback
+        self.window = window
+        self.max_retries = max_retries
+        self.pending: dict[int, CoalescedUpdate] = {}
+        self.timers: dict[int, asyncio.Task] = {}
+        self.flushing: set[asyncio.Task] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def _schedule(self, link_id: int) -> None:
+        self.timers[link_id] = asyncio.create_task(self._flush_later(link_id))
+
+    async def submit(self, update: BaseModel, key: Optional[str] = None) -> int:
+        entry = self.pending.get(update.link_id)
+        if entry is None:
+            entry = CoalescedUpdate(update, key)
+            self.pending[update.link_id] = entry
+            self._schedule(update.link_id)
+        else:
+            entry.merge(update, key)
+        return entry.changes
+
+    async def _release(self, entry: CoalescedUpdate) -> None:
+        if self.release_callback is None:
+            return
+        try:
+            await self.release_callback(entry.job_id, entry.keys)
+        except Exception as e:
+            logger.error(f"Failed to release dedupe keys of dropped update for link_id {entry.latest.link_id}: {e}")
+
+    async def _flush_later(self, link_id: int) -> None:
+        await asyncio.sleep(self.window)
+        self.timers.pop(link_id, None)
+        # From here on the task is a fan-out in progress, which shutdown waits for instead of cancelling.
+        task = asyncio.current_task()
+        self.flushing.add(task)
+        try:
+            await self.flush(link_id)
+        finally:
+            self.flushing.discard(task)
+
+    async def flush(self, link_id: int) -> None:
+        entry = self.pending.pop(link_id, None)
+        if entry is None:
+            return
+
+        update = entry.to_update()
+        logger.info(f"Flushing {entry.changes} coalesced changes for link_id: {link_id}")
+        try:
+            await self.flush_callback(update, entry.job_id)
+        except Exception as e:
+            entry.attempts += 1
+            if entry.attempts > self.max_retries:
+                logger.error(f"Dropping coalesced update for link_id {link_id} after {entry.attempts} attempts: {e}")
+                await self._release(entry)
+                return
+            logger.warning(f"Coalesced fan-out for link_id {link_id} failed, retrying next window: {e}")
+            newer = self.pending.get(link_id)
+            if newer is not None:
+                entry.merge(newer.to_update())
+                entry.keys.extend(newer.keys)
+            self.pending[link_id] = entry
+            if link_id not in self.timers:
+                self._schedule(link_id)
+
+    async def flush_all(self) -> None:
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        if self.flushing:
+            await asyncio.gather(*self.flushing, return_exceptions=True)
+        # A failed flush schedules its retry window; flush it now instead.
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        for link_id in list(self.pending):
+            entry = self.pending.pop(link_id)
+            try:
+                await self.flush_callback(entry.to_update(), entry.job_id)
+            except Exception as e:
+                logger.error(f"Failed to flush coalesced update for link_id {link_id} on shutdown: {e}")
+                await self._release(entry)
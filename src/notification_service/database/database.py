@@ -1,17 +1,23 @@
 from .sql_db import SqlDatabaseService
 from .orm_db import OrmDatabaseService
 from .db_service import DatabaseService
+from src.db_replicas import parse_replica_dsns
+from typing import Optional, Sequence
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-def create_database_service() -> DatabaseService:
+def create_database_service(replica_dsns: Optional[Sequence[str]] = None) -> DatabaseService:
+    """
+    Reads go to `replica_dsns` (postgresql:// URLs, DB_REPLICA_DSNS by default) when any is healthy.
+    """
     access_type = os.getenv("ACCESS_TYPE", "SQL").upper()
+    replica_dsns = parse_replica_dsns() if replica_dsns is None else list(replica_dsns)
 
     if access_type == "SQL":
-        return SqlDatabaseService()
+        return SqlDatabaseService(replica_dsns)
     elif access_type == "ORM":
-        return OrmDatabaseService()
+        return OrmDatabaseService(replica_dsns)
     else:
-        raise ValueError(f"Invalid access-type: {access_type}. Must be 'SQL' or 'ORM'.")
\ No newline at end of file
+        raise ValueError(f"Invalid access-type: {access_type}. Must be 'SQL' or 'ORM'.")
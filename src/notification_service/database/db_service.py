@@ -4,5 +4,9 @@ from typing import List
 class DatabaseService(ABC):
 
     @abstractmethod
-    def get_users_by_link_id(self, link_id: int, offset: int, link: int) -> List[int]:
-        pass
\ No newline at end of file
+    def get_users_by_link_id(self, link_id: int, offset: int, limit: int) -> List[int]:
+        pass
+
+    @abstractmethod
+    def get_all_users_by_link_id(self, link_id: int, batch_size: int) -> List[int]:
+        pass
@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, TIMESTAMP, Identity, CheckConstraint
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, TIMESTAMP, Identity, CheckConstraint, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import MetaData
-from typing import List
+from sqlalchemy.exc import InterfaceError, OperationalError
+from typing import Callable, List, Sequence
+from src.db_replicas import DB_REPLICA_CONNECT_TIMEOUT, get_replica_router
 from .db_service import DatabaseService
 import logging
 from dotenv import load_dotenv
@@ -16,6 +18,8 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() == "true"
+
 LOG_FILE = os.path.join("logs", "notification.log")
 
 logging.basicConfig(
@@ -50,6 +54,7 @@ class Link(Base):
 
     __table_args__ = (
         CheckConstraint(type.in_(['stackoverflow', 'github']), name='links_type_check'),
+        Index("idx_links_last_checked_at", "last_checked_at"),
     )
 
     subscriptions = relationship("Subscription", back_populates="link")
@@ -64,6 +69,12 @@ class Subscription(Base):
     link_id = Column(Integer, ForeignKey("links.link_id"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=False), nullable=False)
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "link_id", name="uq_subscriptions_user_id_link_id"),
+        Index("idx_subscriptions_user_id_subscription_id", "user_id", "subscription_id"),
+        Index("idx_subscriptions_link_id_subscription_id", "link_id", "subscription_id", "user_id"),
+    )
+
     user = relationship("User", back_populates="subscriptions")
     link = relationship("Link", back_populates="subscriptions")
 
@@ -73,29 +84,99 @@ class Update(Base):
 
     update_id = Column(Integer, Identity(), primary_key=True)
     link_id = Column(Integer, ForeignKey("links.link_id"), nullable=False)
-    created_at = Column(TIMESTAMP(timezone=False), nullable=False)
+    # Part of the primary key because updates is range-partitioned by created_at.
+    created_at = Column(TIMESTAMP(timezone=False), primary_key=True)
     title = Column(String(255))
     user_name = Column(String(255))
     preview = Column(String)
 
+    __table_args__ = (
+        Index("idx_updates_link_id_created_at_update_id", "link_id", "created_at", "update_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
     link = relationship("Link", back_populates="updates")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class OrmDatabaseService(DatabaseService):
-    def __init__(self):
+    def __init__(self, replica_dsns: Sequence[str] = ()):
         self.engine = create_engine(DATABASE_URL)
-        Base.metadata.create_all(bind=self.engine)
+        # The schema is owned by migrations/db.changelog-master.xml; create_all is only for throwaway databases.
+        if DB_CREATE_SCHEMA:
+            Base.metadata.create_all(bind=self.engine)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.router = get_replica_router(replica_dsns)
+        self.replica_sessions = {}
+
+    def _replica_session(self, dsn: str):
+        if dsn not in self.replica_sessions:
+            engine = create_engine(dsn, pool_pre_ping=True, connect_args={"connect_timeout": DB_REPLICA_CONNECT_TIMEOUT})
+            self.replica_sessions[dsn] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return self.replica_sessions[dsn]()
+
+    def _read(self, read: Callable, key: object = None):
+        """
+        Runs read(session) on a replica chosen by the router, or on the primary when none is usable
+        or `key` changed within the router's sticky window.
+        """
+        replica = self.router.choose(key)
+        if replica is not None:
+            db = self._replica_session(replica)
+            try:
+                return read(db)
+            except (OperationalError, InterfaceError) as e:
+                logger.warning(f"Read on a replica failed, retrying on the primary: {e}")
+                self.router.mark_down(replica)
+            finally:
+                db.close()
+        db = self.SessionLocal()
+        try:
+            return read(db)
+        finally:
+            db.close()
 
     def get_users_by_link_id(self, link_id: int, offset: int, limit: int) -> List[int]:
-        db = self.SessionLocal()
+        def read(db):
+            return (
+                db.query(User.telegram_id)
+                .join(Subscription)
+                .filter(Subscription.link_id == link_id)
+                .order_by(Subscription.subscription_id)
+                .offset(offset)
+                .limit(limit)
+                .all()
+            )
+
         try:
-            users = db.query(User.telegram_id).join(Subscription).filter(Subscription.link_id == link_id).offset(offset).limit(limit).all()
-            telegram_ids = [user[0] for user in users]
-            return telegram_ids
+            return [user[0] for user in self._read(read, key=link_id)]
+        except Exception as e:
+            logger.exception(f"Failed to get users list for link {link_id}: {e}")
+            raise
+
+    def get_all_users_by_link_id(self, link_id: int, batch_size: int) -> List[int]:
+        """
+        Reads every subscriber of the link in keyset pages of `batch_size`, all from one source,
+        so that pages are never stitched together from replicas with different lag.
+        """
+        def read(db):
+            telegram_ids, after = [], 0
+            while True:
+                rows = (
+                    db.query(Subscription.subscription_id, User.telegram_id)
+                    .join(User, User.user_id == Subscription.user_id)
+                    .filter(Subscription.link_id == link_id, Subscription.subscription_id > after)
+                    .order_by(Subscription.subscription_id)
+                    .limit(batch_size)
+                    .all()
+                )
+                telegram_ids.extend(row[1] for row in rows)
+                if len(rows) < batch_size:
+                    return telegram_ids
+                after = rows[-1][0]
+
+        try:
+            return self._read(read, key=link_id)
         except Exception as e:
             logger.exception(f"Failed to get users list for link {link_id}: {e}")
             raise
-        finally:
-            db.close()
\ No newline at end of file
@@ -1,5 +1,7 @@
 import psycopg2
-from typing import List
+from typing import Callable, List, Sequence
+from src.db_replicas import DB_REPLICA_CONNECT_TIMEOUT, get_replica_router
+from src.prepared_statements import PreparedStatements
 from .db_service import DatabaseService
 import logging
 from dotenv import load_dotenv
@@ -22,9 +24,32 @@ DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+# Hot statements, prepared once per connection.
+STATEMENTS = {
+    "subscribers_by_link_id": """
+        SELECT u.telegram_id
+        FROM users u
+        JOIN subscriptions s ON u.user_id = s.user_id
+        WHERE s.link_id = %s
+        ORDER BY s.subscription_id ASC
+        LIMIT %s OFFSET %s
+    """,
+    "subscribers_by_link_id_after": """
+        SELECT s.subscription_id, u.telegram_id
+        FROM subscriptions s
+        JOIN users u ON u.user_id = s.user_id
+        WHERE s.link_id = %s AND s.subscription_id > %s
+        ORDER BY s.subscription_id ASC
+        LIMIT %s
+    """,
+}
+
 class SqlDatabaseService(DatabaseService):
-    def __init__(self):
+    def __init__(self, replica_dsns: Sequence[str] = ()):
         self.conn = self._get_db_connection()
+        self.router = get_replica_router(replica_dsns)
+        self.replica_conns = {}
+        self.statements = PreparedStatements(STATEMENTS)
 
     def _get_db_connection(self):
         try:
@@ -35,27 +60,67 @@ class SqlDatabaseService(DatabaseService):
                 user=DB_USER,
                 password=DB_PASSWORD
             )
+            # Only reads run here, and the connection is kept for the thread's lifetime.
+            conn.autocommit = True
             return conn
         except psycopg2.Error as e:
             logger.exception(f"Failed to connect to db: {e}")
             raise
 
-    def get_users_by_link_id(self, link_id: int) -> List[int]:
+    def _replica_connection(self, dsn: str):
+        conn = self.replica_conns.get(dsn)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(dsn, connect_timeout=DB_REPLICA_CONNECT_TIMEOUT)
+            # No transaction is left open between reads, so the standby never waits on our snapshot.
+            conn.autocommit = True
+            self.replica_conns[dsn] = conn
+        return conn
+
+    def _read(self, read: Callable, key: object = None):
+        """
+        Runs read(conn) on a replica chosen by the router, or on the primary when none is usable
+        or `key` changed within the router's sticky window.
+        """
+        replica = self.router.choose(key)
+        if replica is not None:
+            try:
+                return read(self._replica_connection(replica))
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logger.warning(f"Read on a replica failed, retrying on the primary: {e}")
+                self.router.mark_down(replica)
+                conn = self.replica_conns.pop(replica, None)
+                if conn is not None:
+                    conn.close()
+        return read(self.conn)
+
+    def get_users_by_link_id(self, link_id: int, offset: int, limit: int) -> List[int]:
+        def read(conn):
+            cur = self.statements.execute(conn, "subscribers_by_link_id", (link_id, limit, offset))
+            return [row[0] for row in cur.fetchall()]
+
         try:
-            cur = self.conn.cursor()
-            cur.execute(
-                """
-                SELECT u.telegram_id
-                FROM users u
-                JOIN subscriptions s ON u.user_id = s.user_id
-                JOIN links l ON s.link_id = l.link_id
-                WHERE s.link_id = %s
-                ASC LIMIT %s OFFSET %s;
-                """,
-                (link_id, offset, limit,)
-            )
-            users = [row[0] for row in cur.fetchall()]
-            return users
+            return self._read(read, key=link_id)
+        except Exception as e:
+            logger.exception(f"Failed to get users list for link {link_id}: {e}")
+            raise
+
+    def get_all_users_by_link_id(self, link_id: int, batch_size: int) -> List[int]:
+        """
+        Reads every subscriber of the link in keyset pages of `batch_size`, all from one source,
+        so that pages are never stitched together from replicas with different lag.
+        """
+        def read(conn):
+            telegram_ids, after = [], 0
+            while True:
+                cur = self.statements.execute(conn, "subscribers_by_link_id_after", (link_id, after, batch_size))
+                rows = cur.fetchall()
+                telegram_ids.extend(row[1] for row in rows)
+                if len(rows) < batch_size:
+                    return telegram_ids
+                after = rows[-1][0]
+
+        try:
+            return self._read(read, key=link_id)
         except Exception as e:
             logger.exception(f"Failed to get users list for link {link_id}: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,103 @@
+import time
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+DEDUPE_TTL_SECONDS = int(os.getenv("DEDUPE_TTL_SECONDS", 3600))
+DEDUPE_MAX_ENTRIES = int(os.getenv("DEDUPE_MAX_ENTRIES", 10000))
+DEDUPE_KEY_PREFIX = "link_updated:"
+
+def build_idempotency_key(link_id: int, last_update: str, explicit_key: Optional[str] = None) -> str:
+    if explicit_key:
+        return f"{DEDUPE_KEY_PREFIX}{explicit_key}"
+    return f"{DEDUPE_KEY_PREFIX}{link_id}:{last_update}"
+
+class DedupeStore(ABC):
+
+    @abstractmethod
+    async def check_and_set(self, key: str) -> bool:
+        """
+        Remembers the key and returns True if it was not seen within the TTL.
+        """
+        pass
+
+    @abstractmethod
+    async def release(self, key: str) -> None:
+        """
+        Forgets the key so that a failed delivery can be retried.
+        """
+        pass
+
+class InMemoryDedupeStore(DedupeStore):
+    def __init__(self, ttl: int = DEDUPE_TTL_SECONDS, max_entries: int = DEDUPE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, float] = OrderedDict()
+
+    async def check_and_set(self, key: str) -> bool:
+        now = time.monotonic()
+        expires_at = self.entries.get(key)
+        if expires_at is not None and expires_at > now:
+            self.entries.move_to_end(key)
+            return False
+
+        self.entries[key] = now + self.ttl
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return True
+
+    async def release(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+class RedisDedupeStore(DedupeStore):
+    def __init__(self, client: redis.Redis, ttl: int = DEDUPE_TTL_SECONDS, fallback: DedupeStore = None):
+        self.client = client
+        self.ttl = ttl
+        self.fallback = fallback or InMemoryDedupeStore(ttl=ttl)
+
+    async def check_and_set(self, key: str) -> bool:
+        try:
+            return bool(await self.client.set(key, 1, nx=True, ex=self.ttl))
+        except RedisError as e:
+            logger.warning(f"Redis dedupe store unavailable, using in-memory fallback: {e}")
+            return await self.fallback.check_and_set(key)
+
+    async def release(self, key: str) -> None:
+        try:
+            await self.client.delete(key)
+        except RedisError as e:
+            logger.warning(f"Failed to release dedupe key {key} in Redis: {e}")
+        await self.fallback.release(key)
+
+def create_dedupe_store() -> DedupeStore:
+    store_type = os.getenv("DEDUPE_STORE", "REDIS").upper()
+
+    if store_type == "REDIS":
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "redis"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            socket_timeout=float(os.getenv("REDIS_TIMEOUT", 0.5)),
+        )
+        return RedisDedupeStore(client)
+    elif store_type == "MEMORY":
+        return InMemoryDedupeStore()
+    else:
+        raise ValueError(f"Invalid dedupe store: {store_type}. Must be 'REDIS' or 'MEMORY'.")
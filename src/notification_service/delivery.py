@@ -0,0 +1,182 @@
+"""
+Delivery of a link update to its recipients over HTTP or Kafka, shared by the API process and the
+fan-out workers, so that a worker does not have to import main and build the app, the Redis and
+LISTEN connections and the rate limiter it never uses.
+"""
+import asyncio
+import json
+import logging
+import os
+from array import array
+from typing import Callable, Optional
+
+import requests
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .delivery_ledger import DeliveryLedger
+
+load_dotenv()
+SERVER_URL = os.getenv("SERVER_URL")
+KAFKA_TOPIC_TO_SERVER = os.getenv("KAFKA_TOPIC_TO_SERVER")
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+class LinkUpdated(BaseModel):
+    link_id: int
+    url: str
+    last_update: str
+    title: str = None
+    user_name: str = None
+    preview: str = None
+    more_changes: int = 0
+
+# Started by the process that delivers: the API on startup, a fan-out worker in run_worker.
+kafka_producer = None
+# Reads the subscribers of a link for a ledger that has none yet. Set by main; fan-out jobs
+# carry their recipients, so workers never need it.
+load_recipients: Optional[Callable[[int], array]] = None
+
+def get_recipients(update_notification: LinkUpdated, ledger: DeliveryLedger) -> array:
+    if ledger.recipients is None:
+        ledger.recipients = load_recipients(update_notification.link_id)
+        if ledger.recipients:
+            ledger.register(len(ledger.recipients) - 1)
+    return ledger.recipients
+
+def build_notification_data(update_notification: LinkUpdated, telegram_id: int) -> dict:
+    return {
+        "user_id": telegram_id,
+        "url": update_notification.url,
+        "last_update": update_notification.last_update,
+        "title": update_notification.title,
+        "user_name": update_notification.user_name,
+        "preview": update_notification.preview,
+        "more_changes": update_notification.more_changes,
+    }
+
+async def send_with_kafka(update_notification: LinkUpdated, ledger: DeliveryLedger = None, start: int = 0, stop: int = None) -> dict:
+    ledger = ledger or DeliveryLedger(str(update_notification.link_id))
+    try:
+        recipients = get_recipients(update_notification, ledger)
+        for position in range(start, len(recipients) if stop is None else stop):
+            telegram_id = recipients[position]
+            if ledger.is_delivered(position):
+                continue
+            notification_data = build_notification_data(update_notification, telegram_id)
+            try:
+                await kafka_producer.send_and_wait(
+                    KAFKA_TOPIC_TO_SERVER,
+                    json.dumps(notification_data).encode('utf-8'),
+                    key=str(telegram_id).encode('utf-8'),
+                )
+                ledger.mark_delivered(position, "KAFKA")
+                logger.info(f"Notification sent to Kafka topic {KAFKA_TOPIC_TO_SERVER} for link_id: {update_notification.link_id}")
+            except Exception as e:
+                ledger.mark_failed(position)
+                logger.error(f"Failed to send to {telegram_id} via Kafka: {e}")
+
+        if stop is None:
+            ledger.finish()
+        return {"status": "ok", "message": "Notifications forwarded", **ledger.counts()}
+
+    except Exception as e:
+        logger.exception(f"Error processing link update: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+RETRIES = int(os.getenv("RETRIES", 3))
+TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 3.0))
+BACKOFF = float(os.getenv("BACKOFF_FACTOR", 0.3))
+
+retry_strategy = Retry(
+    total=RETRIES,
+    backoff_factor=BACKOFF,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["POST"]
+)
+
+adapter = HTTPAdapter(max_retries=retry_strategy)
+session = requests.Session()
+session.mount("http://", adapter)
+session.mount("https://", adapter)
+
+HTTP_BATCH_SIZE = int(os.getenv("HTTP_BATCH_SIZE", 500))
+
+def build_batch_envelope(update_notification: LinkUpdated, telegram_ids: list) -> dict:
+    return {
+        "update": {
+            "url": update_notification.url,
+            "last_update": update_notification.last_update,
+            "title": update_notification.title,
+            "user_name": update_notification.user_name,
+            "preview": update_notification.preview,
+            "more_changes": update_notification.more_changes,
+        },
+        "user_ids": telegram_ids,
+    }
+
+def send_with_http(update_notification: LinkUpdated, ledger: DeliveryLedger = None, start: int = 0, stop: int = None) -> dict:
+    ledger = ledger or DeliveryLedger(str(update_notification.link_id))
+    try:
+        recipients = get_recipients(update_notification, ledger)
+        pending = [
+            position
+            for position in range(start, len(recipients) if stop is None else stop)
+            if not ledger.is_delivered(position)
+        ]
+        for offset in range(0, len(pending), HTTP_BATCH_SIZE):
+            positions = pending[offset:offset + HTTP_BATCH_SIZE]
+            telegram_ids = [recipients[position] for position in positions]
+            try:
+                response = session.post(
+                    f"{SERVER_URL}/api/v1/updated/batch",
+                    json=build_batch_envelope(update_notification, telegram_ids),
+                    timeout=TIMEOUT
+                )
+                response.raise_for_status()
+                accepted = set(response.json().get("accepted", []))
+            except (requests.exceptions.RequestException, ValueError) as e:
+                logger.error(f"Failed to send batch of {len(telegram_ids)} notifications: {e}")
+                accepted = set()
+
+            for position, telegram_id in zip(positions, telegram_ids):
+                if telegram_id in accepted:
+                    ledger.mark_delivered(position, "HTTP")
+                else:
+                    ledger.mark_failed(position)
+            logger.info(f"Server accepted {len(accepted)} of {len(telegram_ids)} notifications for link_id: {update_notification.link_id}")
+
+        if stop is None:
+            ledger.finish()
+        return {"status": "ok", "message": "Notifications forwarded", **ledger.counts()}
+
+    except Exception as e:
+        logger.exception(f"Error processing link update: {e}")
+        raise
+
+async def deliver_range(update_notification: LinkUpdated, ledger: DeliveryLedger, start: int, stop: int) -> None:
+    primary = os.getenv("MESSAGE_TRANSPORT", "HTTP").upper()
+    secondary = "KAFKA" if primary == "HTTP" else "HTTP"
+
+    for transport in (primary, secondary):
+        try:
+            if transport == "HTTP":
+                await asyncio.to_thread(send_with_http, update_notification, ledger, start, stop)
+            else:
+                await send_with_kafka(update_notification, ledger, start, stop)
+        except Exception as e:
+            logger.warning(f"Transport '{transport}' failed: {e}. Progress: {ledger.counts()}")
+
+        if ledger.range_delivered(start, stop):
+            return
+        logger.warning(f"Transport '{transport}' left undelivered recipients in [{start}, {stop}): {ledger.counts()}")
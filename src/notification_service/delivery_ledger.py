@@ -0,0 +1,114 @@
+import logging
+import os
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+LEDGER_MAX_JOBS = int(os.getenv("LEDGER_MAX_JOBS", 1000))
+
+class DeliveryLedger:
+    """
+    Tracks which recipient positions of a fan-out job were acknowledged by a transport.
+    Positions are indexes in the job's recipient snapshot, ordered by subscription_id.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.recipients = None
+        self.delivered = bytearray()
+        self.failed = bytearray()
+        self.total = 0
+        self.acks: dict[str, int] = {}
+        self.exhausted = False
+
+    @staticmethod
+    def _get_bit(bitmap: bytearray, position: int) -> bool:
+        index = position >> 3
+        return index < len(bitmap) and bool(bitmap[index] & (1 << (position & 7)))
+
+    @staticmethod
+    def _set_bit(bitmap: bytearray, position: int, value: bool) -> None:
+        index = position >> 3
+        if index >= len(bitmap):
+            bitmap.extend(b"\x00" * (index + 1 - len(bitmap)))
+        if value:
+            bitmap[index] |= 1 << (position & 7)
+        else:
+            bitmap[index] &= ~(1 << (position & 7)) & 0xFF
+
+    def register(self, position: int) -> None:
+        self.total = max(self.total, position + 1)
+
+    def is_delivered(self, position: int) -> bool:
+        return self._get_bit(self.delivered, position)
+
+    def is_failed(self, position: int) -> bool:
+        return self._get_bit(self.failed, position)
+
+    def mark_delivered(self, position: int, transport: str) -> None:
+        self.register(position)
+        if self.is_delivered(position):
+            return
+        self._set_bit(self.delivered, position, True)
+        self._set_bit(self.failed, position, False)
+        self.acks[transport] = self.acks.get(transport, 0) + 1
+
+    def mark_failed(self, position: int) -> None:
+        self.register(position)
+        if not self.is_delivered(position):
+            self._set_bit(self.failed, position, True)
+
+    def range_delivered(self, start: int, stop: int) -> bool:
+        return all(self.is_delivered(position) for position in range(start, stop))
+
+    def finish(self) -> None:
+        self.exhausted = True
+
+    def delivered_count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.delivered)
+
+    def failed_count(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.failed)
+
+    def is_complete(self) -> bool:
+        return self.exhausted and self.delivered_count() == self.total
+
+    def counts(self) -> dict:
+        delivered = self.delivered_count()
+        failed = self.failed_count()
+        return {
+            "delivered": delivered,
+            "failed": failed,
+            "pending": self.total - delivered - failed,
+        }
+
+class LedgerRegistry:
+    def __init__(self, max_jobs: int = LEDGER_MAX_JOBS):
+        self.max_jobs = max_jobs
+        self.ledgers: OrderedDict[str, DeliveryLedger] = OrderedDict()
+
+    def get_or_create(self, job_id: str) -> DeliveryLedger:
+        ledger = self.ledgers.get(job_id)
+        if ledger is None:
+            ledger = DeliveryLedger(job_id)
+            self.ledgers[job_id] = ledger
+        else:
+            logger.info(f"Resuming fan-out job {job_id}: {ledger.counts()}")
+            ledger.exhausted = False
+        self.ledgers.move_to_end(job_id)
+        while len(self.ledgers) > self.max_jobs:
+            self.ledgers.popitem(last=False)
+        return ledger
+
+    def discard(self, job_id: str) -> None:
+        self.ledgers.pop(job_id, None)
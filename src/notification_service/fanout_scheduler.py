@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+
+from .metrics_server import fanout_queue_latency, fanout_queue_depth
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", 4))
+FANOUT_CHUNK_SIZE = int(os.getenv("FANOUT_CHUNK_SIZE", 500))
+FANOUT_SMALL_JOB_THRESHOLD = int(os.getenv("FANOUT_SMALL_JOB_THRESHOLD", 100))
+FANOUT_PRIORITY_WEIGHT = int(os.getenv("FANOUT_PRIORITY_WEIGHT", 4))
+
+PRIORITY_LANE = "priority"
+BULK_LANE = "bulk"
+
+class FanoutScheduler:
+    """
+    Splits fan-out jobs into chunks and hands out a bounded number of delivery slots.
+    Each job waits for a slot per chunk, so jobs in a lane are served round-robin;
+    small jobs use the priority lane, which gets `priority_weight` slots per bulk slot.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = FANOUT_CONCURRENCY,
+        chunk_size: int = FANOUT_CHUNK_SIZE,
+        small_job_threshold: int = FANOUT_SMALL_JOB_THRESHOLD,
+        priority_weight: int = FANOUT_PRIORITY_WEIGHT,
+    ):
+        self.available = concurrency
+        self.chunk_size = chunk_size
+        self.small_job_threshold = small_job_threshold
+        self.priority_weight = priority_weight
+        self.priority_streak = 0
+        self.waiters: dict[str, deque] = {PRIORITY_LANE: deque(), BULK_LANE: deque()}
+
+    def lane_for(self, total: int) -> str:
+        return PRIORITY_LANE if total <= self.small_job_threshold else BULK_LANE
+
+    def _next_lane(self) -> Optional[str]:
+        has_priority = bool(self.waiters[PRIORITY_LANE])
+        has_bulk = bool(self.waiters[BULK_LANE])
+        if has_priority and (not has_bulk or self.priority_streak < self.priority_weight):
+            self.priority_streak += 1
+            return PRIORITY_LANE
+        if has_bulk:
+            self.priority_streak = 0
+            return BULK_LANE
+        return None
+
+    async def acquire(self, lane: str) -> None:
+        if self.available > 0 and not any(self.waiters.values()):
+            self.available -= 1
+            fanout_queue_latency.labels(lane=lane).observe(0)
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[lane].append((waiter, time.monotonic()))
+        fanout_queue_depth.labels(lane=lane).inc()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            else:
+                self.waiters[lane] = deque(item for item in self.waiters[lane] if item[0] is not waiter)
+                fanout_queue_depth.labels(lane=lane).dec()
+            raise
+
+    def release(self) -> None:
+        lane = self._next_lane()
+        if lane is None:
+            self.available += 1
+            return
+
+        waiter, enqueued_at = self.waiters[lane].popleft()
+        fanout_queue_depth.labels(lane=lane).dec()
+        fanout_queue_latency.labels(lane=lane).observe(time.monotonic() - enqueued_at)
+        waiter.set_result(None)
+
+    async def run(self, link_id: int, total: int, deliver: Callable[[int, int], Awaitable[None]]) -> None:
+        lane = self.lane_for(total)
+        logger.info(f"Scheduling fan-out for link_id {link_id}: {total} recipients in {lane} lane")
+        for start in range(0, total, self.chunk_size):
+            await self.acquire(lane)
+            try:
+                await deliver(start, min(start + self.chunk_size, total))
+            finally:
+                self.release()
@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import os
+import signal
+from abc import ABC, abstractmethod
+from array import array
+from typing import AsyncIterator, Awaitable, Callable, List
+from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from dotenv import load_dotenv
+
+from . import delivery
+from .dedupe import DedupeStore
+from .delivery import LinkUpdated, deliver_range
+from .delivery_ledger import DeliveryLedger
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+KAFKA_FANOUT_TOPIC = os.getenv("KAFKA_FANOUT_TOPIC", "fanout-jobs")
+FANOUT_WORKER_GROUP = os.getenv("FANOUT_WORKER_GROUP", "notification-fanout-workers")
+FANOUT_JOB_MAX_ATTEMPTS = int(os.getenv("FANOUT_JOB_MAX_ATTEMPTS", 3))
+
+def build_chunk_jobs(job_id: str, update: dict, telegram_ids, chunk_size: int, attempt: int = 0) -> List[dict]:
+    return [
+        {
+            "job_id": job_id,
+            "link_id": update["link_id"],
+            "start": start,
+            "attempt": attempt,
+            "telegram_ids": list(telegram_ids[start:start + chunk_size]),
+            "update": update,
+        }
+        for start in range(0, len(telegram_ids), chunk_size)
+    ]
+
+def chunk_key(job: dict) -> str:
+    return f"{job['link_id']}:{job['start']}"
+
+def chunk_dedupe_key(job: dict) -> str:
+    return f"{job['job_id']}:chunk:{job['start']}"
+
+class FanoutTransport(ABC):
+
+    @abstractmethod
+    async def start(self) -> None:
+        pass
+
+    @abstractmethod
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    async def publish(self, key: str, job: dict) -> None:
+        pass
+
+    @abstractmethod
+    def jobs(self) -> AsyncIterator[dict]:
+        pass
+
+    @abstractmethod
+    async def ack(self, job: dict) -> None:
+        """
+        Marks the job as processed so it is not redelivered to the consumer group.
+        """
+        pass
+
+class KafkaFanoutTransport(FanoutTransport):
+    def __init__(self, bootstrap_servers: str, topic: str = KAFKA_FANOUT_TOPIC, group_id: str = FANOUT_WORKER_GROUP, consume: bool = True):
+        self.topic = topic
+        self.producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers)
+        self.consumer = None
+        if consume:
+            self.consumer = AIOKafkaConsumer(
+                topic,
+                bootstrap_servers=bootstrap_servers,
+                group_id=group_id,
+                auto_offset_reset="earliest",
+                enable_auto_commit=False,
+            )
+
+    async def start(self) -> None:
+        await self.producer.start()
+        if self.consumer:
+            await self.consumer.start()
+
+    async def stop(self) -> None:
+        if self.consumer:
+            await self.consumer.stop()
+        await self.producer.stop()
+
+    async def publish(self, key: str, job: dict) -> None:
+        await self.producer.send_and_wait(
+            self.topic,
+            json.dumps(job).encode('utf-8'),
+            key=key.encode('utf-8'),
+        )
+
+    async def jobs(self) -> AsyncIterator[dict]:
+        async for msg in self.consumer:
+            yield json.loads(msg.value.decode('utf-8'))
+
+    async def ack(self, job: dict) -> None:
+        await self.consumer.commit()
+
+async def publish_chunk_jobs(transport: "FanoutTransport", jobs: List[dict], dedupe_store: DedupeStore) -> int:
+    """
+    Publishes the chunks of one fan-out and returns how many went out. Each published chunk is
+    remembered under its job id, so resending a fan-out whose dispatch failed partway publishes
+    only the chunks that did not go out.
+    """
+    published = 0
+    for job in jobs:
+        key = chunk_dedupe_key(job)
+        if not await dedupe_store.check_and_set(key):
+            continue
+        try:
+            await transport.publish(chunk_key(job), job)
+        except Exception:
+            await dedupe_store.release(key)
+            raise
+        published += 1
+    return published
+
+class FanoutWorker:
+    def __init__(self, transport: FanoutTransport, deliver: Callable[[dict, DeliveryLedger], Awaitable[None]], max_attempts: int = FANOUT_JOB_MAX_ATTEMPTS):
+        self.transport = transport
+        self.deliver = deliver
+        self.max_attempts = max_attempts
+        self.processed = 0
+        self.busy = False
+        self.stopping = False
+        self.run_task = None
+
+    async def handle(self, job: dict) -> None:
+        ledger = DeliveryLedger(f"{job['job_id']}:{job['start']}")
+        ledger.recipients = array("q", job["telegram_ids"])
+        if ledger.recipients:
+            ledger.register(len(ledger.recipients) - 1)
+
+        try:
+            await self.deliver(job, ledger)
+        except Exception as e:
+            logger.exception(f"Fan-out chunk {chunk_key(job)} failed: {e}")
+
+        undelivered = [
+            telegram_id
+            for position, telegram_id in enumerate(ledger.recipients)
+            if not ledger.is_delivered(position)
+        ]
+        if not undelivered:
+            return
+
+        if job["attempt"] + 1 >= self.max_attempts:
+            logger.error(f"Giving up on {len(undelivered)} recipients of chunk {chunk_key(job)} after {job['attempt'] + 1} attempts")
+            return
+
+        logger.warning(f"Requeueing {len(undelivered)} undelivered recipients of chunk {chunk_key(job)}")
+        retry_job = {**job, "attempt": job["attempt"] + 1, "telegram_ids": undelivered}
+        await self.transport.publish(chunk_key(retry_job), retry_job)
+
+    def request_stop(self) -> None:
+        """
+        Finishes and acks the job in hand, then stops; an idle worker stops immediately.
+        """
+        self.stopping = True
+        if not self.busy and self.run_task:
+            self.run_task.cancel()
+
+    async def run(self) -> None:
+        self.run_task = asyncio.current_task()
+        async for job in self.transport.jobs():
+            self.busy = True
+            try:
+                await self.handle(job)
+                await self.transport.ack(job)
+                self.processed += 1
+            finally:
+                self.busy = False
+            if self.stopping:
+                logger.info("Fan-out worker drained")
+                break
+
+async def deliver_chunk(job: dict, ledger: DeliveryLedger) -> None:
+    update_notification = LinkUpdated(**job["update"])
+    await deliver_range(update_notification, ledger, 0, len(ledger.recipients))
+
+async def run_worker() -> None:
+    bootstrap_servers = os.getenv("KAFKA_BOOTSTRAP_SERVERS")
+    delivery.kafka_producer = AIOKafkaProducer(bootstrap_servers=bootstrap_servers)
+    transport = KafkaFanoutTransport(bootstrap_servers)
+
+    await delivery.kafka_producer.start()
+    await transport.start()
+    logger.info(f"Fan-out worker started, consuming {KAFKA_FANOUT_TOPIC} as {FANOUT_WORKER_GROUP}")
+    worker = FanoutWorker(transport, deliver_chunk)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.request_stop)
+    try:
+        await worker.run()
+    except asyncio.CancelledError:
+        logger.info("Fan-out worker stopped while idle")
+    finally:
+        await transport.stop()
+        await delivery.kafka_producer.stop()
+        logger.info("Fan-out worker stopped")
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -1,16 +1,25 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Header
+from typing import Optional
 import httpx
 import uvicorn
+from . import delivery
 from .database.database import create_database_service
+from src.db_replicas import get_replica_router, parse_replica_dsns
+from .dedupe import create_dedupe_store, build_idempotency_key
+from .delivery import LinkUpdated, deliver_range, get_recipients
+from .delivery_ledger import LedgerRegistry
+from .subscriber_cache import SubscriberCache, SubscriptionChangeListener
+from .metrics_server import start_metrics_server
+from .coalescer import UpdateCoalescer
+from .fanout_scheduler import FanoutScheduler, FANOUT_CHUNK_SIZE
+from .fanout_worker import KafkaFanoutTransport, build_chunk_jobs, publish_chunk_jobs
+from array import array
 import logging
 from dotenv import load_dotenv
 import os
-import json
+import asyncio
+import threading
 from aiokafka import AIOKafkaProducer
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 
 from slowapi import Limiter
 from slowapi.util import get_remote_address
@@ -20,7 +29,6 @@ from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 
 load_dotenv()
-SERVER_URL=os.getenv("SERVER_URL")
 
 LOG_FILE = os.path.join("logs", "notification.log")
 
@@ -33,111 +41,115 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
-class LinkUpdated(BaseModel):
-    link_id: int
-    url: str
-    last_update: str
-    title: str = None
-    user_name: str = None
-    preview: str = None
-
-kafka_producer = None
-KAFKA_TOPIC_TO_SERVER = os.getenv("KAFKA_TOPIC_TO_SERVER")
+dedupe_store = create_dedupe_store()
+ledger_registry = LedgerRegistry()
+subscriber_cache = SubscriberCache()
+subscription_listener = SubscriptionChangeListener(subscriber_cache, router=get_replica_router(parse_replica_dsns()))
+fanout_scheduler = FanoutScheduler()
+fanout_transport = None
+FANOUT_MODE = os.getenv("FANOUT_MODE", "LOCAL").upper()
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", 20))
 
 @app.on_event("startup")
 async def startup_event():
-    global kafka_producer
-    kafka_producer = AIOKafkaProducer(bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS"))
-    await kafka_producer.start()
+    global fanout_transport
+    delivery.kafka_producer = AIOKafkaProducer(bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS"))
+    await delivery.kafka_producer.start()
     logger.info("Kafka producer started")
+    if FANOUT_MODE == "DISTRIBUTED":
+        fanout_transport = KafkaFanoutTransport(os.getenv("KAFKA_BOOTSTRAP_SERVERS"), consume=False)
+        await fanout_transport.start()
+        logger.info("Fan-out jobs are dispatched to workers")
+    subscription_listener.start()
+    start_metrics_server()
 
 @app.on_event("shutdown")
 async def shutdown_event():
-    await kafka_producer.stop()
+    try:
+        await asyncio.wait_for(coalescer.flush_all(), timeout=DRAIN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(f"Coalesced updates were not flushed within {DRAIN_TIMEOUT_SECONDS}s")
+    subscription_listener.stop()
+    if fanout_transport:
+        await fanout_transport.stop()
+    try:
+        await asyncio.wait_for(delivery.kafka_producer.flush(), timeout=DRAIN_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(f"Kafka producer was not flushed within {DRAIN_TIMEOUT_SECONDS}s")
+    await delivery.kafka_producer.stop()
     logger.info("Kafka producer stopped")
 
-def get_links_from_database(link_id: int, offset: int, limit: int):
-    db_service = create_database_service()
-    return db_service.get_users_by_link_id(link_id, offset, limit)
+# One database service per worker thread, so its connection and prepared statements outlive a single page.
+db_services = threading.local()
 
-async def send_with_kafka(update_notification: LinkUpdated):
-    try:
-        offset = 0
-        limit = int(os.getenv("BATCH_SIZE"))
-        while True:
-            telegram_ids = get_links_from_database(update_notification.link_id, offset, limit)
-            offset += limit
-            
-            async with httpx.AsyncClient() as client:
-                for telegram_id in telegram_ids:
-                            notification_data = {
-                                "user_id": telegram_id,
-                                "url": update_notification.url,
-                                "last_update": update_notification.last_update,
-                                "title": update_notification.title,
-                                "user_name": update_notification.user_name,
-                                "preview": update_notification.preview,
-                            }
-                            await kafka_producer.send_and_wait(KAFKA_TOPIC_TO_SERVER, json.dumps(notification_data).encode('utf-8'))
-                            logger.info(f"Notification sent to Kafka topic {KAFKA_TOPIC_TO_SERVER} for link_id: {update_notification.link_id}")
+def get_database_service():
+    db_service = getattr(db_services, "service", None)
+    conn = getattr(db_service, "conn", None)
+    if db_service is None or (conn is not None and conn.closed):
+        db_service = db_services.service = create_database_service()
+    return db_service
+
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", 50))
+
+def get_links_from_database(link_id: int):
+    return get_database_service().get_all_users_by_link_id(link_id, BATCH_SIZE)
+
+def load_subscribers(link_id: int) -> array:
+    cached = subscriber_cache.get(link_id)
+    if cached is not None:
+        return cached
+
+    generation = subscriber_cache.generation
+    telegram_ids = array("q", get_links_from_database(link_id))
+    subscriber_cache.put(link_id, telegram_ids, generation)
+    return telegram_ids
+
+delivery.load_recipients = load_subscribers
+
+async def dispatch_fan_out(update_notification: LinkUpdated, job_id: str, recipients: array) -> dict:
+    jobs = build_chunk_jobs(job_id, update_notification.model_dump(), recipients, FANOUT_CHUNK_SIZE)
+    published = await publish_chunk_jobs(fanout_transport, jobs, dedupe_store)
+    if published < len(jobs):
+        logger.info(f"Skipped {len(jobs) - published} chunks of job {job_id} published by an earlier attempt")
+    logger.info(f"Dispatched {len(jobs)} fan-out chunks for link_id {update_notification.link_id}")
+    return {"status": "dispatched", "message": "Fan-out dispatched to workers", "chunks": len(jobs), "pending": len(recipients)}
 
+async def fan_out(update_notification: LinkUpdated, job_id: str) -> dict:
+    ledger = ledger_registry.get_or_create(job_id)
+    try:
+        recipients = await asyncio.to_thread(get_recipients, update_notification, ledger)
+        if fanout_transport:
+            # Kept until every chunk is out, so a retry here splits the same recipient snapshot.
+            result = await dispatch_fan_out(update_notification, job_id, recipients)
+            ledger_registry.discard(job_id)
+            return result
     except Exception as e:
-        logger.exception(f"Error processing link update: {e}")
+        logger.exception(f"Failed to start fan-out for link_id {update_notification.link_id}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-BATCH_SIZE = int(os.getenv("BATCH_SIZE", 50))
-RETRIES = int(os.getenv("RETRIES", 3))
-TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 3.0))
-BACKOFF = float(os.getenv("BACKOFF_FACTOR", 0.3))
-
-retry_strategy = Retry(
-    total=RETRIES,
-    backoff_factor=BACKOFF,
-    status_forcelist=[429, 500, 502, 503, 504],
-    allowed_methods=["POST"]
-)
+    await fanout_scheduler.run(
+        update_notification.link_id,
+        len(recipients),
+        lambda start, stop: deliver_range(update_notification, ledger, start, stop),
+    )
+    ledger.finish()
 
-adapter = HTTPAdapter(max_retries=retry_strategy)
-session = requests.Session()
-session.mount("http://", adapter)
-session.mount("https://", adapter)
+    if ledger.is_complete():
+        ledger_registry.discard(job_id)
+        return {"status": "ok", "message": "Notifications forwarded", **ledger.counts()}
 
-def send_with_http(update_notification: LinkUpdated) -> dict:
-    try:
-        offset = 0
-        limit = BATCH_SIZE
-
-        while True:
-            telegram_ids = get_links_from_database(update_notification.link_id, offset, limit)
-            if not telegram_ids:
-                break
-            offset += limit
-
-            for telegram_id in telegram_ids:
-                notification_data = {
-                    "user_id": telegram_id,
-                    "url": update_notification.url,
-                    "last_update": update_notification.last_update,
-                    "title": update_notification.title,
-                    "user_name": update_notification.user_name,
-                    "preview": update_notification.preview,
-                }
-                try:
-                    response = session.post(
-                        f"{SERVER_URL}/api/v1/updated/",
-                        json=notification_data,
-                        timeout=TIMEOUT
-                    )
-                    response.raise_for_status()
-                    logger.info(f"Notification sent to {telegram_id}: {response.status_code}")
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Failed to send to {telegram_id}: {e}")
-
-        return {"status": "ok", "message": "Notifications forwarded"}
+    logger.error(f"Both transports failed for link_id {update_notification.link_id}: {ledger.counts()}")
+    raise HTTPException(
+        status_code=500,
+        detail={"message": "Both transports failed to deliver notifications.", **ledger.counts()},
+    )
 
-    except Exception as e:
-        logger.exception(f"Error processing link update: {e}")
-        raise
+async def release_coalesced(job_id: str, keys: list) -> None:
+    ledger_registry.discard(job_id)
+    for key in keys:
+        await dedupe_store.release(key)
+
+coalescer = UpdateCoalescer(fan_out, release_callback=release_coalesced)
 
 limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
@@ -153,28 +165,23 @@ async def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
 
 @app.post("/api/v1/link_updated")
 @limiter.limit("5/minute")
-async def link_updated(update_notification: LinkUpdated):
+async def link_updated(update_notification: LinkUpdated, idempotency_key: Optional[str] = Header(default=None)):
     logger.info(f"Received link update for link_id: {update_notification.link_id}, URL: {update_notification.url}")
 
-    primary = os.getenv("MESSAGE_TRANSPORT", "HTTP").upper()
-    secondary = "KAFKA" if primary == "HTTP" else "HTTP"
+    dedupe_key = build_idempotency_key(update_notification.link_id, update_notification.last_update, idempotency_key)
+    if not await dedupe_store.check_and_set(dedupe_key):
+        logger.info(f"Duplicate link update dropped: {dedupe_key}")
+        return {"status": "duplicate", "message": "Update already processed"}
+
+    if coalescer.enabled:
+        changes = await coalescer.submit(update_notification, dedupe_key)
+        return {"status": "queued", "message": "Update coalesced", "pending_changes": changes}
 
     try:
-        if primary == "HTTP":
-            return send_with_http(update_notification)
-        else:
-            return await send_with_kafka(update_notification)
-    except Exception as primary_error:
-        logger.warning(f"Primary transport '{primary}' failed: {primary_error}. Trying fallback '{secondary}'")
-
-        try:
-            if secondary == "HTTP":
-                return send_with_http(update_notification)
-            else:
-                return await send_with_kafka(update_notification)
-        except Exception as fallback_error:
-            logger.error(f"Both transports failed: primary={primary_error}, fallback={fallback_error}")
-            raise HTTPException(status_code=500, detail="Both transports failed to deliver notifications.")
+        return await fan_out(update_notification, dedupe_key)
+    except HTTPException:
+        await dedupe_store.release(dedupe_key)
+        raise
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8002)
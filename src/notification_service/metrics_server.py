@@ -0,0 +1,42 @@
+from prometheus_client import start_http_server, Counter, Gauge, Histogram
+import threading
+import os
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 8005))
+
+subscriber_cache_hits = Counter(
+    'notification_subscriber_cache_hits_total',
+    'Количество попаданий в кэш подписчиков'
+)
+
+subscriber_cache_misses = Counter(
+    'notification_subscriber_cache_misses_total',
+    'Количество промахов кэша подписчиков'
+)
+
+subscriber_cache_bytes = Gauge(
+    'notification_subscriber_cache_bytes',
+    'Объём памяти, занятый кэшем подписчиков'
+)
+
+subscriber_cache_entries = Gauge(
+    'notification_subscriber_cache_entries',
+    'Количество ссылок в кэше подписчиков'
+)
+
+fanout_queue_latency = Histogram(
+    'notification_fanout_queue_latency_seconds',
+    'Время ожидания чанка рассылки в очереди',
+    ['lane']
+)
+
+fanout_queue_depth = Gauge(
+    'notification_fanout_queue_depth',
+    'Количество чанков рассылки в очереди',
+    ['lane']
+)
+
+def start_metrics_server():
+    thread = threading.Thread(target=start_http_server, args=(METRICS_PORT,))
+    thread.daemon = True
+    thread.start()
@@ -0,0 +1,186 @@
+import logging
+import os
+import select
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+import psycopg2
+from dotenv import load_dotenv
+
+from src.db_replicas import ReplicaRouter
+from .metrics_server import (
+    subscriber_cache_hits,
+    subscriber_cache_misses,
+    subscriber_cache_bytes,
+    subscriber_cache_entries,
+)
+
+load_dotenv()
+
+LOG_FILE = os.path.join("logs", "notification.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+SUBSCRIBER_CACHE_MAX_BYTES = int(os.getenv("SUBSCRIBER_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+SUBSCRIPTIONS_CHANNEL = os.getenv("SUBSCRIPTIONS_CHANNEL", "subscriptions_changed")
+ENTRY_OVERHEAD_BYTES = 64
+
+class SubscriberCache:
+    def __init__(self, max_bytes: int = SUBSCRIBER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[int, array] = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.enabled = True
+        # Bumped on every invalidation so that loads racing with it are not cached.
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(telegram_ids: array) -> int:
+        return len(telegram_ids) * telegram_ids.itemsize + ENTRY_OVERHEAD_BYTES
+
+    def _update_gauges(self) -> None:
+        subscriber_cache_bytes.set(self.size_bytes)
+        subscriber_cache_entries.set(len(self.entries))
+
+    def get(self, link_id: int) -> Optional[array]:
+        with self.lock:
+            telegram_ids = self.entries.get(link_id) if self.enabled else None
+            if telegram_ids is None:
+                self.misses += 1
+                subscriber_cache_misses.inc()
+                return None
+            self.entries.move_to_end(link_id)
+            self.hits += 1
+            subscriber_cache_hits.inc()
+            return telegram_ids
+
+    def put(self, link_id: int, telegram_ids: array, generation: int = None) -> None:
+        size = self._entry_size(telegram_ids)
+        if size > self.max_bytes:
+            logger.info(f"Subscriber list for link {link_id} ({size} bytes) exceeds cache budget")
+            return
+
+        with self.lock:
+            if not self.enabled or (generation is not None and generation != self.generation):
+                return
+            previous = self.entries.pop(link_id, None)
+            if previous is not None:
+                self.size_bytes -= self._entry_size(previous)
+            self.entries[link_id] = telegram_ids
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size_bytes -= self._entry_size(evicted)
+            self._update_gauges()
+
+    def invalidate(self, link_id: int) -> None:
+        with self.lock:
+            self.generation += 1
+            telegram_ids = self.entries.pop(link_id, None)
+            if telegram_ids is not None:
+                self.size_bytes -= self._entry_size(telegram_ids)
+                logger.info(f"Invalidated subscriber cache for link {link_id}")
+            self._update_gauges()
+
+    def set_enabled(self, enabled: bool) -> None:
+        with self.lock:
+            self.enabled = enabled
+            self.generation += 1
+            self.entries.clear()
+            self.size_bytes = 0
+            self._update_gauges()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.size_bytes = 0
+            self._update_gauges()
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class SubscriptionChangeListener:
+    """
+    Invalidates cached subscriber lists on NOTIFY events sent by the subscriptions trigger.
+    The changed link is also recorded as a write on `router`, so the reload that refills the
+    cache reads from the primary rather than from a replica that has not replayed the change yet.
+    """
+
+    def __init__(
+        self,
+        cache: SubscriberCache,
+        router: Optional[ReplicaRouter] = None,
+        channel: str = SUBSCRIPTIONS_CHANNEL,
+        poll_timeout: float = 5.0,
+    ):
+        self.cache = cache
+        self.router = router
+        self.channel = channel
+        self.poll_timeout = poll_timeout
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def _connect(self):
+        conn = psycopg2.connect(
+            host=os.getenv("DB_HOST", "db"),
+            port=os.getenv("DB_PORT", "5432"),
+            database=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+        )
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        conn.cursor().execute(f"LISTEN {self.channel};")
+        return conn
+
+    def handle_notify(self, payload: str) -> None:
+        try:
+            link_id = int(payload)
+        except ValueError:
+            logger.warning(f"Unexpected {self.channel} payload: {payload!r}, clearing cache")
+            self.cache.clear()
+            return
+        # Before invalidating, so that no reload started after the invalidation picks a replica.
+        if self.router is not None:
+            self.router.record_write(link_id)
+        self.cache.invalidate(link_id)
+
+    def _listen(self) -> None:
+        while not self.stopped.is_set():
+            # Without a live LISTEN connection invalidations would be missed.
+            self.cache.set_enabled(False)
+            try:
+                conn = self._connect()
+                self.cache.set_enabled(True)
+                logger.info(f"Listening for {self.channel} notifications")
+                try:
+                    while not self.stopped.is_set():
+                        if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            self.handle_notify(conn.notifies.pop(0).payload)
+                finally:
+                    conn.close()
+            except Exception as e:
+                logger.error(f"Subscription change listener failed: {e}")
+                time.sleep(self.poll_timeout)
+
+    def start(self) -> None:
+        self.thread = threading.Thread(target=self._listen, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from telethon.tl.types import InputPeerUser
+from dotenv import load_dotenv
+
+load_dotenv()
+
+__all__ = (
+    "PeerStore",
+    "FilePeerStore",
+    "RedisPeerStore",
+    "PeerCache",
+    "create_peer_store",
+)
+
+logger = logging.getLogger(__name__)
+
+PEER_CACHE_FILE = os.getenv("PEER_CACHE_FILE", os.path.join("data", "telegram_peers.json"))
+PEER_CACHE_REDIS_KEY = os.getenv("PEER_CACHE_REDIS_KEY", "telegram_peers")
+
+class PeerStore(ABC):
+    """
+    Persistent user_id -> access_hash mapping shared by every process that talks to Telegram
+    as the bot. Access hashes are issued per bot, so the server and bot_logic sessions can reuse them.
+    """
+
+    @abstractmethod
+    async def load_all(self) -> Dict[int, int]:
+        pass
+
+    @abstractmethod
+    async def get(self, user_id: int) -> Optional[int]:
+        pass
+
+    @abstractmethod
+    async def put(self, user_id: int, access_hash: int) -> None:
+        pass
+
+class FilePeerStore(PeerStore):
+    """
+    Keeps the file's mapping in memory and reads the file again only when it was replaced since,
+    which is how other processes' writes show up.
+    """
+
+    def __init__(self, path: str = PEER_CACHE_FILE):
+        self.path = path
+        self.peers: Optional[Dict[int, int]] = None
+        self.signature = None
+        self.lock = asyncio.Lock()
+
+    def _signature(self):
+        # Every write replaces the file, so a new inode or mtime means there is something to reload.
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Dict[int, int]:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return {int(user_id): int(access_hash) for user_id, access_hash in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to read peer cache file {self.path}: {e}")
+            return {}
+
+    def _write(self, peers: Dict[int, int]) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({str(user_id): access_hash for user_id, access_hash in peers.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def _refresh(self) -> Dict[int, int]:
+        # The signature is taken before reading, so a write racing with the read is picked up next time.
+        signature = self._signature()
+        if self.peers is None or signature != self.signature:
+            self.peers = self._read()
+            self.signature = signature
+        return self.peers
+
+    async def load_all(self) -> Dict[int, int]:
+        return dict(await asyncio.to_thread(self._refresh))
+
+    async def get(self, user_id: int) -> Optional[int]:
+        peers = await asyncio.to_thread(self._refresh)
+        return peers.get(user_id)
+
+    async def put(self, user_id: int, access_hash: int) -> None:
+        async with self.lock:
+            peers = dict(await asyncio.to_thread(self._refresh))
+            peers[user_id] = access_hash
+            try:
+                await asyncio.to_thread(self._write, peers)
+            except OSError as e:
+                logger.warning(f"Failed to write peer cache file {self.path}: {e}")
+                return
+            self.peers = peers
+            self.signature = self._signature()
+
+class RedisPeerStore(PeerStore):
+    def __init__(self, client: redis.Redis, key: str = PEER_CACHE_REDIS_KEY):
+        self.client = client
+        self.key = key
+
+    async def load_all(self) -> Dict[int, int]:
+        try:
+            peers = await self.client.hgetall(self.key)
+        except RedisError as e:
+            logger.warning(f"Failed to load peer cache from Redis: {e}")
+            return {}
+        return {int(user_id): int(access_hash) for user_id, access_hash in peers.items()}
+
+    async def get(self, user_id: int) -> Optional[int]:
+        try:
+            access_hash = await self.client.hget(self.key, str(user_id))
+        except RedisError as e:
+            logger.warning(f"Failed to read peer {user_id} from Redis: {e}")
+            return None
+        return int(access_hash) if access_hash is not None else None
+
+    async def put(self, user_id: int, access_hash: int) -> None:
+        try:
+            await self.client.hset(self.key, str(user_id), str(access_hash))
+        except RedisError as e:
+            logger.warning(f"Failed to store peer {user_id} in Redis: {e}")
+
+class PeerCache:
+    """
+    In-process view of the peer store. A hit lets a message be sent to InputPeerUser directly,
+    without Telethon resolving the entity with an extra RPC first.
+    """
+
+    def __init__(self, store: PeerStore):
+        self.store = store
+        self.peers: Dict[int, int] = {}
+
+    async def warm(self) -> int:
+        self.peers.update(await self.store.load_all())
+        logger.info(f"Peer cache warmed with {len(self.peers)} users")
+        return len(self.peers)
+
+    async def get_input_peer(self, user_id: int) -> Optional[InputPeerUser]:
+        access_hash = self.peers.get(user_id)
+        if access_hash is None:
+            access_hash = await self.store.get(user_id)
+            if access_hash is None:
+                return None
+            self.peers[user_id] = access_hash
+        return InputPeerUser(user_id=user_id, access_hash=access_hash)
+
+    async def remember(self, peer) -> None:
+        if not isinstance(peer, InputPeerUser):
+            return
+        if self.peers.get(peer.user_id) == peer.access_hash:
+            return
+        self.peers[peer.user_id] = peer.access_hash
+        await self.store.put(peer.user_id, peer.access_hash)
+
+    async def remember_sender(self, event) -> None:
+        """
+        Event handler that records the sender of every incoming message.
+        """
+        try:
+            await self.remember(await event.get_input_sender())
+        except Exception as e:
+            logger.warning(f"Failed to record peer for sender {event.sender_id}: {e}")
+
+def create_peer_store() -> PeerStore:
+    store_type = os.getenv("PEER_CACHE_STORE", "REDIS").upper()
+
+    if store_type == "REDIS":
+        client = redis.Redis(
+            host=os.getenv("REDIS_HOST", "redis"),
+            port=int(os.getenv("REDIS_PORT", "6379")),
+            socket_timeout=float(os.getenv("REDIS_TIMEOUT", 0.5)),
+            decode_responses=True,
+        )
+        return RedisPeerStore(client)
+    elif store_type == "FILE":
+        return FilePeerStore()
+    else:
+        raise ValueError(f"Invalid peer cache store: {store_type}. Must be 'REDIS' or 'FILE'.")
@@ -0,0 +1,91 @@
+import os
+from typing import Dict, Sequence
+
+import psycopg2
+from dotenv import load_dotenv
+
+__all__ = (
+    "PreparedStatements",
+    "to_positional",
+)
+
+load_dotenv()
+
+# Turn off behind a pooler in transaction mode, where a session's prepared statements are not kept.
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "true").lower() == "true"
+
+def to_positional(sql: str) -> str:
+    """
+    Rewrites psycopg2 %s placeholders as the $1, $2, ... that PREPARE expects.
+    """
+    parts = sql.split("%s")
+    return "".join(
+        part + (f"${index + 1}" if index < len(parts) - 1 else "")
+        for index, part in enumerate(parts)
+    )
+
+class _Session:
+    __slots__ = ("conn", "cursor", "prepared", "stale")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.prepared = set()
+        self.stale = False
+
+class PreparedStatements:
+    """
+    Named statements that are prepared once per connection and then run with EXECUTE on a single
+    reused cursor, so Postgres parses and plans a hot query once per session instead of on every call.
+
+    PREPARE goes out in the same round trip as the first EXECUTE. Prepared statements outlive a
+    rollback, so after any error the set of prepared names is reloaded from pg_prepared_statements,
+    first rolling back the transaction if the error left it aborted.
+    psycopg2 has no driver-side preparation and decodes every row from text.
+    """
+
+    def __init__(self, statements: Dict[str, str], enabled: bool = DB_PREPARED_STATEMENTS):
+        self.statements = {name: (sql, to_positional(sql)) for name, sql in statements.items()}
+        self.enabled = enabled
+        self.sessions: Dict[int, _Session] = {}
+
+    def _session(self, conn) -> _Session:
+        session = self.sessions.get(id(conn))
+        if session is None or session.conn is not conn:
+            # Forget connections that were closed since, e.g. a replica dropped after a failure.
+            self.sessions = {key: s for key, s in self.sessions.items() if not s.conn.closed}
+            session = self.sessions[id(conn)] = _Session(conn)
+        elif session.cursor.closed:
+            session.cursor = conn.cursor()
+        return session
+
+    def execute(self, conn, name: str, params: Sequence = ()):
+        """
+        Runs statement `name` on `conn` and returns the cursor holding its result.
+        """
+        sql, positional = self.statements[name]
+        if not self.enabled:
+            cur = conn.cursor()
+            cur.execute(sql, params)
+            return cur
+
+        session = self._session(conn)
+        cur = session.cursor
+        if session.stale:
+            # The resync would fail too inside a transaction aborted by the error that made the session stale.
+            if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INERROR:
+                conn.rollback()
+            cur.execute("SELECT name FROM pg_prepared_statements")
+            session.prepared = {row[0] for row in cur.fetchall()}
+            session.stale = False
+
+        query = f"EXECUTE {name} ({', '.join(['%s'] * len(params))})" if params else f"EXECUTE {name}"
+        if name not in session.prepared:
+            query = f"PREPARE {name} AS {positional}; {query}"
+        try:
+            cur.execute(query, params)
+        except psycopg2.Error:
+            session.stale = True
+            raise
+        session.prepared.add(name)
+        return cur
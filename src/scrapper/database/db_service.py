@@ -1,10 +1,65 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+import datetime
+
+def build_subscription_page(items: List[Dict], limit: int, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+    """
+    Turns up to `limit` + 1 rows read in scan order (ascending after `after`, descending before
+    `before`) into a page; the extra row only tells whether another page exists in that direction.
+    """
+    has_more = len(items) > limit
+    items = items[:limit]
+    if before is not None:
+        items.reverse()
+        prev_cursor = items[0]["id"] if has_more else None
+        next_cursor = items[-1]["id"] if items else before - 1
+    else:
+        next_cursor = items[-1]["id"] if has_more else None
+        prev_cursor = None
+        if after is not None:
+            prev_cursor = items[0]["id"] if items else after + 1
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+def encode_update_cursor(created_at: datetime.datetime, update_id: int) -> str:
+    return f"{created_at.isoformat()}~{update_id}"
+
+def decode_update_cursor(cursor: str) -> Tuple[datetime.datetime, int]:
+    """
+    Raises ValueError if `cursor` was not produced by encode_update_cursor.
+    """
+    created_at, separator, update_id = cursor.rpartition("~")
+    if not separator:
+        raise ValueError(f"Invalid update cursor: {cursor}")
+    return datetime.datetime.fromisoformat(created_at), int(update_id)
+
+def build_update_page(rows: List[Tuple], limit: int) -> Dict:
+    """
+    Turns up to `limit` + 1 rows (update_id, link_id, created_at, title, user_name, preview),
+    newest first, into a page; `next_cursor` continues with older updates.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = [
+        {
+            "id": update_id,
+            "link_id": link_id,
+            "created_at": created_at.isoformat(),
+            "title": title,
+            "user_name": user_name,
+            "preview": preview,
+        }
+        for update_id, link_id, created_at, title, user_name, preview in rows
+    ]
+    next_cursor = encode_update_cursor(rows[-1][2], rows[-1][0]) if has_more else None
+    return {"items": items, "next_cursor": next_cursor}
 
 class DatabaseService(ABC):
 
     @abstractmethod
-    async def add_subscription(self, user_id: int, url: str, tags: list = None, filters: list = None) -> None:
+    async def add_subscription(self, user_id: int, url: str, tags: list = None, filters: list = None) -> Dict:
+        """
+        Returns the new subscription as an item of get_subscriptions_page: {"id", "url", "type", "created_at"}.
+        """
         pass
 
     @abstractmethod
@@ -15,6 +70,13 @@ class DatabaseService(ABC):
     async def get_subscriptions(self, user_id: int) -> List[Dict]:
         pass
 
+    @abstractmethod
+    async def get_subscriptions_page(self, user_id: int, limit: int, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        """
+        One page of the user's subscriptions ordered by subscription_id, using keyset pagination.
+        """
+        pass
+
     @abstractmethod
     async def get_links(self, offset: int, limit: int) -> List[Dict]:
         pass
@@ -26,3 +88,29 @@ class DatabaseService(ABC):
     @abstractmethod
     async def get_all_user_ids(self) -> List[int]:
         pass
+
+    @abstractmethod
+    async def add_updates(self, updates: List[Dict]) -> None:
+        """
+        Inserts detected updates, each {"link_id", "created_at", "title", "user_name", "preview"}, in one batch.
+        """
+        pass
+
+    @abstractmethod
+    async def get_link_updates(self, link_id: int, limit: int, since: datetime.datetime, before: Optional[str] = None) -> Dict:
+        """
+        One page of the link's updates created at or after `since`, newest first, using keyset
+        pagination over (created_at, update_id). The lower bound keeps the scan to recent partitions.
+        """
+        pass
+
+    @abstractmethod
+    async def maintain_update_partitions(self) -> Dict[str, List[str]]:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        """
+        Releases the service's connections to the primary and the replicas.
+        """
+        pass
@@ -1,10 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, TIMESTAMP, Identity, CheckConstraint
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, TIMESTAMP, Identity, CheckConstraint, Index, UniqueConstraint
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import MetaData
-from typing import List, Dict
-from .db_service import DatabaseService
-from sqlalchemy import select
+from typing import Callable, List, Dict, Optional, Sequence
+from .db_service import DatabaseService, build_subscription_page, build_update_page, decode_update_cursor
+from .update_partitions import maintain_update_partitions
+from sqlalchemy import select, insert, tuple_
+from sqlalchemy.exc import InterfaceError, OperationalError
+from src.db_replicas import DB_REPLICA_CONNECT_TIMEOUT, get_replica_router
 import datetime
 import logging
 from dotenv import load_dotenv
@@ -12,12 +15,14 @@ import os
 
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() == "true"
+
 LOG_FILE = os.path.join("logs", "scrapper.log")
 
 logging.basicConfig(
@@ -51,6 +56,7 @@ class Link(Base):
 
     __table_args__ = (
         CheckConstraint(type.in_(['stackoverflow', 'github']), name='links_type_check'),
+        Index("idx_links_last_checked_at", "last_checked_at"),
     )
 
     subscriptions = relationship("Subscription", back_populates="link")
@@ -65,6 +71,12 @@ class Subscription(Base):
     link_id = Column(Integer, ForeignKey("links.link_id"), nullable=False)
     created_at = Column(TIMESTAMP(timezone=False), nullable=False)
 
+    __table_args__ = (
+        UniqueConstraint("user_id", "link_id", name="uq_subscriptions_user_id_link_id"),
+        Index("idx_subscriptions_user_id_subscription_id", "user_id", "subscription_id"),
+        Index("idx_subscriptions_link_id_subscription_id", "link_id", "subscription_id", "user_id"),
+    )
+
     user = relationship("User", back_populates="subscriptions")
     link = relationship("Link", back_populates="subscriptions")
 
@@ -74,22 +86,58 @@ class Update(Base):
 
     update_id = Column(Integer, Identity(), primary_key=True)
     link_id = Column(Integer, ForeignKey("links.link_id"), nullable=False)
-    created_at = Column(TIMESTAMP(timezone=False), nullable=False)
+    # Part of the primary key because updates is range-partitioned by created_at.
+    created_at = Column(TIMESTAMP(timezone=False), primary_key=True)
     title = Column(String(255))
     user_name = Column(String(255))
     preview = Column(String)
 
+    __table_args__ = (
+        Index("idx_updates_link_id_created_at_update_id", "link_id", "created_at", "update_id"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
     link = relationship("Link", back_populates="updates")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 class OrmDatabaseService(DatabaseService):
-    def __init__(self):
+    def __init__(self, replica_dsns: Sequence[str] = ()):
         self.engine = create_engine(DATABASE_URL)
-        Base.metadata.create_all(bind=self.engine)
+        # The schema is owned by migrations/db.changelog-master.xml; create_all is only for throwaway databases.
+        if DB_CREATE_SCHEMA:
+            Base.metadata.create_all(bind=self.engine)
         self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.router = get_replica_router(replica_dsns)
+        self.replica_sessions = {}
+
+    def _replica_session(self, dsn: str):
+        if dsn not in self.replica_sessions:
+            engine = create_engine(dsn, pool_pre_ping=True, connect_args={"connect_timeout": DB_REPLICA_CONNECT_TIMEOUT})
+            self.replica_sessions[dsn] = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        return self.replica_sessions[dsn]()
+
+    def _read(self, read: Callable, key: int = None):
+        """
+        Runs read(session) on a replica chosen by the router, or on the primary when none is usable.
+        """
+        replica = self.router.choose(key)
+        if replica is not None:
+            db = self._replica_session(replica)
+            try:
+                return read(db)
+            except (OperationalError, InterfaceError) as e:
+                logger.warning(f"Read on a replica failed, retrying on the primary: {e}")
+                self.router.mark_down(replica)
+            finally:
+                db.close()
+        db = self.SessionLocal()
+        try:
+            return read(db)
+        finally:
+            db.close()
 
-    async def add_subscription(self, telegram_id: int, url: str, tags: list = None, filters: list = None) -> None:
+    async def add_subscription(self, telegram_id: int, url: str, tags: list = None, filters: list = None) -> Dict:
         db = self.SessionLocal()
         try:
             user = db.query(User).filter(User.telegram_id == telegram_id).first()
@@ -101,18 +149,18 @@ class OrmDatabaseService(DatabaseService):
 
             user_id = user.user_id
 
+            if "stackoverflow.com" in url:
+                link_type = "stackoverflow"
+            elif "github.com" in url:
+                link_type = "github"
+            else:
+                raise ValueError("Invalid URL type")
+
             link = db.query(Link).filter(Link.url == url).first()
 
             if link:
                 link_id = link.link_id
             else:
-                if "stackoverflow.com" in url:
-                    link_type = "stackoverflow"
-                elif "github.com" in url:
-                    link_type = "github"
-                else:
-                    raise ValueError("Invalid URL type")
-
                 link = Link(url=url, type=link_type, last_checked_at=datetime.datetime.utcnow())
                 db.add(link)
                 db.commit()
@@ -121,6 +169,13 @@ class OrmDatabaseService(DatabaseService):
             subscription = Subscription(user_id=user_id, link_id=link_id, created_at=datetime.datetime.utcnow())
             db.add(subscription)
             db.commit()
+            self.router.record_write(telegram_id)
+            return {
+                "id": subscription.subscription_id,
+                "url": url,
+                "type": link_type,
+                "created_at": subscription.created_at.isoformat(),
+            }
 
         except Exception as e:
             db.rollback()
@@ -148,6 +203,7 @@ class OrmDatabaseService(DatabaseService):
                 if subscription:
                     db.delete(subscription)
                     db.commit()
+                    self.router.record_write(telegram_id)
             else:
                 print(f"Link with URL '{url}' not found.")
                 raise ValueError(f"Link with URL '{url}' not found.")
@@ -160,45 +216,70 @@ class OrmDatabaseService(DatabaseService):
             db.close()
 
     async def get_subscriptions(self, telegram_id: int) -> List[Dict]:
-        db = self.SessionLocal()
-        try:
-            user = db.query(User).filter(User.telegram_id == telegram_id).first()
-
-            if not user:
-                user = User(telegram_id=telegram_id)
-                db.add(user)
-                db.commit()
-
-            user_id = user.user_id
-            
-            subscriptions = db.query(Subscription).join(Link).filter(Subscription.user_id == user_id).all()
+        def read(db):
+            return (
+                db.query(Link.url, Link.type, Subscription.created_at)
+                .join(Subscription, Subscription.link_id == Link.link_id)
+                .join(User, Subscription.user_id == User.user_id)
+                .filter(User.telegram_id == telegram_id)
+                .all()
+            )
 
+        try:
             subscription_list = []
-            for subscription in subscriptions:
+            for url, link_type, created_at in self._read(read, telegram_id):
                 subscription_list.append({
-                    "url": subscription.link.url,
-                    "type": subscription.link.type,
-                    "created_at": subscription.created_at.isoformat()
+                    "url": url,
+                    "type": link_type,
+                    "created_at": created_at.isoformat()
                 })
 
             return subscription_list
         except Exception as e:
             print(f"Error getting subscriptions: {e}")
             raise
-        finally:
-            db.close()
 
-    async def get_links(self, offset: int, limit: int) -> List[Dict]:
-        db = self.SessionLocal()
+    async def get_subscriptions_page(self, telegram_id: int, limit: int, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        def read(db):
+            query = (
+                db.query(Subscription.subscription_id, Link.url, Link.type, Subscription.created_at)
+                .join(Link, Subscription.link_id == Link.link_id)
+                .join(User, Subscription.user_id == User.user_id)
+                .filter(User.telegram_id == telegram_id)
+            )
+            if before is not None:
+                query = query.filter(Subscription.subscription_id < before).order_by(Subscription.subscription_id.desc())
+            else:
+                if after is not None:
+                    query = query.filter(Subscription.subscription_id > after)
+                query = query.order_by(Subscription.subscription_id)
+            return query.limit(limit + 1).all()
 
         try:
+            items = [
+                {
+                    "id": subscription_id,
+                    "url": url,
+                    "type": link_type,
+                    "created_at": created_at.isoformat()
+                }
+                for subscription_id, url, link_type, created_at in self._read(read, telegram_id)
+            ]
+            return build_subscription_page(items, limit, after, before)
+        except Exception as e:
+            print(f"Error getting subscriptions page: {e}")
+            raise
+
+    async def get_links(self, offset: int, limit: int) -> List[Dict]:
+        def read(db):
             links = db.query(Link).order_by(Link.last_checked_at).offset(offset).limit(limit).all()
             return [link.__dict__ for link in links]
+
+        try:
+            return self._read(read)
         except Exception as e:
             print(f"Error getting links: {e}")
             raise
-        finally:
-            db.close()
 
     async def update_last_checked_at(self, link_id: int) -> None:
         db = self.SessionLocal()
@@ -227,4 +308,58 @@ class OrmDatabaseService(DatabaseService):
             print(f"Error getting all user IDs: {e}")
             raise
         finally:
-            db.close()
\ No newline at end of file
+            db.close()
+
+    async def add_updates(self, updates: List[Dict]) -> None:
+        if not updates:
+            return
+        db = self.SessionLocal()
+        try:
+            # A list of parameter sets is sent as batched multi-row INSERTs, not one statement per row.
+            db.execute(insert(Update), [
+                {
+                    "link_id": update["link_id"],
+                    "created_at": update["created_at"],
+                    "title": update.get("title"),
+                    "user_name": update.get("user_name"),
+                    "preview": update.get("preview"),
+                }
+                for update in updates
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Error adding updates: {e}")
+            raise
+        finally:
+            db.close()
+
+    async def get_link_updates(self, link_id: int, limit: int, since: datetime.datetime, before: Optional[str] = None) -> Dict:
+        db = self.SessionLocal()
+        try:
+            query = (
+                db.query(Update.update_id, Update.link_id, Update.created_at, Update.title, Update.user_name, Update.preview)
+                .filter(Update.link_id == link_id, Update.created_at >= since)
+            )
+            if before is not None:
+                query = query.filter(tuple_(Update.created_at, Update.update_id) < decode_update_cursor(before))
+            rows = query.order_by(Update.created_at.desc(), Update.update_id.desc()).limit(limit + 1).all()
+            return build_update_page([tuple(row) for row in rows], limit)
+        except Exception as e:
+            print(f"Error getting updates of link {link_id}: {e}")
+            raise
+        finally:
+            db.close()
+
+    async def maintain_update_partitions(self) -> Dict[str, List[str]]:
+        conn = self.engine.raw_connection()
+        try:
+            return maintain_update_partitions(conn)
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self.engine.dispose()
+        for make_session in self.replica_sessions.values():
+            make_session.kw["bind"].dispose()
+        self.replica_sessions.clear()
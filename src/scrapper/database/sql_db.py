@@ -1,14 +1,19 @@
 import psycopg2
-from typing import List, Dict
-from .db_service import DatabaseService
+import psycopg2.extras
+import datetime
+from typing import Callable, List, Dict, Optional, Sequence
+from src.db_replicas import DB_REPLICA_CONNECT_TIMEOUT, get_replica_router
+from src.prepared_statements import PreparedStatements
+from .db_service import DatabaseService, build_subscription_page, build_update_page, decode_update_cursor
+from .update_partitions import maintain_update_partitions
 import logging
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
-DB_HOST = os.getenv("DB_HOST")
-DB_PORT = os.getenv("DB_PORT")
+DB_HOST = os.getenv("DB_HOST", "db")
+DB_PORT = os.getenv("DB_PORT", "5432")
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
@@ -22,9 +27,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Hot statements, prepared once per connection.
+STATEMENTS = {
+    "user_id_by_telegram_id": "SELECT user_id FROM users WHERE telegram_id = %s",
+    "insert_user": "INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id",
+    "link_id_by_url": "SELECT link_id FROM links WHERE url = %s",
+    "insert_link": "INSERT INTO links (url, type, last_checked_at) VALUES (%s, %s, NOW()) RETURNING link_id",
+    "insert_subscription": "INSERT INTO subscriptions (user_id, link_id, created_at) VALUES (%s, %s, NOW()) RETURNING subscription_id, created_at",
+    "delete_subscription": "DELETE FROM subscriptions WHERE user_id = %s AND link_id = %s",
+    "subscriptions": """
+        SELECT l.url, l.type, s.created_at
+        FROM subscriptions s
+        JOIN users u ON s.user_id = u.user_id
+        JOIN links l ON s.link_id = l.link_id
+        WHERE u.telegram_id = %s
+    """,
+    "subscriptions_page_after": """
+        SELECT s.subscription_id, l.url, l.type, s.created_at
+        FROM subscriptions s
+        JOIN users u ON s.user_id = u.user_id
+        JOIN links l ON s.link_id = l.link_id
+        WHERE u.telegram_id = %s AND s.subscription_id > %s
+        ORDER BY s.subscription_id ASC
+        LIMIT %s
+    """,
+    "subscriptions_page_before": """
+        SELECT s.subscription_id, l.url, l.type, s.created_at
+        FROM subscriptions s
+        JOIN users u ON s.user_id = u.user_id
+        JOIN links l ON s.link_id = l.link_id
+        WHERE u.telegram_id = %s AND s.subscription_id < %s
+        ORDER BY s.subscription_id DESC
+        LIMIT %s
+    """,
+    "links_by_last_checked_at": "SELECT link_id, url, last_checked_at FROM links ORDER BY last_checked_at ASC LIMIT %s OFFSET %s",
+    "touch_link": "UPDATE links SET last_checked_at = NOW() WHERE link_id = %s",
+    "link_updates": """
+        SELECT update_id, link_id, created_at, title, user_name, preview
+        FROM updates
+        WHERE link_id = %s AND created_at >= %s
+        ORDER BY created_at DESC, update_id DESC
+        LIMIT %s
+    """,
+    "link_updates_before": """
+        SELECT update_id, link_id, created_at, title, user_name, preview
+        FROM updates
+        WHERE link_id = %s AND created_at >= %s AND (created_at, update_id) < (%s, %s)
+        ORDER BY created_at DESC, update_id DESC
+        LIMIT %s
+    """,
+}
+
 class SqlDatabaseService(DatabaseService):
-    def __init__(self):
+    def __init__(self, replica_dsns: Sequence[str] = ()):
         self.conn = self._get_db_connection()
+        self.router = get_replica_router(replica_dsns)
+        self.replica_conns = {}
+        self.statements = PreparedStatements(STATEMENTS)
 
     def _get_db_connection(self):
         try:
@@ -40,47 +99,66 @@ class SqlDatabaseService(DatabaseService):
             print(f"Error connecting to the database: {e}")
             raise
 
-    async def add_subscription(self, user_id: int, url: str, tags: list = None, filters: list = None) -> None:
+    def close(self) -> None:
+        for conn in [self.conn, *self.replica_conns.values()]:
+            if not conn.closed:
+                conn.close()
+        self.replica_conns.clear()
+        self.statements.sessions.clear()
+
+    def _replica_connection(self, dsn: str):
+        conn = self.replica_conns.get(dsn)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(dsn, connect_timeout=DB_REPLICA_CONNECT_TIMEOUT)
+            # No transaction is left open between reads, so the standby never waits on our snapshot.
+            conn.autocommit = True
+            self.replica_conns[dsn] = conn
+        return conn
+
+    def _read(self, read: Callable, key: int = None):
+        """
+        Runs read(conn) on a replica chosen by the router, or on the primary when none is usable.
+        """
+        replica = self.router.choose(key)
+        if replica is not None:
+            try:
+                return read(self._replica_connection(replica))
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                logger.warning(f"Read on a replica failed, retrying on the primary: {e}")
+                self.router.mark_down(replica)
+                conn = self.replica_conns.pop(replica, None)
+                if conn is not None:
+                    conn.close()
+        return read(self.conn)
+
+    async def add_subscription(self, user_id: int, url: str, tags: list = None, filters: list = None) -> Dict:
         try:
-            cur = self.conn.cursor()
-
-            cur.execute("SELECT user_id FROM users WHERE telegram_id = %s", (user_id,))
-            user_result = cur.fetchone()
+            user_result = self.statements.execute(self.conn, "user_id_by_telegram_id", (user_id,)).fetchone()
 
             if not user_result:
-                cur.execute(
-                    "INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id",
-                    (user_id,)
-                )
-                telegram_id = cur.fetchone()[0]
+                telegram_id = self.statements.execute(self.conn, "insert_user", (user_id,)).fetchone()[0]
             else:
                 telegram_id = user_result[0]
 
-            cur.execute("SELECT link_id FROM links WHERE url = %s", (url,))
-            link_id_result = cur.fetchone()
+            if "stackoverflow.com" in url:
+                link_type = "stackoverflow"
+            elif "github.com" in url:
+                link_type = "github"
+            else:
+                raise ValueError("Invalid URL type")
+
+            link_id_result = self.statements.execute(self.conn, "link_id_by_url", (url,)).fetchone()
 
             if link_id_result:
                 link_id = link_id_result[0]
             else:
-                if "stackoverflow.com" in url:
-                    link_type = "stackoverflow"
-                elif "github.com" in url:
-                    link_type = "github"
-                else:
-                    raise ValueError("Invalid URL type")
-
-                cur.execute(
-                    "INSERT INTO links (url, type, last_checked_at) VALUES (%s, %s, NOW()) RETURNING link_id",
-                    (url, link_type)
-                )
-                link_id = cur.fetchone()[0]
-
-            cur.execute(
-                "INSERT INTO subscriptions (user_id, link_id, created_at) VALUES (%s, %s, NOW())",
-                (telegram_id, link_id)
-            )
+                link_id = self.statements.execute(self.conn, "insert_link", (url, link_type)).fetchone()[0]
+
+            subscription_id, created_at = self.statements.execute(self.conn, "insert_subscription", (telegram_id, link_id)).fetchone()
 
             self.conn.commit()
+            self.router.record_write(user_id)
+            return {"id": subscription_id, "url": url, "type": link_type, "created_at": created_at.isoformat()}
         except Exception as e:
             self.conn.rollback()
             print(f"Error adding subscription: {e}")
@@ -88,72 +166,37 @@ class SqlDatabaseService(DatabaseService):
 
     async def delete_subscription(self, user_id: int, url: str) -> None:
         try:
-            cur = self.conn.cursor()
-            
-            cur.execute("SELECT user_id FROM users WHERE telegram_id = %s", (user_id,))
-            user_result = cur.fetchone()
+            user_result = self.statements.execute(self.conn, "user_id_by_telegram_id", (user_id,)).fetchone()
 
             if not user_result:
-                cur.execute(
-                    "INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id",
-                    (user_id,)
-                )
-                telegram_id = cur.fetchone()[0]
+                telegram_id = self.statements.execute(self.conn, "insert_user", (user_id,)).fetchone()[0]
             else:
                 telegram_id = user_result[0]
 
-            cur.execute("SELECT link_id FROM links WHERE url = %s", (url,))
-
-            link_id_result = cur.fetchone()
-            link_id = link_id_result
+            link_id_result = self.statements.execute(self.conn, "link_id_by_url", (url,)).fetchone()
 
-            if not link_id:
+            if not link_id_result:
                 raise ValueError("Url not found in subscriptions")
 
+            link_id = link_id_result[0]
             logger.info("Found link to delete: {link_id}")
 
-            cur.execute(
-                """
-                DELETE FROM subscriptions
-                WHERE user_id = %s AND link_id = %s;
-                """,
-                (telegram_id, link_id)
-            )
+            self.statements.execute(self.conn, "delete_subscription", (telegram_id, link_id))
 
             self.conn.commit()
+            self.router.record_write(user_id)
         except Exception as e:
             self.conn.rollback()
             logger.error("Error during delete: {e}")
             raise
 
     async def get_subscriptions(self, telegram_id: int) -> List[Dict]:
-        try:
-            cur = self.conn.cursor()
-
-            cur.execute("SELECT user_id FROM users WHERE telegram_id = %s", (telegram_id,))
-            user_result = cur.fetchone()
-
-            if not user_result:
-                cur.execute(
-                    "INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id",
-                    (telegram_id,)
-                )
-                user_id = cur.fetchone()[0]
-            else:
-                user_id = user_result[0]
-
-            cur.execute(
-                """
-                SELECT l.url, l.type, s.created_at
-                FROM subscriptions s
-                JOIN links l ON s.link_id = l.link_id
-                WHERE s.user_id = %s;
-                """,
-                (user_id,)
-            )
+        def read(conn):
+            return self.statements.execute(conn, "subscriptions", (telegram_id,)).fetchall()
 
+        try:
             subscriptions = []
-            for row in cur.fetchall():
+            for row in self._read(read, telegram_id):
                 subscriptions.append({
                     "url": row[0],
                     "type": row[1],
@@ -162,34 +205,52 @@ class SqlDatabaseService(DatabaseService):
 
             return subscriptions
         except Exception as e:
+            self.conn.rollback()
             print(f"Error getting subscriptions: {e}")
             raise
 
-    async def get_links(self, offset: int, limit: int) -> List[Dict]:
+    async def get_subscriptions_page(self, telegram_id: int, limit: int, after: Optional[int] = None, before: Optional[int] = None) -> Dict:
+        if before is not None:
+            statement, cursor = "subscriptions_page_before", before
+        else:
+            statement, cursor = "subscriptions_page_after", after if after is not None else 0
+
+        def read(conn):
+            return self.statements.execute(conn, statement, (telegram_id, cursor, int(limit) + 1)).fetchall()
+
         try:
-            cur = self.conn.cursor()
-            limit = int(limit)
-            offset = int(offset)
-            cur.execute(
-                "SELECT link_id, url, last_checked_at FROM links ORDER BY last_checked_at ASC LIMIT %s OFFSET %s",
-                (limit, offset),
-            )
+            items = [
+                {
+                    "id": row[0],
+                    "url": row[1],
+                    "type": row[2],
+                    "created_at": row[3].isoformat()
+                }
+                for row in self._read(read, telegram_id)
+            ]
+            return build_subscription_page(items, limit, after, before)
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error getting subscriptions page: {e}")
+            raise
+
+    async def get_links(self, offset: int, limit: int) -> List[Dict]:
+        def read(conn):
+            cur = self.statements.execute(conn, "links_by_last_checked_at", (int(limit), int(offset)))
 
             column_names = [desc[0] for desc in cur.description]
-            links = [dict(zip(column_names, row)) for row in cur.fetchall()]
+            return [dict(zip(column_names, row)) for row in cur.fetchall()]
 
-            return links
+        try:
+            return self._read(read)
         except Exception as e:
+            self.conn.rollback()
             print(f"Error getting links: {e}")
             raise
 
     async def update_last_checked_at(self, link_id: int) -> None:
         try:
-            cur = self.conn.cursor()
-            cur.execute(
-                "UPDATE links SET last_checked_at = NOW() WHERE link_id = %s",
-                (link_id,),
-            )
+            self.statements.execute(self.conn, "touch_link", (link_id,))
             self.conn.commit()
         except Exception as e:
             self.conn.rollback()
@@ -205,5 +266,43 @@ class SqlDatabaseService(DatabaseService):
             user_ids = [row[0] for row in cur.fetchall()]
             return user_ids
         except Exception as e:
+            self.conn.rollback()
             print(f"Error getting all user IDs: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def add_updates(self, updates: List[Dict]) -> None:
+        if not updates:
+            return
+        try:
+            cur = self.conn.cursor()
+            psycopg2.extras.execute_values(
+                cur,
+                "INSERT INTO updates (link_id, created_at, title, user_name, preview) VALUES %s",
+                [
+                    (update["link_id"], update["created_at"], update.get("title"), update.get("user_name"), update.get("preview"))
+                    for update in updates
+                ],
+                page_size=len(updates),
+            )
+            self.conn.commit()
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error adding updates: {e}")
+            raise
+
+    async def get_link_updates(self, link_id: int, limit: int, since: datetime.datetime, before: Optional[str] = None) -> Dict:
+        try:
+            statement, params = "link_updates", (link_id, since)
+            if before is not None:
+                statement = "link_updates_before"
+                params += decode_update_cursor(before)
+
+            cur = self.statements.execute(self.conn, statement, params + (int(limit) + 1,))
+            return build_update_page(cur.fetchall(), limit)
+        except Exception as e:
+            self.conn.rollback()
+            print(f"Error getting updates of link {link_id}: {e}")
+            raise
+
+    async def maintain_update_partitions(self) -> Dict[str, List[str]]:
+        return maintain_update_partitions(self.conn)
@@ -0,0 +1,163 @@
+"""
+Monthly range partitions of the `updates` table.
+
+`updates` is partitioned by created_at (migrations/db.changelog-master.xml, changeSet 11). Every
+partition covers one calendar month and is named updates_pYYYY_MM; rows outside all of them land
+in updates_default. maintain_update_partitions keeps partitions from the retention cutoff up to
+UPDATES_PARTITIONS_AHEAD months ahead and drops whole partitions once they fall out of retention,
+which is a cheap DROP TABLE instead of a DELETE over millions of rows.
+"""
+import datetime
+import logging
+import os
+import re
+from typing import Dict, List
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+UPDATES_RETENTION_DAYS = int(os.getenv("UPDATES_RETENTION_DAYS", 90))
+UPDATES_PARTITIONS_AHEAD = int(os.getenv("UPDATES_PARTITIONS_AHEAD", 2))
+
+DEFAULT_PARTITION = "updates_default"
+PARTITION_NAME = re.compile(r"^updates_p(\d{4})_(\d{2})$")
+# Serializes maintenance across scrapper replicas; the value is arbitrary but fixed.
+MAINTENANCE_LOCK_ID = 4801
+
+LOG_FILE = os.path.join("logs", "scrapper.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+def month_start(day: datetime.date) -> datetime.date:
+    return datetime.date(day.year, day.month, 1)
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime.date) -> str:
+    return f"updates_p{month.year:04d}_{month.month:02d}"
+
+def partition_month(name: str):
+    match = PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1)
+
+def retention_cutoff(today: datetime.date, retention_days: int) -> datetime.date:
+    return today - datetime.timedelta(days=retention_days)
+
+def months_to_keep(today: datetime.date, retention_days: int, months_ahead: int) -> List[datetime.date]:
+    """
+    Months from the one containing the retention cutoff up to `months_ahead` after the current one.
+    """
+    month = month_start(retention_cutoff(today, retention_days))
+    last = add_months(month_start(today), months_ahead)
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+def expired_partitions(names: List[str], today: datetime.date, retention_days: int) -> List[str]:
+    """
+    Monthly partitions whose every row is older than the retention cutoff.
+    """
+    cutoff = retention_cutoff(today, retention_days)
+    expired = []
+    for name in names:
+        month = partition_month(name)
+        if month is not None and add_months(month, 1) <= cutoff:
+            expired.append(name)
+    return sorted(expired)
+
+def create_partition(cur, name: str, month: datetime.date, has_default: bool) -> None:
+    """
+    Creates the partition for `month`. Rows of that month already in the default partition would
+    make CREATE fail, so they are moved out first and inserted again through `updates`.
+    """
+    bounds = (month, add_months(month, 1))
+    moved = None
+    if has_default:
+        cur.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s)",
+            bounds,
+        )
+        if cur.fetchone()[0]:
+            moved = f"{name}_moved"
+            cur.execute(
+                f"CREATE TEMP TABLE {moved} ON COMMIT DROP AS "
+                f"SELECT * FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s",
+                bounds,
+            )
+            cur.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s", bounds)
+    # Range partitions go first: adding one later would have to scan the default partition.
+    cur.execute(f"CREATE TABLE {name} PARTITION OF updates FOR VALUES FROM (%s) TO (%s)", bounds)
+    if moved is not None:
+        cur.execute(f"SELECT * FROM {moved} LIMIT 0")
+        columns = ", ".join(column[0] for column in cur.description)
+        cur.execute(f"INSERT INTO updates ({columns}) SELECT {columns} FROM {moved}")
+        logger.info(f"Moved {cur.rowcount} rows of {name} out of {DEFAULT_PARTITION}")
+
+def maintain_update_partitions(
+    conn,
+    today: datetime.date = None,
+    retention_days: int = UPDATES_RETENTION_DAYS,
+    months_ahead: int = UPDATES_PARTITIONS_AHEAD,
+) -> Dict[str, List[str]]:
+    """
+    Creates the missing monthly partitions and the default one, drops expired partitions and
+    deletes expired rows from the default partition. A month that still cannot be created is
+    logged and skipped. `conn` is a DB-API connection; the work is committed in one transaction.
+    Returns {"created": [...], "dropped": [...]}.
+    """
+    today = today or datetime.datetime.utcnow().date()
+    cutoff = retention_cutoff(today, retention_days)
+    created, dropped = [], []
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (MAINTENANCE_LOCK_ID,))
+        cur.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'updates'::regclass"
+        )
+        existing = {row[0] for row in cur.fetchall()}
+
+        for month in months_to_keep(today, retention_days, months_ahead):
+            name = partition_name(month)
+            if name in existing:
+                continue
+            # A month that cannot be created must not keep expired partitions from being dropped.
+            cur.execute("SAVEPOINT create_partition")
+            try:
+                create_partition(cur, name, month, DEFAULT_PARTITION in existing)
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT create_partition")
+                logger.error(f"Failed to create updates partition {name}, skipping it: {e}")
+                continue
+            cur.execute("RELEASE SAVEPOINT create_partition")
+            created.append(name)
+        if DEFAULT_PARTITION not in existing:
+            cur.execute(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF updates DEFAULT")
+            created.append(DEFAULT_PARTITION)
+
+        for name in expired_partitions(list(existing), today, retention_days):
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+        cur.execute(f"DELETE FROM {DEFAULT_PARTITION} WHERE created_at < %s", (cutoff,))
+
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.exception(f"Failed to maintain updates partitions: {e}")
+        raise
+
+    if created or dropped:
+        logger.info(f"Updates partitions created: {created}, dropped: {dropped}")
+    return {"created": created, "dropped": dropped}
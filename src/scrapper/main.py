@@ -1,15 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
 from pydantic import BaseModel
 import uvicorn
 import os
 import logging
 import asyncio
-from typing import Optional, List
+import datetime
+from typing import Annotated, Optional, List
 from prometheus_client import start_http_server, Counter
 import threading
 
 from .subscription_service import SubscriptionService
 from .database.database import create_database_service, DatabaseService
+from .database.db_service import decode_update_cursor
+from .database.update_partitions import UPDATES_RETENTION_DAYS
 from .stackoverflow_client import StackOverflowClient
 from .github_client import GitHubClient
 from .metrics_server import start_metrics_server, notifications_counter
@@ -28,25 +31,57 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+SUBSCRIPTIONS_PAGE_MAX_LIMIT = int(os.getenv("SUBSCRIPTIONS_PAGE_MAX_LIMIT", 100))
+SWEEP_DRAIN_TIMEOUT_SECONDS = float(os.getenv("SWEEP_DRAIN_TIMEOUT_SECONDS", 20))
+UPDATES_PAGE_MAX_LIMIT = int(os.getenv("UPDATES_PAGE_MAX_LIMIT", 100))
+UPDATES_HISTORY_DAYS = int(os.getenv("UPDATES_HISTORY_DAYS", 30))
+UPDATES_PARTITION_MAINTENANCE_INTERVAL = int(os.getenv("UPDATES_PARTITION_MAINTENANCE_INTERVAL", 3600))
+
+# Set on shutdown: the running sweep stops after the link in hand and no new sweep starts.
+sweep_stopping = asyncio.Event()
+sweep_tasks: set[asyncio.Task] = set()
+
+def track_sweep(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    sweep_tasks.add(task)
+    task.add_done_callback(sweep_tasks.discard)
+    return task
+
 def get_stackoverflow_client():
     return StackOverflowClient()
 
 def get_github_client():
     return GitHubClient()
 
+# One database service per process: the SQL backend keeps its connection and prepared statements,
+# and requests, sweeps and partition maintenance all run on the event loop thread.
+database_service: Optional[DatabaseService] = None
+
+def get_database_service() -> DatabaseService:
+    global database_service
+    conn = getattr(database_service, "conn", None)
+    if database_service is None or (conn is not None and conn.closed):
+        database_service = create_database_service()
+    return database_service
+
+def close_database_service() -> None:
+    global database_service
+    if database_service is not None:
+        database_service.close()
+        database_service = None
+
 async def get_subscription_service(
-    db_service: DatabaseService = Depends(create_database_service),
+    db_service: DatabaseService = Depends(get_database_service),
     stackoverflow_client: StackOverflowClient = Depends(get_stackoverflow_client),
     github_client: GitHubClient = Depends(get_github_client)
 ):
     return SubscriptionService(db_service=db_service, stackoverflow_client=stackoverflow_client, github_client=github_client)
 
 async def get_subscription_service_update(
-    db_service: DatabaseService = create_database_service(),
     stackoverflow_client: StackOverflowClient =  get_stackoverflow_client(),
     github_client: GitHubClient = get_github_client()
 ):
-    return SubscriptionService(db_service=db_service, stackoverflow_client=stackoverflow_client, github_client=github_client)
+    return SubscriptionService(db_service=get_database_service(), stackoverflow_client=stackoverflow_client, github_client=github_client)
 
 
 class SubscriptionRequest(BaseModel):
@@ -93,15 +128,50 @@ async def delete_subscription(
 @app.get("/api/v1/subscriptions/{user_id}")
 async def get_subscriptions(
     user_id: int,
+    limit: Annotated[Optional[int], Query(ge=1, le=SUBSCRIPTIONS_PAGE_MAX_LIMIT)] = None,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
     subscription_service: SubscriptionService = Depends(get_subscription_service)
 ):
+    """
+    Without `limit` returns every subscription of the user. With `limit` returns one page
+    {"items", "next_cursor", "prev_cursor"}; pass a cursor back as `after` or `before`.
+    """
+    if after is not None and before is not None:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
     try:
+        if limit is not None:
+            return await subscription_service.get_subscriptions_page(user_id=user_id, limit=limit, after=after, before=before)
         subscriptions = await subscription_service.get_subscriptions(user_id=user_id)
         return subscriptions
     except Exception as e:
         logger.exception(f"Failed to get subscriptions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/links/{link_id}/updates")
+async def get_link_updates(
+    link_id: int,
+    limit: Annotated[int, Query(ge=1, le=UPDATES_PAGE_MAX_LIMIT)] = 20,
+    before: Optional[str] = None,
+    days: Annotated[int, Query(ge=1, le=UPDATES_RETENTION_DAYS)] = UPDATES_HISTORY_DAYS,
+    subscription_service: SubscriptionService = Depends(get_subscription_service)
+):
+    """
+    Updates of the link from the last `days` days, newest first: {"items", "next_cursor"}.
+    Pass `next_cursor` back as `before` for older updates.
+    """
+    if before is not None:
+        try:
+            decode_update_cursor(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid 'before' cursor")
+    since = datetime.datetime.utcnow() - datetime.timedelta(days=days)
+    try:
+        return await subscription_service.get_link_updates(link_id=link_id, limit=limit, since=since, before=before)
+    except Exception as e:
+        logger.exception(f"Failed to get updates of link {link_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/api/v1/check_updates/")
 async def check_updates(
     subscription_service: SubscriptionService = Depends(get_subscription_service)
@@ -110,7 +180,7 @@ async def check_updates(
         server_url = os.getenv("SERVER_URL")
         if not server_url:
             raise HTTPException(status_code=500, detail="SERVER_URL environment variable not set.")
-        asyncio.create_task(subscription_service.check_updates(server_url))
+        track_sweep(subscription_service.check_updates(sweep_stopping))
         return {"status": "ok"}
     except Exception as e:
         logger.exception(f"Failed to check updates: {e}")
@@ -118,19 +188,48 @@ async def check_updates(
 
 async def check_updates_periodically():
     check_interval = int(os.getenv("CHECK_UPDATE_INTERVAL", 60))
-    while True:
+    while not sweep_stopping.is_set():
         try:
             subscription_service: SubscriptionService = await get_subscription_service_update()
-            await subscription_service.check_updates()
+            await subscription_service.check_updates(sweep_stopping)
         except Exception as e:
             logger.exception(f"Failed to check updates: {e}")
-        await asyncio.sleep(int(check_interval))
+        try:
+            await asyncio.wait_for(sweep_stopping.wait(), timeout=check_interval)
+        except asyncio.TimeoutError:
+            pass
+
+async def maintain_update_partitions_periodically():
+    while not sweep_stopping.is_set():
+        try:
+            await get_database_service().maintain_update_partitions()
+        except Exception as e:
+            logger.exception(f"Failed to maintain updates partitions: {e}")
+        try:
+            await asyncio.wait_for(sweep_stopping.wait(), timeout=UPDATES_PARTITION_MAINTENANCE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
 
 @app.on_event("startup")
 async def startup_event():
     subscription_service = await get_subscription_service()
-    asyncio.create_task(check_updates_periodically())
+    track_sweep(maintain_update_partitions_periodically())
+    track_sweep(check_updates_periodically())
     start_metrics_server()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    sweep_stopping.set()
+    if sweep_tasks:
+        _, pending = await asyncio.wait(sweep_tasks, timeout=SWEEP_DRAIN_TIMEOUT_SECONDS)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Cancelled {len(pending)} update sweeps after {SWEEP_DRAIN_TIMEOUT_SECONDS}s")
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Update sweep stopped")
+    close_database_service()
+    logger.info("Database connections closed")
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
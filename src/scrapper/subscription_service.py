@@ -2,7 +2,7 @@ import logging
 import asyncio
 from src.scrapper.stackoverflow_client import StackOverflowClient
 from src.scrapper.github_client import GitHubClient
-from src.scrapper.utils import is_valid_url, is_already_tracked, generate_subscription_id, extract_stackoverflow_question_id, extract_github_owner_and_repo
+from src.scrapper.utils import is_valid_url, is_already_tracked, extract_stackoverflow_question_id, extract_github_owner_and_repo
 from src.scrapper.database.db_service import DatabaseService
 from abc import ABC, abstractmethod
 import datetime
@@ -19,6 +19,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+UPDATES_INSERT_BATCH_SIZE = int(os.getenv("UPDATES_INSERT_BATCH_SIZE", 500))
+
 class SubscriptionManager:
     def __init__(self, db_service: DatabaseService):
         self.db_service = db_service
@@ -31,19 +33,16 @@ class SubscriptionManager:
         if any(sub["url"] == url for sub in subscriptions):
             raise ValueError("URL is already being tracked for this user.")
 
-        subscription_id = generate_subscription_id()
-        subscription = {
-            "id": subscription_id,
-            "url": url,
-            "tags": tags,
-            "filters": filters,
-            "last_updated_time": datetime.datetime.utcnow().isoformat(),
-            "user_id": user_id,
-        }
-
         try:
-            await self.db_service.add_subscription(user_id, url, tags, filters)
-            logger.info(f"Added subscription {subscription_id} for user {user_id} to URL: {url}")
+            # The stored id, so that clients can place the subscription on their cached list pages.
+            subscription = await self.db_service.add_subscription(user_id, url, tags, filters)
+            subscription.update({
+                "tags": tags,
+                "filters": filters,
+                "last_updated_time": datetime.datetime.utcnow().isoformat(),
+                "user_id": user_id,
+            })
+            logger.info(f"Added subscription {subscription['id']} for user {user_id} to URL: {url}")
             return subscription
         except Exception as e:
             logger.exception(f"Failed to add subscription to the database: {e}")
@@ -65,6 +64,13 @@ class SubscriptionManager:
             logger.exception(f"Failed to get subscriptions from the database: {e}")
             raise
 
+    async def get_subscriptions_page(self, user_id: int, limit: int, after: int = None, before: int = None):
+        try:
+            return await self.db_service.get_subscriptions_page(user_id, limit, after, before)
+        except Exception as e:
+            logger.exception(f"Failed to get subscriptions page from the database: {e}")
+            raise
+
     async def get_links(self, offset: int, limit: int):
         try:
             return await self.db_service.get_links(offset, limit)
@@ -79,6 +85,20 @@ class SubscriptionManager:
             logger.exception(f"Failed to get links from the database: {e}")
             raise
 
+    async def add_updates(self, updates: list):
+        try:
+            await self.db_service.add_updates(updates)
+        except Exception as e:
+            logger.exception(f"Failed to add {len(updates)} updates to the database: {e}")
+            raise
+
+    async def get_link_updates(self, link_id: int, limit: int, since: datetime.datetime, before: str = None):
+        try:
+            return await self.db_service.get_link_updates(link_id, limit, since, before)
+        except Exception as e:
+            logger.exception(f"Failed to get updates of link {link_id} from the database: {e}")
+            raise
+
 class AbstractUpdateChecker(ABC):
     @abstractmethod
     async def check_for_updates(self, link: dict) -> bool:
@@ -141,33 +161,71 @@ class SubscriptionService:
     async def get_subscriptions(self, user_id: int):
         return await self.subscription_manager.get_subscriptions(user_id)
 
-    async def check_updates(self):
+    async def get_subscriptions_page(self, user_id: int, limit: int, after: int = None, before: int = None):
+        return await self.subscription_manager.get_subscriptions_page(user_id, limit, after, before)
+
+    async def get_link_updates(self, link_id: int, limit: int, since: datetime.datetime, before: str = None):
+        return await self.subscription_manager.get_link_updates(link_id, limit, since, before)
+
+    async def check_updates(self, stop_event: asyncio.Event = None):
+        """
+        Sweeps all links once. When stop_event is set the sweep stops between links, so a
+        link is never left notified but not marked as checked.
+        """
         logger.info("Checking for updates...")
 
         offset = 0
         limit = int(os.getenv("BATCH_SIZE", 500))
-        while True:
-            try:
-                links = await self.subscription_manager.get_links(offset, limit)
-
-                offset += limit
-
-                if len(links) == 0:
-                    break
+        # Detected updates are written in batches rather than one INSERT per link.
+        pending_updates = []
+        try:
+            while True:
+                try:
+                    links = await self.subscription_manager.get_links(offset, limit)
 
-                for link in links:
-                    has_updates = await self._check_for_updates(link)
+                    offset += limit
 
-                if has_updates:
-                    try:
-                        await self._send_update_notification(link)
-                    except Exception as e:
+                    if len(links) == 0:
                         break
 
-                    await self.subscription_manager.update_last_checked_at(link["link_id"])
-            except Exception as e:
-                logger.exception(f"Failed to check updates: {e}")
-                break
+                    for link in links:
+                        if stop_event is not None and stop_event.is_set():
+                            logger.info("Update sweep interrupted by shutdown")
+                            return
+
+                        has_updates = await self._check_for_updates(link)
+
+                        if has_updates:
+                            update_notification = await self._send_update_notification(link)
+                            await self.subscription_manager.update_last_checked_at(link["link_id"])
+                            pending_updates.append(self._update_record(update_notification))
+                            if len(pending_updates) >= UPDATES_INSERT_BATCH_SIZE:
+                                await self._record_updates(pending_updates)
+                                pending_updates = []
+                except Exception as e:
+                    logger.exception(f"Failed to check updates: {e}")
+                    break
+        finally:
+            await self._record_updates(pending_updates)
+
+    @staticmethod
+    def _update_record(update_notification: dict) -> dict:
+        return {
+            "link_id": update_notification["link_id"],
+            "created_at": datetime.datetime.utcnow(),
+            "title": update_notification["title"],
+            "user_name": update_notification["user_name"],
+            "preview": update_notification["preview"],
+        }
+
+    async def _record_updates(self, updates: list):
+        # History is secondary to delivery: a failed batch is logged and the sweep goes on.
+        if not updates:
+            return
+        try:
+            await self.subscription_manager.add_updates(updates)
+        except Exception as e:
+            logger.error(f"Dropped {len(updates)} updates that could not be recorded: {e}")
 
     async def _check_for_updates(self, link: dict) -> bool:
         url = link["url"]
@@ -221,6 +279,7 @@ class SubscriptionService:
             logger.info(f"Sent update notification to notification_service {update_notification}")
 
             await self._send_notification_to_service(update_notification)
+            return update_notification
         except Exception as e:
             logger.exception(f"Failed to send update notification: {e}")
             raise e
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from pydantic import BaseModel
+
+LOG_FILE = os.path.join("logs", "server.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+DIGEST_WINDOW_SECONDS = float(os.getenv("DIGEST_WINDOW_SECONDS", 300))
+DIGEST_MAX_ITEMS = int(os.getenv("DIGEST_MAX_ITEMS", 10))
+DIGEST_PREFERENCE_TTL_SECONDS = float(os.getenv("DIGEST_PREFERENCE_TTL_SECONDS", 30))
+DIGEST_USERS_KEY = os.getenv("DIGEST_USERS_KEY", "digest_users")
+DIGEST_PENDING_KEY_PREFIX = os.getenv("DIGEST_PENDING_KEY_PREFIX", "digest_pending:")
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+def render_digest(updates: List[BaseModel]) -> List[Tuple[str, List[BaseModel]]]:
+    """
+    Renders the digest as one or more messages within Telegram's length limit,
+    each paired with the updates it lists.
+    """
+    parts = []
+    message, listed = f"Дайджест: {len(updates)} обновлений\n", []
+    for update in updates:
+        line = f"\n• {update.title} — {update.url}\n  {update.user_name}, {update.last_update}\n"
+        if update.more_changes:
+            line += f"  +{update.more_changes} more changes\n"
+        if listed and len(message) + len(line) > TELEGRAM_MESSAGE_LIMIT:
+            parts.append((message, listed))
+            message, listed = "Дайджест (продолжение)\n", []
+        message = (message + line)[:TELEGRAM_MESSAGE_LIMIT]
+        listed.append(update)
+    parts.append((message, listed))
+    return parts
+
+class DigestPreferences:
+    """
+    Opt-in set of users who receive digests, stored in Redis and cached locally for a short TTL.
+    """
+
+    def __init__(self, client: redis.Redis, key: str = DIGEST_USERS_KEY, ttl: float = DIGEST_PREFERENCE_TTL_SECONDS):
+        self.client = client
+        self.key = key
+        self.ttl = ttl
+        self.cache: dict[int, tuple[bool, float]] = {}
+
+    def _remember(self, user_id: int, enabled: bool) -> None:
+        if len(self.cache) > 100000:
+            self.cache.clear()
+        self.cache[user_id] = (enabled, time.monotonic() + self.ttl)
+
+    async def is_enabled(self, user_id: int) -> bool:
+        cached = self.cache.get(user_id)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        try:
+            enabled = bool(await self.client.sismember(self.key, str(user_id)))
+        except RedisError as e:
+            logger.warning(f"Failed to read digest preference for user {user_id}: {e}")
+            enabled = cached[0] if cached is not None else False
+        self._remember(user_id, enabled)
+        return enabled
+
+    async def enabled_users(self, user_ids: Iterable[int]) -> Set[int]:
+        """Same as is_enabled for many users, with one SMISMEMBER round trip for the uncached ones."""
+        now = time.monotonic()
+        enabled, missing = set(), []
+        for user_id in user_ids:
+            cached = self.cache.get(user_id)
+            if cached is not None and cached[1] > now:
+                if cached[0]:
+                    enabled.add(user_id)
+            else:
+                missing.append(user_id)
+        if not missing:
+            return enabled
+        try:
+            flags = await self.client.smismember(self.key, [str(user_id) for user_id in missing])
+        except RedisError as e:
+            logger.warning(f"Failed to read digest preferences for {len(missing)} users: {e}")
+            flags = [self.cache.get(user_id, (False, 0.0))[0] for user_id in missing]
+        for user_id, flag in zip(missing, flags):
+            self._remember(user_id, bool(flag))
+            if flag:
+                enabled.add(user_id)
+        return enabled
+
+    async def set_enabled(self, user_id: int, enabled: bool) -> None:
+        if enabled:
+            await self.client.sadd(self.key, str(user_id))
+        else:
+            await self.client.srem(self.key, str(user_id))
+        self._remember(user_id, enabled)
+
+class RedisDigestStore:
+    """
+    Keeps buffered digest updates in a Redis list per user. Their Kafka offsets are committed
+    once buffered, so the lists are what lets a restart send them instead of losing them.
+    """
+
+    def __init__(self, client: redis.Redis, model: Type[BaseModel], prefix: str = DIGEST_PENDING_KEY_PREFIX):
+        self.client = client
+        self.model = model
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    async def append(self, update: BaseModel) -> None:
+        await self.client.rpush(self._key(update.user_id), update.model_dump_json(exclude_none=True))
+
+    async def remove(self, user_id: int, count: int) -> None:
+        # Only the flushed head goes; updates appended during the flush stay. Redis deletes emptied lists.
+        await self.client.ltrim(self._key(user_id), count, -1)
+
+    async def load(self) -> Dict[int, List[BaseModel]]:
+        pending = {}
+        async for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            items = await self.client.lrange(key, 0, -1)
+            pending[int(key[len(self.prefix):])] = [self.model.model_validate_json(item) for item in items]
+        return pending
+
+class DigestBuffer:
+    """
+    Collects updates per user and sends them as one message after `window` seconds
+    or as soon as `max_items` updates are buffered. Flushes run in background tasks, so `add`
+    never waits for Telegram. With a `store` every buffered update is written to Redis before
+    `add` returns and removed only after its digest is flushed.
+    """
+
+    def __init__(
+        self,
+        flush_callback: Callable[[int, List[BaseModel]], Awaitable[None]],
+        window: float = DIGEST_WINDOW_SECONDS,
+        max_items: int = DIGEST_MAX_ITEMS,
+        store: Optional[RedisDigestStore] = None,
+    ):
+        self.flush_callback = flush_callback
+        self.window = window
+        self.max_items = max_items
+        self.store = store
+        self.pending: dict[int, List[BaseModel]] = {}
+        self.timers: dict[int, asyncio.Task] = {}
+        self.flushing: set[asyncio.Task] = set()
+
+    def _schedule(self, user_id: int) -> None:
+        if user_id not in self.timers:
+            self.timers[user_id] = asyncio.create_task(self._flush_later(user_id))
+
+    async def add(self, update: BaseModel) -> int:
+        if self.store is not None:
+            await self.store.append(update)
+        items = self.pending.setdefault(update.user_id, [])
+        items.append(update)
+        if len(items) >= self.max_items:
+            timer = self.timers.pop(update.user_id, None)
+            if timer:
+                timer.cancel()
+            task = asyncio.create_task(self.flush(update.user_id))
+            self.flushing.add(task)
+            task.add_done_callback(self.flushing.discard)
+            return 0
+        self._schedule(update.user_id)
+        return len(items)
+
+    async def restore(self) -> int:
+        """Reloads updates left in the store by a previous process and schedules their digests."""
+        if self.store is None:
+            return 0
+        try:
+            stored = await self.store.load()
+        except RedisError as e:
+            logger.error(f"Failed to restore buffered digests: {e}")
+            return 0
+        for user_id, items in stored.items():
+            self.pending[user_id] = items + self.pending.get(user_id, [])
+            self._schedule(user_id)
+        restored = sum(len(items) for items in stored.values())
+        logger.info(f"Restored {restored} buffered digest updates for {len(stored)} users")
+        return restored
+
+    async def _flush_later(self, user_id: int) -> None:
+        await asyncio.sleep(self.window)
+        self.timers.pop(user_id, None)
+        # From here on the task is a flush in progress, which shutdown waits for instead of cancelling.
+        task = asyncio.current_task()
+        self.flushing.add(task)
+        try:
+            await self.flush(user_id)
+        finally:
+            self.flushing.discard(task)
+
+    async def flush(self, user_id: int) -> None:
+        items = self.pending.pop(user_id, None)
+        if not items:
+            return
+        logger.info(f"Flushing digest of {len(items)} updates for user {user_id}")
+        try:
+            await self.flush_callback(user_id, items)
+        except Exception as e:
+            logger.error(f"Failed to flush digest for user {user_id}: {e}")
+            if self.store is not None:
+                # Still in the store, so keep them buffered and try again after the next window.
+                self.pending[user_id] = items + self.pending.get(user_id, [])
+                self._schedule(user_id)
+            return
+        if self.store is not None:
+            try:
+                await self.store.remove(user_id, len(items))
+            except RedisError as e:
+                logger.error(f"Failed to remove flushed digest of user {user_id} from the store: {e}")
+
+    async def flush_all(self) -> None:
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        if self.flushing:
+            await asyncio.gather(*self.flushing, return_exceptions=True)
+        # A failed flush schedules its retry window; flush it now instead.
+        for timer in self.timers.values():
+            timer.cancel()
+        self.timers.clear()
+        for user_id in list(self.pending):
+            await self.flush(user_id)
+
+def _create_redis_client() -> redis.Redis:
+    return redis.Redis(
+        host=os.getenv("REDIS_HOST", "redis"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        socket_timeout=float(os.getenv("REDIS_TIMEOUT", 0.5)),
+    )
+
+def create_digest_preferences() -> DigestPreferences:
+    return DigestPreferences(_create_redis_client())
+
+def create_digest_store(model: Type[BaseModel]) -> RedisDigestStore:
+    return RedisDigestStore(_create_redis_client(), model)
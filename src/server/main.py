@@ -1,9 +1,12 @@
-from typing import List, Optional
+from typing import Annotated, List, Optional
 
 import logging
 import os
 import json
-from fastapi import FastAPI, HTTPException, Depends
+import time
+from types import SimpleNamespace
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 import uvicorn
 import asyncio
@@ -13,8 +16,20 @@ from dotenv import load_dotenv
 from telethon import TelegramClient
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
 
-from src.server.scrapper_client import ScrapperClient
-from src.server.telegram_client import TelegramClientManager
+from src.server.scrapper_client import (
+    ScrapperClient,
+    get_shared_scrapper_client,
+    close_shared_scrapper_client,
+)
+from src.server.telegram_client import TelegramClientManager, PRIORITY_LOW
+from src.server.subscription_cache import SubscriptionReadCache
+from src.server.digest import DigestBuffer, create_digest_preferences, create_digest_store, render_digest
+from src.server.metrics_server import (
+    start_metrics_server,
+    dlq_retry_total,
+    dlq_retry_seconds,
+    dlq_retry_lag_seconds,
+)
 
 load_dotenv()
 
@@ -40,57 +55,295 @@ class UpdateNotification(BaseModel):
     title: str = None
     user_name: str = None
     preview: str = None
+    more_changes: int = 0
+
+class UpdateBody(BaseModel):
+    url: str
+    last_update: str
+    title: str = None
+    user_name: str = None
+    preview: str = None
+    more_changes: int = 0
+
+class UpdateBatch(BaseModel):
+    update: UpdateBody
+    user_ids: List[int]
+
+def render_update_message(update_notification: UpdateNotification | UpdateBody) -> str:
+    message = f"Обновление: {update_notification.title}\n"
+    message += f"User: {update_notification.user_name}\n"
+    message += f"Date: {update_notification.last_update}\n"
+    message += f"Preview: {(update_notification.preview or '')[:200]}...\n"
+    if update_notification.more_changes:
+        message += f"+{update_notification.more_changes} more changes\n"
+    return message
 
 async def get_scrapper_client() -> ScrapperClient:
     scrapper_url = os.getenv("SCRAPPER_URL")
     if not scrapper_url:
         raise HTTPException(status_code=500, detail="SCRAPPER_URL environment variable not set.")
-    return ScrapperClient(base_url=scrapper_url)
+    return get_shared_scrapper_client(scrapper_url)
+
+subscription_read_cache = SubscriptionReadCache()
+SUBSCRIPTIONS_PAGE_MAX_LIMIT = int(os.getenv("SUBSCRIPTIONS_PAGE_MAX_LIMIT", 100))
+
+def is_cacheable_subscriptions(result) -> bool:
+    return not (isinstance(result, dict) and result.get("status") == "fallback")
 
 kafka_consumer = None
 KAFKA_TOPIC_TO_SERVER = os.getenv("KAFKA_TOPIC_TO_SERVER")
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", 100))
+KAFKA_POLL_TIMEOUT_MS = int(os.getenv("KAFKA_POLL_TIMEOUT_MS", 500))
+SEND_CONCURRENCY = int(os.getenv("SEND_CONCURRENCY", 16))
 
 kafka_dlq_consumer = None
+kafka_dlq_producer = None
 KAFKA_DLQ_TOPIC = os.getenv("KAFKA_DLQ_TOPIC", "dead-letter-topic")
+KAFKA_PARKING_LOT_TOPIC = os.getenv("KAFKA_PARKING_LOT_TOPIC", "parking-lot-topic")
+DLQ_MAX_ATTEMPTS = int(os.getenv("DLQ_MAX_ATTEMPTS", 5))
+DLQ_BACKOFF_BASE_SECONDS = float(os.getenv("DLQ_BACKOFF_BASE_SECONDS", 2))
+DLQ_MAX_BACKOFF_SECONDS = float(os.getenv("DLQ_MAX_BACKOFF_SECONDS", 60))
+DLQ_BATCH_SIZE = int(os.getenv("DLQ_BATCH_SIZE", 50))
+DLQ_RETRY_MODE = os.getenv("DLQ_RETRY_MODE", "DIRECT").upper()
+DRAIN_TIMEOUT_SECONDS = float(os.getenv("DRAIN_TIMEOUT_SECONDS", 20))
+
+# Set on shutdown: consumers finish and commit the batch in hand, then stop fetching.
+draining = asyncio.Event()
+
+ATTEMPT_HEADER = "x-attempt"
+NEXT_ATTEMPT_HEADER = "x-next-attempt-at"
+
+def read_retry_headers(msg) -> tuple[int, float]:
+    headers = dict(getattr(msg, "headers", None) or ())
+    attempt = int(headers.get(ATTEMPT_HEADER, b"0"))
+    next_attempt_at = float(headers.get(NEXT_ATTEMPT_HEADER, b"0"))
+    return attempt, next_attempt_at
+
+def dlq_backoff(attempt: int) -> float:
+    return min(DLQ_MAX_BACKOFF_SECONDS, DLQ_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1))
+
+def retry_headers(msg, attempt: int, next_attempt_at: float) -> list:
+    headers = [
+        (name, value)
+        for name, value in (getattr(msg, "headers", None) or ())
+        if name not in (ATTEMPT_HEADER, NEXT_ATTEMPT_HEADER)
+    ]
+    headers.append((ATTEMPT_HEADER, str(attempt).encode('utf-8')))
+    headers.append((NEXT_ATTEMPT_HEADER, str(next_attempt_at).encode('utf-8')))
+    return headers
+
+def build_dlq_message(user_id: int, update: BaseModel) -> SimpleNamespace:
+    return SimpleNamespace(
+        key=str(user_id).encode('utf-8'),
+        value=json.dumps({**update.model_dump(exclude_none=True), "user_id": user_id}).encode('utf-8'),
+        headers=(),
+    )
+
+async def send_to_dlq(msg) -> None:
+    attempt = read_retry_headers(msg)[0] + 1
+    await kafka_dlq_producer.send_and_wait(
+        topic=KAFKA_DLQ_TOPIC,
+        key=msg.key,
+        value=msg.value,
+        headers=retry_headers(msg, attempt, time.time() + dlq_backoff(attempt)),
+    )
+    logger.warning(f"Message отправлено в DLQ (attempt {attempt}): {msg.value.decode('utf-8')}")
+
+async def send_digest(user_id: int, updates: list) -> None:
+    parts = render_digest(updates)
+    for index, (message, _) in enumerate(parts):
+        try:
+            await app.tg_client.send_message(user_id, message, PRIORITY_LOW)
+        except Exception as e:
+            logger.error(f"Failed to send digest to user {user_id}: {e}")
+            # Parts already sent are not retried, so only the unsent updates go to the DLQ.
+            for _, listed in parts[index:]:
+                for update in listed:
+                    await send_to_dlq(build_dlq_message(user_id, update))
+            return
+    logger.info(f"Sent digest of {len(updates)} updates in {len(parts)} messages to user {user_id}")
+
+digest_preferences = create_digest_preferences()
+digest_buffer = DigestBuffer(send_digest, store=create_digest_store(UpdateNotification))
+
+async def deliver_update(msg) -> bool:
+    try:
+        update_notification = json.loads(msg.value.decode('utf-8'))
+        logger.info(f"Received message from Kafka: {update_notification}")
+        update_notification = UpdateNotification(**update_notification)
+
+        if await digest_preferences.is_enabled(update_notification.user_id):
+            await digest_buffer.add(update_notification)
+            logger.info(f"Buffered notification for user {update_notification.user_id} into digest")
+            return True
+
+        message = render_update_message(update_notification)
+
+        await app.tg_client.send_message(update_notification.user_id, message)
+        logger.info(f"Sent notification to user {update_notification.user_id} for URL {update_notification.url}")
+        return True
+    except Exception as e:
+        logger.error(f"Error processing message from Kafka: {e}")
+        await send_to_dlq(msg)
+        return False
+
+def dispatch_key(msg) -> bytes:
+    if msg.key is not None:
+        return msg.key
+    try:
+        return str(json.loads(msg.value.decode('utf-8')).get("user_id")).encode('utf-8')
+    except Exception:
+        return msg.value
+
+async def process_batch(messages: list, semaphore: asyncio.Semaphore) -> None:
+    by_key: dict[bytes, list] = {}
+    for msg in messages:
+        by_key.setdefault(dispatch_key(msg), []).append(msg)
+
+    async def deliver_in_order(user_messages: list) -> None:
+        for msg in user_messages:
+            async with semaphore:
+                await deliver_update(msg)
+
+    await asyncio.gather(*(deliver_in_order(user_messages) for user_messages in by_key.values()))
 
 async def check_for_updates():
-    while True:
-        await asyncio.sleep(60)
+    semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+    while not draining.is_set():
+        batches = {}
         try:
-            async for msg in kafka_consumer:
-                update_notification = json.loads(msg.value.decode('utf-8'))
-                logger.info(f"Received message from Kafka: {update_notification}")
-                update_notification = UpdateNotification(**update_notification)
-
-                message = f"Обновление: {update_notification.title}\n"
-                message += f"User: {update_notification.user_name}\n"
-                message += f"Date: {update_notification.last_update}\n"
-                message += f"Preview: {update_notification.preview[:200]}...\n"
-
-                await app.tg_client.send_message(update_notification.user_id, message)
-                logger.info(f"Sent notification to user {update_notification.user_id} for URL {update_notification.url}")
+            batches = await kafka_consumer.getmany(timeout_ms=KAFKA_POLL_TIMEOUT_MS, max_records=KAFKA_BATCH_SIZE)
+            if not batches:
+                continue
+            await process_batch([msg for messages in batches.values() for msg in messages], semaphore)
+            await kafka_consumer.commit()
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"Error processing messages from Kafka: {e}")
-            if kafka_dlq_producer and 'msg' in locals():
-                try:
-                    await kafka_dlq_producer.send_and_wait(
-                        topic=KAFKA_DLQ_TOPIC,
-                        value=msg.value
-                    )
-                    logger.warning(f"Message отправлено в DLQ: {msg.value.decode('utf-8')}")
-                except Exception as dlq_error:
-                    logger.error(f"Ошибка при отправке в DLQ: {dlq_error}")
+            for tp, messages in batches.items():
+                kafka_consumer.seek(tp, messages[0].offset)
+            await asyncio.sleep(1)
+
+async def park_message(msg, attempt: int) -> None:
+    await kafka_dlq_producer.send_and_wait(
+        topic=KAFKA_PARKING_LOT_TOPIC,
+        key=msg.key,
+        value=msg.value,
+        headers=list(getattr(msg, "headers", None) or ()),
+    )
+    logger.error(f"[DLQ] Message parked after {attempt} attempts: {msg.value.decode('utf-8')}")
+
+async def retry_dead_letter(msg) -> str:
+    attempt, next_attempt_at = read_retry_headers(msg)
+    if attempt >= DLQ_MAX_ATTEMPTS:
+        await park_message(msg, attempt)
+        outcome = "parked"
+        dlq_retry_total.labels(outcome=outcome).inc()
+        return outcome
+
+    delay = next_attempt_at - time.time()
+    if delay > 0:
+        try:
+            await asyncio.wait_for(draining.wait(), timeout=delay)
+            # Shutting down before the retry is due: leave it uncommitted for the next run.
+            return "deferred"
+        except asyncio.TimeoutError:
+            pass
+    dlq_retry_lag_seconds.observe(max(0.0, time.time() - next_attempt_at))
+
+    started_at = time.monotonic()
+    if DLQ_RETRY_MODE == "REINJECT":
+        await kafka_dlq_producer.send_and_wait(
+            topic=KAFKA_TOPIC_TO_SERVER,
+            key=msg.key,
+            value=msg.value,
+            headers=list(getattr(msg, "headers", None) or ()),
+        )
+        outcome = "reinjected"
+    else:
+        outcome = "delivered" if await deliver_update(msg) else "failed"
+    dlq_retry_seconds.observe(time.monotonic() - started_at)
+    dlq_retry_total.labels(outcome=outcome).inc()
+    logger.info(f"[DLQ] Retry attempt {attempt} {outcome}")
+    return outcome
+
+async def requeue_dead_letter(msg) -> None:
+    await kafka_dlq_producer.send_and_wait(
+        topic=KAFKA_DLQ_TOPIC,
+        key=msg.key,
+        value=msg.value,
+        headers=list(getattr(msg, "headers", None) or ()),
+    )
+    dlq_retry_total.labels(outcome="requeued").inc()
+
+async def retry_partition(messages: list) -> int:
+    """
+    Retries messages of one partition in offset order and returns the offset to commit.
+
+    The backoff depends on each message's attempt, so a message can be due later than the ones
+    behind it. Such a message is re-published to the end of the DLQ with its headers unchanged
+    instead of holding back the messages that are due sooner; otherwise the loop waits for it.
+    """
+    due_times = [read_retry_headers(msg)[1] for msg in messages]
+    # Earliest retry time among the messages after each position.
+    due_after = [float("inf")] * len(messages)
+    for index in range(len(messages) - 2, -1, -1):
+        due_after[index] = min(due_times[index + 1], due_after[index + 1])
+
+    for index, msg in enumerate(messages):
+        if draining.is_set():
+            return msg.offset
+        attempt = read_retry_headers(msg)[0]
+        not_due = due_times[index] > time.time()
+        if attempt < DLQ_MAX_ATTEMPTS and not_due and due_after[index] < due_times[index]:
+            await requeue_dead_letter(msg)
+            continue
+        if await retry_dead_letter(msg) == "deferred":
+            return msg.offset
+    return messages[-1].offset + 1
 
 async def process_dead_letter_queue():
-    while True:
+    while not draining.is_set():
+        batches = {}
         try:
-            async for msg in kafka_dlq_consumer:
-                value = msg.value.decode("utf-8")
-                logger.warning(f"[DLQ] Получено сообщение: {value}")
+            batches = await kafka_dlq_consumer.getmany(timeout_ms=KAFKA_POLL_TIMEOUT_MS, max_records=DLQ_BATCH_SIZE)
+            if not batches:
+                continue
+            offsets = await asyncio.gather(*(retry_partition(messages) for messages in batches.values()))
+            await kafka_dlq_consumer.commit(dict(zip(batches, offsets)))
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logger.error(f"[DLQ] Ошибка при обработке сообщения: {e}")
+            for tp, messages in batches.items():
+                kafka_dlq_consumer.seek(tp, messages[0].offset)
             await asyncio.sleep(5)
 
+async def wait_until(tasks, deadline: float) -> None:
+    tasks = [task for task in tasks if not task.done()]
+    if not tasks:
+        return
+    _, pending = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()))
+    for task in pending:
+        logger.warning(f"Task {task.get_name()} did not finish before the drain deadline, cancelling")
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+
+async def drain(consumer_tasks: list, tg_client_manager: TelegramClientManager) -> None:
+    """
+    Stops fetching, lets the batches in hand finish and commit, then flushes buffered
+    and queued sends. Everything shares one DRAIN_TIMEOUT_SECONDS deadline.
+    """
+    logger.info("Draining server before shutdown")
+    deadline = time.monotonic() + DRAIN_TIMEOUT_SECONDS
+    draining.set()
+    await wait_until(consumer_tasks, deadline)
+    await digest_buffer.flush_all()
+    await tg_client_manager.scheduler.drain(max(0.0, deadline - time.monotonic()))
+    await wait_until(list(background_tasks), deadline)
+    logger.info("Drain finished")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncIterator[None]:
     tg_client_manager = TelegramClientManager(
@@ -104,7 +357,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         KAFKA_TOPIC_TO_SERVER,
         bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS"),
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        enable_auto_commit=False,
         group_id="server-group"
     )
     global kafka_dlq_consumer
@@ -112,7 +365,7 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         KAFKA_DLQ_TOPIC,
         bootstrap_servers=os.getenv("KAFKA_BOOTSTRAP_SERVERS"),
         auto_offset_reset="earliest",
-        enable_auto_commit=True,
+        enable_auto_commit=False,
         group_id="server-dlq-group"
     )
     global kafka_dlq_producer
@@ -124,22 +377,42 @@ async def lifespan(app: FastAPI) -> AsyncIterator[None]:
         await kafka_dlq_consumer.start()
         await kafka_dlq_producer.start()
 
-        asyncio.create_task(check_for_updates())
-        asyncio.create_task(process_dead_letter_queue())
-
         app.tg_client = tg_client_manager
         await tg_client_manager.__aenter__()
+        await digest_buffer.restore()
+
+        consumer_tasks = [
+            asyncio.create_task(check_for_updates(), name="check_for_updates"),
+            asyncio.create_task(process_dead_letter_queue(), name="process_dead_letter_queue"),
+        ]
+        start_metrics_server()
         yield
+        await drain(consumer_tasks, tg_client_manager)
     finally:
         await kafka_dlq_consumer.stop()
-        await kafka_dlq_producer.stop()
         await kafka_consumer.stop()
+        await kafka_dlq_producer.stop()
         await tg_client_manager.__aexit__(None, None, None)
+        await close_shared_scrapper_client()
 
 app = FastAPI(lifespan=lifespan)
 
-async def get_telegram_client(app: FastAPI = Depends()) -> TelegramClientManager:
-    return app.tg_client
+async def get_telegram_client(request: Request) -> TelegramClientManager:
+    return request.app.tg_client
+
+background_tasks: set[asyncio.Task] = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+def handle_queued_send_result(user_id: int, update: UpdateBody, future: asyncio.Future) -> None:
+    if future.cancelled() or future.exception() is None:
+        return
+    logger.error(f"Queued notification to user {user_id} failed: {future.exception()}")
+    spawn(send_to_dlq(build_dlq_message(user_id, update)))
 
 @app.post("/api/v1/subscriptions/")
 async def create_subscription(
@@ -147,13 +420,13 @@ async def create_subscription(
     scrapper_client: ScrapperClient = Depends(get_scrapper_client)
 ):
     try:
-        result = await asyncio.to_thread(
-            scrapper_client.create_subscription,
+        result = await scrapper_client.create_subscription(
             user_id=subscription.user_id,
             url=subscription.url,
             tags=subscription.tags,
             filters=subscription.filters,
         )
+        subscription_read_cache.invalidate(subscription.user_id)
         return result
     except Exception as e:
         logger.exception(f"Failed to create subscription: {e}")
@@ -167,7 +440,8 @@ async def delete_subscription(
 ):
     try:
         logger.info(f"Deleting subscription with {url} to user {user_id}")
-        result = await asyncio.to_thread(scrapper_client.delete_subscription, user_id=user_id, url=url)
+        result = await scrapper_client.delete_subscription(user_id=user_id, url=url)
+        subscription_read_cache.invalidate(user_id)
         return
     except Exception as e:
         logger.exception("Failed to delete subscription")
@@ -176,12 +450,29 @@ async def delete_subscription(
 @app.get("/api/v1/subscriptions/{user_id}")
 async def list_subscriptions(
     user_id: int,
+    limit: Annotated[Optional[int], Query(ge=1, le=SUBSCRIPTIONS_PAGE_MAX_LIMIT)] = None,
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    if_none_match: Optional[str] = Header(default=None),
     scrapper_client: ScrapperClient = Depends(get_scrapper_client)
 ):
+    if after is not None and before is not None:
+        raise HTTPException(status_code=400, detail="Use either 'after' or 'before', not both")
     try:
         logger.info(f"Listing subscription for user {user_id}")
-        result = await asyncio.to_thread(scrapper_client.get_subscriptions, user_id=user_id)
-        return result
+        if limit is None:
+            load = lambda: scrapper_client.get_subscriptions(user_id=user_id)
+        else:
+            load = lambda: scrapper_client.get_subscriptions_page(user_id=user_id, limit=limit, after=after, before=before)
+        etag, result = await subscription_read_cache.get(
+            user_id,
+            load,
+            cacheable=is_cacheable_subscriptions,
+            page=(limit, after, before) if limit is not None else None,
+        )
+        if if_none_match == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        return JSONResponse(content=result, headers={"ETag": etag})
     except Exception as e:
         logger.exception("Failed to list subscriptions")
         raise HTTPException(status_code=500, detail=str(e))
@@ -189,21 +480,61 @@ async def list_subscriptions(
 @app.post("/api/v1/updated/")
 async def send_update_notification(
     update_notification: UpdateNotification,
+    telegram_client: TelegramClientManager = Depends(get_telegram_client),
 ):
     try:
-        telegram_client = get_telegram_client()
+        message = render_update_message(update_notification)
 
-        message = f"Обновление: {update_notification.title}\n"
-        message += f"User: {update_notification.user_name}\n"
-        message += f"Date: {update_notification.last_update}\n"
-        message += f"Preview: {update_notification.preview[:200]}...\n"
-
-        await app.tg_client.send_message(update_notification.user_id, message)
+        await telegram_client.send_message(update_notification.user_id, message)
         logger.info(f"Sent notification to user {update_notification.user_id} for URL {update_notification.url}")
         return {"status": "ok"}
     except Exception as e:
         logger.exception(f"Error sending message to user {update_notification.user_id}: {e}")
-        return HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/updated/batch")
+async def send_update_batch(
+    batch: UpdateBatch,
+    telegram_client: TelegramClientManager = Depends(get_telegram_client),
+):
+    message = render_update_message(batch.update)
+    accepted, rejected = [], []
+    digest_users = await digest_preferences.enabled_users(batch.user_ids)
+    for user_id in batch.user_ids:
+        if user_id in digest_users:
+            await digest_buffer.add(UpdateNotification(user_id=user_id, **batch.update.model_dump(exclude_none=True)))
+            accepted.append(user_id)
+            continue
+        future = telegram_client.enqueue_message(user_id, message)
+        if future is None:
+            rejected.append(user_id)
+            continue
+        future.add_done_callback(lambda f, user_id=user_id: handle_queued_send_result(user_id, batch.update, f))
+        accepted.append(user_id)
+
+    logger.info(f"Queued {len(accepted)} of {len(batch.user_ids)} notifications for URL {batch.update.url}")
+    return {"status": "ok", "accepted": accepted, "rejected": rejected}
+
+@app.put("/api/v1/digest/{user_id}")
+async def enable_digest(user_id: int):
+    try:
+        await digest_preferences.set_enabled(user_id, True)
+        logger.info(f"Digest mode enabled for user {user_id}")
+        return {"status": "ok", "digest": True}
+    except Exception as e:
+        logger.exception(f"Failed to enable digest for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/api/v1/digest/{user_id}")
+async def disable_digest(user_id: int):
+    try:
+        await digest_preferences.set_enabled(user_id, False)
+        await digest_buffer.flush(user_id)
+        logger.info(f"Digest mode disabled for user {user_id}")
+        return {"status": "ok", "digest": False}
+    except Exception as e:
+        logger.exception(f"Failed to disable digest for user {user_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
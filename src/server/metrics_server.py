@@ -0,0 +1,41 @@
+from prometheus_client import start_http_server, Counter, Gauge, Histogram
+import threading
+import os
+
+METRICS_PORT = int(os.getenv("METRICS_PORT", 8006))
+
+telegram_send_queue_depth = Gauge(
+    'server_telegram_send_queue_depth',
+    'Количество сообщений в очереди на отправку в Telegram'
+)
+
+telegram_send_wait_seconds = Histogram(
+    'server_telegram_send_wait_seconds',
+    'Время ожидания сообщения в очереди на отправку'
+)
+
+telegram_flood_wait_total = Counter(
+    'server_telegram_flood_wait_total',
+    'Количество полученных FloodWait'
+)
+
+dlq_retry_total = Counter(
+    'server_dlq_retry_total',
+    'Количество обработанных сообщений из DLQ',
+    ['outcome']
+)
+
+dlq_retry_seconds = Histogram(
+    'server_dlq_retry_seconds',
+    'Время повторной доставки сообщения из DLQ'
+)
+
+dlq_retry_lag_seconds = Histogram(
+    'server_dlq_retry_lag_seconds',
+    'Задержка повторной попытки относительно запланированного времени'
+)
+
+def start_metrics_server():
+    thread = threading.Thread(target=start_http_server, args=(METRICS_PORT,))
+    thread.daemon = True
+    thread.start()
@@ -1,10 +1,8 @@
-import requests
-from requests.exceptions import RequestException
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import logging
 import os
-import pybreaker
+from typing import Optional
+
+from src.http_client import AsyncBaseHTTPClient, AsyncCircuitBreaker, is_server_failure
 
 LOG_FILE = os.path.join("logs", "server.log")
 
@@ -15,118 +13,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class BaseHTTPClient:
-    def __init__(
-        self,
-        base_url: str,
-        timeout: float = 3.0,
-        retries: int = 3,
-        backoff_factor: float = 0.5
-    ):
-        self.base_url = base_url
-        self.timeout = timeout
-
-        retry_strategy = Retry(
-            total=retries,
-            backoff_factor=backoff_factor,
-            status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["GET", "POST", "PUT", "DELETE"],
-        )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
-
-        self.session = requests.Session()
-        self.session.mount("http://", adapter)
-        self.session.mount("https://", adapter)
-
-        self.breaker = pybreaker.CircuitBreaker(
-            fail_max=1,
-            reset_timeout=1,
-            exclude=["ValueError"]
-        )
-
-    def _build_url(self, path: str) -> str:
-        return f"{self.base_url}{path}"
-
-    def _handle_response(self, response: requests.Response) -> dict:
-        try:
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.HTTPError as err:
-            logger.error(f"HTTP error: {err}")
-            raise
-        except requests.exceptions.JSONDecodeError as err:
-            logger.error(f"Json decode error: {err}")
-            raise
-
-    def _fallback(self, method: str, path: str, **kwargs) -> dict:
-        logger.warning(f"Fallback triggered for {method} {path}. Returning default response.")
-        return {"status": "fallback", "message": f"{method} {path} failed"}
-
-    def get(self, path: str, params: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.get(url, params=params, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"GET request failed: {err}")
-            return self._fallback("GET", path)
-
-    def post(self, path: str, json: dict = None) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.post(url, json=json, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"POST request failed: {err}")
-            return self._fallback("POST", path)
-
-    def put(self, path: str, json: dict) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.put(url, json=json, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"PUT request failed: {err}")
-            return self._fallback("PUT", path)
-
-    def delete(self, path: str, params: dict) -> dict:
-        url = self._build_url(path)
-
-        try:
-            return self.breaker.call(
-                lambda: self._handle_response(
-                    self.session.delete(url, params=params, timeout=self.timeout)
-                )
-            )
-        except (RequestException, pybreaker.CircuitBreakerError) as err:
-            logger.error(f"DELETE request failed: {err}")
-            return self._fallback("DELETE", path)
-
-class ScrapperClient(BaseHTTPClient):
-    def __init__(self, base_url: str):
-        super().__init__(base_url)
-
-    def create_subscription(self, url: str, tags: list[str] = None, filters: dict = None, user_id: int = None) -> dict:
+SCRAPPER_MAX_CONNECTIONS = int(os.getenv("SCRAPPER_MAX_CONNECTIONS", 100))
+SCRAPPER_MAX_KEEPALIVE = int(os.getenv("SCRAPPER_MAX_KEEPALIVE", 20))
+SCRAPPER_BREAKER_FAIL_MAX = int(os.getenv("SCRAPPER_BREAKER_FAIL_MAX", 5))
+SCRAPPER_BREAKER_RESET_TIMEOUT = float(os.getenv("SCRAPPER_BREAKER_RESET_TIMEOUT", 10))
+
+SCRAPPER_TIMEOUTS = {
+    "create": float(os.getenv("SCRAPPER_CREATE_TIMEOUT", 5.0)),
+    "delete": float(os.getenv("SCRAPPER_DELETE_TIMEOUT", 3.0)),
+    "list": float(os.getenv("SCRAPPER_LIST_TIMEOUT", 2.0)),
+}
+
+class ScrapperClient(AsyncBaseHTTPClient):
+    def __init__(self, base_url: str, **kwargs):
+        kwargs.setdefault("max_connections", SCRAPPER_MAX_CONNECTIONS)
+        kwargs.setdefault("max_keepalive_connections", SCRAPPER_MAX_KEEPALIVE)
+        kwargs.setdefault("breaker", AsyncCircuitBreaker(
+            fail_max=SCRAPPER_BREAKER_FAIL_MAX,
+            reset_timeout=SCRAPPER_BREAKER_RESET_TIMEOUT,
+            is_failure=is_server_failure,
+        ))
+        super().__init__(base_url, **kwargs)
+
+    async def create_subscription(self, url: str, tags: list[str] = None, filters: dict = None, user_id: int = None) -> dict:
         path = "/api/v1/subscriptions/"
         payload = {"user_id": user_id, "url" : url, "tags" : tags, "filters" : filters}
-        return self.post(path, json=payload)
+        return await self.post(path, json=payload, timeout=SCRAPPER_TIMEOUTS["create"])
+
+    async def delete_subscription(self, user_id: int, url: str) -> dict:
+        path = f"/api/v1/subscriptions/{user_id}"
+        return await self.delete(path, params = {"url": url}, timeout=SCRAPPER_TIMEOUTS["delete"])
 
-    def delete_subscription(self, user_id: int, url: str) -> dict:
+    async def get_subscriptions(self, user_id: int) -> list[dict]:
         path = f"/api/v1/subscriptions/{user_id}"
-        return self.delete(path, params = {"url": url})
+        return await self.get(path, timeout=SCRAPPER_TIMEOUTS["list"])
 
-    def get_subscriptions(self, user_id: int) -> list[dict]:
+    async def get_subscriptions_page(self, user_id: int, limit: int, after: int = None, before: int = None) -> dict:
         path = f"/api/v1/subscriptions/{user_id}"
-        return self.get(path)
\ No newline at end of file
+        params = {"limit": limit}
+        if after is not None:
+            params["after"] = after
+        if before is not None:
+            params["before"] = before
+        return await self.get(path, params=params, timeout=SCRAPPER_TIMEOUTS["list"])
+
+_scrapper_client: Optional[ScrapperClient] = None
+
+def get_shared_scrapper_client(base_url: str) -> ScrapperClient:
+    """
+    Returns the process-wide client so the connection pool and breaker state are reused.
+    """
+    global _scrapper_client
+    if _scrapper_client is None:
+        _scrapper_client = ScrapperClient(base_url)
+    return _scrapper_client
+
+async def close_shared_scrapper_client() -> None:
+    global _scrapper_client
+    if _scrapper_client is not None:
+        await _scrapper_client.aclose()
+        _scrapper_client = None
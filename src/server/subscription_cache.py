@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+LOG_FILE = os.path.join("logs", "server.log")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    filename=LOG_FILE,
+)
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_CACHE_TTL_SECONDS = float(os.getenv("SUBSCRIPTIONS_CACHE_TTL_SECONDS", 5))
+SUBSCRIPTIONS_CACHE_MAX_ENTRIES = int(os.getenv("SUBSCRIPTIONS_CACHE_MAX_ENTRIES", 10000))
+
+def compute_etag(value: Any) -> str:
+    body = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    return f'"{hashlib.sha1(body).hexdigest()}"'
+
+class SubscriptionReadCache:
+    """
+    Short-TTL cache of subscription lists keyed by user_id and page. Concurrent misses for the same
+    page share one upstream call; create/delete invalidate every page of the user so the next read is fresh.
+    """
+
+    def __init__(self, ttl: float = SUBSCRIPTIONS_CACHE_TTL_SECONDS, max_entries: int = SUBSCRIPTIONS_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[Tuple[int, Hashable], Tuple[float, int, str, Any]] = OrderedDict()
+        self.in_flight: dict[Tuple[int, Hashable], asyncio.Future] = {}
+        self.generations: dict[int, int] = {}
+
+    def invalidate(self, user_id: int) -> None:
+        # Cached pages of the user are dropped lazily: their generation no longer matches.
+        self.generations[user_id] = self.generations.get(user_id, 0) + 1
+        # A read already in flight started before the write and must not repopulate the cache.
+        for key in [key for key in self.in_flight if key[0] == user_id]:
+            del self.in_flight[key]
+
+    def _cached(self, key: Tuple[int, Hashable]) -> Optional[Tuple[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, generation, etag, value = entry
+        if expires_at <= time.monotonic() or generation != self.generations.get(key[0], 0):
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return etag, value
+
+    def _store(self, key: Tuple[int, Hashable], generation: int, etag: str, value: Any) -> None:
+        self.entries[key] = (time.monotonic() + self.ttl, generation, etag, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def get(
+        self,
+        user_id: int,
+        load: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = None,
+        page: Hashable = None,
+    ) -> Tuple[str, Any]:
+        """
+        Returns (etag, value) for the user's page, loading it at most once across concurrent callers.
+        """
+        key = (user_id, page)
+        while True:
+            cached = self._cached(key)
+            if cached is not None:
+                return cached
+
+            future = self.in_flight.get(key)
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The leader's request was cancelled, not ours: take over the load instead.
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        generation = self.generations.get(user_id, 0)
+        try:
+            value = await load()
+            result = (compute_etag(value), value)
+            if self.generations.get(user_id, 0) == generation and (cacheable is None or cacheable(value)):
+                self._store(key, generation, *result)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting for it.
+            future.exception()
+            raise
+        finally:
+            if self.in_flight.get(key) is future:
+                del self.in_flight[key]
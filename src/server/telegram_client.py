@@ -1,9 +1,21 @@
+import asyncio
+import itertools
 import logging
 import os
+import time
+from typing import Awaitable, Callable, Optional
 
-from telethon import TelegramClient
+from telethon import TelegramClient, events
+from telethon.errors import FloodWaitError
 from telethon.errors.rpcerrorlist import ApiIdInvalidError
 
+from src.peer_cache import PeerCache, create_peer_store
+from src.server.metrics_server import (
+    telegram_send_queue_depth,
+    telegram_send_wait_seconds,
+    telegram_flood_wait_total,
+)
+
 LOG_FILE = os.path.join("logs", "server.log")
 
 logging.basicConfig(
@@ -13,37 +25,227 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", 30))
+TELEGRAM_PER_CHAT_INTERVAL = float(os.getenv("TELEGRAM_PER_CHAT_INTERVAL", 1.0))
+TELEGRAM_SEND_QUEUE_LIMIT = int(os.getenv("TELEGRAM_SEND_QUEUE_LIMIT", 10000))
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def reserve(self) -> float:
+        """
+        Takes one token and returns how long the caller has to wait before using it.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+class SendScheduler:
+    """
+    Orders outgoing messages by priority and releases them no faster than the global
+    token bucket and the per-chat interval allow. FloodWait pauses all sends for exactly
+    the number of seconds Telegram asked for, then the message is retried.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[int, str], Awaitable[None]],
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        per_chat_interval: float = TELEGRAM_PER_CHAT_INTERVAL,
+        max_queue: int = TELEGRAM_SEND_QUEUE_LIMIT,
+    ):
+        self.send = send
+        self.max_queue = max_queue
+        self.bucket = TokenBucket(global_rate)
+        self.per_chat_interval = per_chat_interval
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self.sequence = itertools.count()
+        self.chat_ready_at: dict[int, float] = {}
+        self.flood_until = 0.0
+        self.in_flight: set[asyncio.Task] = set()
+        self.delayed: dict[int, tuple] = {}
+        self.holding = None
+        self.dispatcher = None
+
+    def start(self) -> None:
+        self.dispatcher = asyncio.create_task(self._dispatch())
+
+    @property
+    def pending(self) -> int:
+        return self.queue.qsize() + len(self.delayed) + len(self.in_flight) + (self.holding is not None)
+
+    async def drain(self, timeout: float) -> bool:
+        """
+        Waits until every queued message has been sent or `timeout` expires.
+        Returns True when nothing is left pending.
+        """
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self.pending:
+            logger.warning(f"Send queue not drained in {timeout}s, {self.pending} messages pending")
+        return not self.pending
+
+    async def stop(self) -> None:
+        if self.dispatcher:
+            self.dispatcher.cancel()
+            await asyncio.gather(self.dispatcher, return_exceptions=True)
+        if self.in_flight:
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+        if self.holding is not None:
+            self._fail(self.holding[4])
+            self.holding = None
+        for handle, item in self.delayed.values():
+            handle.cancel()
+            self._fail(item[4])
+        self.delayed.clear()
+        while not self.queue.empty():
+            self._fail(self.queue.get_nowait()[4])
+        telegram_send_queue_depth.set(0)
+
+    def _fail(self, future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_exception(ConnectionError("Telegram send scheduler stopped"))
+
+    def _enqueue(self, priority: int, chat_id: int, message: str, future: asyncio.Future, enqueued_at: float) -> None:
+        self.queue.put_nowait((priority, next(self.sequence), chat_id, message, future, enqueued_at))
+        telegram_send_queue_depth.set(self.queue.qsize())
+
+    def try_enqueue(self, chat_id: int, message: str, priority: int = PRIORITY_NORMAL) -> Optional[asyncio.Future]:
+        """
+        Queues the message without waiting for it to be sent. Returns None when the scheduler
+        is not running or the queue is full; otherwise a future resolved once the send finishes.
+        """
+        if self.dispatcher is None or self.dispatcher.done() or self.queue.qsize() >= self.max_queue:
+            return None
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, chat_id, message, future, time.monotonic())
+        return future
+
+    async def submit(self, chat_id: int, message: str, priority: int = PRIORITY_NORMAL) -> None:
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(priority, chat_id, message, future, time.monotonic())
+        await future
+
+    def _enqueue_delayed(self, item: tuple) -> None:
+        priority, sequence, chat_id, message, future, enqueued_at = item
+        del self.delayed[sequence]
+        self._enqueue(priority, chat_id, message, future, enqueued_at)
+
+    def _prune_chats(self, now: float) -> None:
+        if len(self.chat_ready_at) > 10000:
+            self.chat_ready_at = {chat: ready for chat, ready in self.chat_ready_at.items() if ready > now}
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            item = self.holding = await self.queue.get()
+            telegram_send_queue_depth.set(self.queue.qsize())
+            priority, _, chat_id, message, future, enqueued_at = item
+
+            now = time.monotonic()
+            chat_wait = self.chat_ready_at.get(chat_id, 0.0) - now
+            if chat_wait > 0:
+                # Do not block other chats behind this one.
+                handle = loop.call_later(chat_wait, self._enqueue_delayed, item)
+                self.delayed[item[1]] = (handle, item)
+                self.holding = None
+                continue
+
+            flood_wait = self.flood_until - now
+            if flood_wait > 0:
+                await asyncio.sleep(flood_wait)
+            bucket_wait = self.bucket.reserve()
+            if bucket_wait > 0:
+                await asyncio.sleep(bucket_wait)
+
+            now = time.monotonic()
+            self.chat_ready_at[chat_id] = now + self.per_chat_interval
+            self._prune_chats(now)
+            telegram_send_wait_seconds.observe(now - enqueued_at)
+
+            task = asyncio.create_task(self._send(item))
+            self.in_flight.add(task)
+            task.add_done_callback(self.in_flight.discard)
+            self.holding = None
+
+    async def _send(self, item: tuple) -> None:
+        priority, _, chat_id, message, future, enqueued_at = item
+        try:
+            await self.send(chat_id, message)
+            if not future.done():
+                future.set_result(None)
+        except FloodWaitError as e:
+            telegram_flood_wait_total.inc()
+            self.flood_until = max(self.flood_until, time.monotonic() + e.seconds)
+            logger.warning(f"FloodWait for {e.seconds}s while sending to {chat_id}, pausing sends")
+            self._enqueue(priority, chat_id, message, future, enqueued_at)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+
 class TelegramClientManager:
-    def __init__(self, session_name: str, api_id: int, api_hash: str, bot_token: str):
+    def __init__(self, session_name: str, api_id: int, api_hash: str, bot_token: str, peer_cache: Optional[PeerCache] = None):
         self.session_name = session_name
         self.api_id = api_id
         self.api_hash = api_hash
         self.bot_token = bot_token
         self.client = None
+        self.peer_cache = peer_cache or PeerCache(create_peer_store())
+        self.scheduler = SendScheduler(self._send_now)
 
     async def __aenter__(self):
         self.client = TelegramClient(
             self.session_name,
             self.api_id,
             self.api_hash,
+            flood_sleep_threshold=0,
         )
         try:
             await self.client.start(bot_token=self.bot_token)
             logger.info("Telegram client started")
+            await self.peer_cache.warm()
+            self.client.add_event_handler(self.peer_cache.remember_sender, events.NewMessage(incoming=True))
+            self.scheduler.start()
             return self.client
         except ApiIdInvalidError:
             logger.error("Api ID is invalid. Check your settings.")
             raise
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.scheduler.stop()
         if self.client:
             await self.client.disconnect()
             logger.info("Telegram client disconnected")
 
-    async def send_message(self, user_id: int, message: str):
+    async def resolve_peer(self, user_id: int):
+        peer = await self.peer_cache.get_input_peer(user_id)
+        if peer is None:
+            logger.info(f"Peer cache miss for user {user_id}, resolving through Telegram")
+            peer = await self.client.get_input_entity(user_id)
+            await self.peer_cache.remember(peer)
+        return peer
+
+    async def _send_now(self, user_id: int, message: str):
+        await self.client.send_message(await self.resolve_peer(user_id), message)
+
+    def enqueue_message(self, user_id: int, message: str, priority: int = PRIORITY_NORMAL) -> Optional[asyncio.Future]:
+        return self.scheduler.try_enqueue(user_id, message, priority)
+
+    async def send_message(self, user_id: int, message: str, priority: int = PRIORITY_NORMAL):
         try:
-            await self.client.send_message(user_id, message)
+            await self.scheduler.submit(user_id, message, priority)
             logger.info(f"Sent message to user {user_id}")
         except Exception as e:
             logger.exception(f"Failed to send message to user {user_id}: {e}")
-            raise
\ No newline at end of file
+            raise
@@ -0,0 +1,53 @@
+import os
+
+import psycopg2
+import pytest
+
+from tests.query_plans import PLAN_TEST_DATABASE_URL, drop, seed
+
+# Two separate Postgres instances, primary first: "postgresql://...,postgresql://..."
+REPLICA_TEST_DATABASE_URLS = os.getenv("REPLICA_TEST_DATABASE_URLS")
+REPLICA_SCHEMA = "replica_routing"
+
+@pytest.fixture(scope="session")
+def plan_database():
+    """
+    URL of a Postgres seeded with a realistic dataset in the query_plans schema.
+    """
+    if not PLAN_TEST_DATABASE_URL:
+        pytest.skip("PLAN_TEST_DATABASE_URL is not set")
+    seed(PLAN_TEST_DATABASE_URL)
+    yield PLAN_TEST_DATABASE_URL
+    drop(PLAN_TEST_DATABASE_URL)
+
+@pytest.fixture
+def replica_databases():
+    """
+    (primary_url, replica_url), each with an empty replica_routing schema selected by the URL.
+    The two do not replicate, so a test can tell which one served a read by what it returns.
+    """
+    from src.scrapper.database.orm_db import Base
+    from sqlalchemy import create_engine
+
+    if not REPLICA_TEST_DATABASE_URLS:
+        pytest.skip("REPLICA_TEST_DATABASE_URLS is not set")
+    urls = [url.strip() for url in REPLICA_TEST_DATABASE_URLS.split(",")]
+    if len(urls) != 2:
+        pytest.fail("REPLICA_TEST_DATABASE_URLS must list a primary and a replica")
+
+    schema_urls = []
+    for url in urls:
+        with psycopg2.connect(url) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {REPLICA_SCHEMA} CASCADE; CREATE SCHEMA {REPLICA_SCHEMA}")
+        separator = "&" if "?" in url else "?"
+        schema_url = f"{url}{separator}options=-csearch_path%3D{REPLICA_SCHEMA}"
+        engine = create_engine(schema_url)
+        Base.metadata.create_all(bind=engine)
+        engine.dispose()
+        schema_urls.append(schema_url)
+
+    yield tuple(schema_urls)
+
+    for url in urls:
+        with psycopg2.connect(url) as conn, conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {REPLICA_SCHEMA} CASCADE")
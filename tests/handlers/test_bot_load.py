@@ -0,0 +1,27 @@
+import pytest
+
+from benchmarks.bot_load import parse_mix, percentile, run_benchmark
+
+def test_percentile_of_sorted_latencies():
+    values = [float(i) for i in range(1, 101)]
+
+    assert percentile(values, 50) == 51.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([], 99) == 0.0
+
+def test_unknown_command_in_mix_is_rejected():
+    with pytest.raises(ValueError):
+        parse_mix("track=1,start=1")
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("use_redis", [True, False])
+async def test_short_run_reports_every_command(use_redis):
+    if use_redis:
+        pytest.importorskip("fakeredis")
+
+    result = await run_benchmark(rate=300, duration=0.2, users=5, use_redis=use_redis)
+
+    assert result["completed"] == 60
+    assert set(result["commands"]) == {"track", "list", "untrack"}
+    assert result["error_replies"] == 0
+    assert all(stats["p50_ms"] <= stats["p99_ms"] for stats in result["commands"].values())
@@ -0,0 +1,66 @@
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.bot_logic.handlers import list_handler
+from src.bot_logic.handlers.list_handler import ListCommandHandler, render_page
+
+def make_page(ids, next_cursor=None, prev_cursor=None):
+    items = [{"id": i, "url": f"https://github.com/a/{i}"} for i in ids]
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+def button_data(buttons):
+    return [button.data.decode() for button in buttons[0]] if buttons else []
+
+class PagedCache:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    async def get_or_load(self, user_id, page, loader):
+        self.requested.append(page)
+        return self.pages[page]
+
+def make_handler(mocker, pages):
+    mocker.patch.object(list_handler, "get_subscription_cache", return_value=PagedCache(pages))
+    return ListCommandHandler(SimpleNamespace(send_message=mock.AsyncMock()))
+
+def test_long_page_is_cut_at_the_message_limit():
+    items = [{"id": i, "url": "https://github.com/" + "a" * 1000} for i in range(10)]
+
+    message, shown = render_page(items, 1)
+
+    assert len(message) <= list_handler.TELEGRAM_MESSAGE_LIMIT
+    assert 0 < shown < len(items)
+
+@pytest.mark.asyncio
+async def test_first_page_has_only_next_button(mocker):
+    handler = make_handler(mocker, {"20::": make_page([1, 2], next_cursor=2)})
+    mocker.patch.object(list_handler, "LIST_PAGE_SIZE", 20)
+
+    await handler.execute(SimpleNamespace(chat_id=7))
+
+    args = handler.client.send_message.await_args
+    assert "1. https://github.com/a/1" in args.args[1]
+    assert button_data(args.kwargs["buttons"]) == ["list:a:2:3"]
+
+@pytest.mark.asyncio
+async def test_prev_button_renumbers_the_previous_page(mocker):
+    handler = make_handler(mocker, {"20::3": make_page([1, 2], next_cursor=2)})
+    mocker.patch.object(list_handler, "LIST_PAGE_SIZE", 20)
+    event = SimpleNamespace(chat_id=7, data=b"list:b:3:3", answer=mock.AsyncMock(), edit=mock.AsyncMock())
+
+    await handler.handle_callback(event)
+
+    message = event.edit.await_args.args[0]
+    assert "1. https://github.com/a/1" in message and "2. https://github.com/a/2" in message
+    assert button_data(event.edit.await_args.kwargs["buttons"]) == ["list:a:2:3"]
+
+@pytest.mark.asyncio
+async def test_no_subscriptions(mocker):
+    handler = make_handler(mocker, {"20::": make_page([])})
+    mocker.patch.object(list_handler, "LIST_PAGE_SIZE", 20)
+
+    await handler.execute(SimpleNamespace(chat_id=7))
+
+    assert handler.client.send_message.await_args.args[1] == "У вас нет подписок."
@@ -0,0 +1,88 @@
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.bot_logic.router import CommandRouter, command_token
+from src.bot_logic.conversation_state import MemoryConversationStateStore
+
+def make_event(text: str, chat_id: int = 1):
+    return SimpleNamespace(chat_id=chat_id, message=SimpleNamespace(text=text))
+
+def make_router():
+    router = CommandRouter(MemoryConversationStateStore())
+    track, list_, url = mock.AsyncMock(), mock.AsyncMock(), mock.AsyncMock()
+    router.add_command("/track", track)
+    router.add_command("/list", list_)
+    router.add_state("waiting_for_url", url)
+    return router, track, list_, url
+
+def test_command_token():
+    assert command_token("/track@links_bot https://github.com/a/b") == "/track"
+    assert command_token("/LIST") == "/list"
+    assert command_token("https://github.com/a/b") is None
+    assert command_token("") is None
+
+@pytest.mark.asyncio
+async def test_command_is_dispatched_by_exact_token():
+    router, track, list_, url = make_router()
+
+    await router.dispatch(make_event("/list"))
+    await router.dispatch(make_event("/listing"))
+
+    list_.assert_awaited_once()
+    track.assert_not_awaited()
+    url.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_plain_message_goes_to_conversation_state():
+    router, track, list_, url = make_router()
+    await router.states.set(1, "waiting_for_url")
+
+    await router.dispatch(make_event("https://github.com/a/b"))
+    await router.dispatch(make_event("https://github.com/a/b", chat_id=2))
+
+    url.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_new_command_abandons_conversation():
+    router, track, list_, url = make_router()
+    await router.states.set(1, "waiting_for_url")
+
+    await router.dispatch(make_event("/list"))
+    await router.dispatch(make_event("https://github.com/a/b"))
+
+    list_.assert_awaited_once()
+    url.assert_not_awaited()
+
+def test_duplicate_command_is_rejected():
+    router, *_ = make_router()
+
+    with pytest.raises(ValueError):
+        router.add_command("/track", mock.AsyncMock())
+
+@pytest.mark.asyncio
+async def test_memory_store_expires_and_is_bounded(mocker):
+    store = MemoryConversationStateStore(ttl=10, max_chats=2)
+    now = mocker.patch("src.bot_logic.conversation_state.time.monotonic", return_value=0)
+
+    for chat_id in (1, 2, 3):
+        await store.set(chat_id, "waiting_for_url")
+    assert await store.get(1) is None
+    assert await store.get(3) == "waiting_for_url"
+
+    now.return_value = 11
+    assert await store.get(3) is None
+
+@pytest.mark.asyncio
+async def test_redis_store_sets_ttl():
+    fakeredis = pytest.importorskip("fakeredis")
+    from src.bot_logic.conversation_state import RedisConversationStateStore
+
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    store = RedisConversationStateStore(client, ttl=30)
+    await store.set(1, "waiting_for_url")
+
+    assert await store.get(1) == "waiting_for_url"
+    assert 0 < await client.ttl(store.key(1)) <= 30
+    await store.clear(1)
+    assert await store.get(1) is None
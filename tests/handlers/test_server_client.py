@@ -0,0 +1,62 @@
+import asyncio
+import httpx
+import pytest
+
+from src.bot_logic.server_client import ServerClient, is_fallback
+
+SUBSCRIPTIONS = [{"url": "https://github.com/a/b"}]
+
+def make_client(handler) -> ServerClient:
+    return ServerClient("http://server", transport=httpx.MockTransport(handler), backoff_factor=0)
+
+@pytest.mark.asyncio
+async def test_list_is_revalidated_with_etag():
+    requests = []
+
+    def handler(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return httpx.Response(304, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json=SUBSCRIPTIONS, headers={"ETag": '"v1"'})
+
+    client = make_client(handler)
+
+    assert await client.get_subscriptions(1) == SUBSCRIPTIONS
+    assert await client.get_subscriptions(1) == SUBSCRIPTIONS
+    assert requests == [None, '"v1"']
+
+@pytest.mark.asyncio
+async def test_writes_drop_the_etag():
+    requests = []
+
+    def handler(request):
+        requests.append((request.method, request.headers.get("If-None-Match")))
+        if request.method == "GET":
+            return httpx.Response(200, json=SUBSCRIPTIONS, headers={"ETag": '"v1"'})
+        return httpx.Response(200, json=None)
+
+    client = make_client(handler)
+    await client.get_subscriptions(1)
+    await client.delete_subscription("https://github.com/a/b", 1)
+    await client.get_subscriptions(1)
+
+    assert requests == [("GET", None), ("DELETE", None), ("GET", None)]
+
+@pytest.mark.asyncio
+async def test_concurrent_commands_share_the_pool():
+    async def handler(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"status": "ok"})
+
+    client = make_client(handler)
+    results = await asyncio.gather(*(client.create_subscription("https://github.com/a/b", user_id) for user_id in range(200)))
+    await client.aclose()
+
+    assert not any(is_fallback(result) for result in results)
+
+@pytest.mark.asyncio
+async def test_server_error_returns_fallback():
+    client = make_client(lambda request: httpx.Response(500))
+    client.retries = 0
+
+    assert is_fallback(await client.get_subscriptions(1))
@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from src.bot_logic.subscription_cache import SubscriptionPageCache, page_key
+
+PAGE = {"items": [{"id": 1, "url": "https://github.com/a/b"}], "next_cursor": None, "prev_cursor": None}
+FIRST = page_key(20)
+
+def make_cache() -> SubscriptionPageCache:
+    return SubscriptionPageCache(fakeredis.aioredis.FakeRedis(decode_responses=True))
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_load_once():
+    cache = make_cache()
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return PAGE
+
+    results = await asyncio.gather(*(cache.get_or_load(1, FIRST, loader) for _ in range(50)))
+
+    assert calls == 1
+    assert all(result == PAGE for result in results)
+    assert await cache.get(1, FIRST) == PAGE
+
+@pytest.mark.asyncio
+async def test_pages_are_cached_separately():
+    cache = make_cache()
+    second = dict(PAGE, prev_cursor=2)
+
+    await cache.get_or_load(1, FIRST, lambda: asyncio.sleep(0, result=PAGE))
+    await cache.get_or_load(1, page_key(20, after=1), lambda: asyncio.sleep(0, result=second))
+
+    assert await cache.get(1, FIRST) == PAGE
+    assert await cache.get(1, page_key(20, after=1)) == second
+
+def page(*ids, next_cursor=None, prev_cursor=None):
+    items = [{"id": i, "url": f"https://github.com/a/{i}"} for i in ids]
+    return {"items": items, "next_cursor": next_cursor, "prev_cursor": prev_cursor}
+
+async def cache_pages(cache, pages):
+    for key, value in pages.items():
+        await cache.get_or_load(1, key, lambda value=value: asyncio.sleep(0, result=value))
+
+def subscription(i):
+    return {"id": i, "url": f"https://github.com/a/{i}", "type": "github", "created_at": "2024-01-01T00:00:00"}
+
+@pytest.mark.asyncio
+async def test_track_is_appended_to_the_last_page_with_room():
+    cache = make_cache()
+    pages = {
+        FIRST: page(1, 2, next_cursor=2),
+        page_key(2, after=2): page(3, prev_cursor=3),
+        page_key(2, before=3): page(1, 2, next_cursor=2),
+    }
+    await cache_pages(cache, pages)
+
+    await cache.add(1, dict(subscription(4), user_id=1, tags=None))
+
+    assert await cache.get(1, FIRST) == pages[FIRST]
+    assert (await cache.get(1, page_key(2, after=2)))["items"] == pages[page_key(2, after=2)]["items"] + [subscription(4)]
+    assert await cache.get(1, page_key(2, before=3)) == pages[page_key(2, before=3)]
+
+@pytest.mark.asyncio
+async def test_track_drops_the_last_page_when_it_is_full():
+    cache = make_cache()
+    await cache_pages(cache, {FIRST: page(1, 2, next_cursor=2), page_key(2, after=2): page(3, 4, prev_cursor=3)})
+
+    await cache.add(1, subscription(5))
+
+    assert await cache.get(1, FIRST) == page(1, 2, next_cursor=2)
+    assert await cache.get(1, page_key(2, after=2)) is None
+
+@pytest.mark.asyncio
+async def test_track_without_an_id_drops_pages_reaching_the_end():
+    cache = make_cache()
+    await cache_pages(cache, {FIRST: page(1, 2, next_cursor=2), page_key(2, after=2): page(3, prev_cursor=3)})
+
+    await cache.add(1, {"status": "ok"})
+
+    assert await cache.get(1, FIRST) == page(1, 2, next_cursor=2)
+    assert await cache.get(1, page_key(2, after=2)) is None
+
+@pytest.mark.asyncio
+async def test_untrack_removes_the_url_from_cached_pages():
+    cache = make_cache()
+    pages = {FIRST: page(1, 2, next_cursor=2), page_key(2, after=2): page(3, 4, prev_cursor=3)}
+    await cache_pages(cache, pages)
+
+    await cache.remove(1, "https://github.com/a/2")
+
+    assert await cache.get(1, FIRST) == page(1, next_cursor=2)
+    assert await cache.get(1, page_key(2, after=2)) == pages[page_key(2, after=2)]
+
+@pytest.mark.asyncio
+async def test_untrack_of_the_only_subscription_keeps_an_empty_list_cached():
+    cache = make_cache()
+    await cache_pages(cache, {FIRST: PAGE})
+
+    await cache.remove(1, "https://github.com/a/b")
+
+    assert await cache.get(1, FIRST) == {"items": [], "next_cursor": None, "prev_cursor": None}
+
+@pytest.mark.asyncio
+async def test_load_racing_with_track_is_not_cached():
+    cache = make_cache()
+
+    async def loader():
+        await cache.add(1, subscription(2))
+        return PAGE
+
+    assert await cache.get_or_load(1, FIRST, loader) == PAGE
+    assert await cache.get(1, FIRST) is None
+
+@pytest.mark.asyncio
+async def test_fallback_result_is_not_cached():
+    cache = make_cache()
+    fallback = {"status": "fallback", "message": "GET failed"}
+
+    assert await cache.get_or_load(1, FIRST, lambda: asyncio.sleep(0, result=fallback)) == fallback
+    assert await cache.get(1, FIRST) is None
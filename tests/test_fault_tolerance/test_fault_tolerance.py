@@ -6,7 +6,8 @@ import time
 import requests
 from httpx import AsyncClient
 from fastapi.testclient import TestClient
-from src.notification_service.main import app, send_with_http, send_with_kafka, LinkUpdated, link_updated
+from src.notification_service.delivery import LinkUpdated, send_with_http, send_with_kafka
+from src.notification_service.main import app, link_updated
 from unittest import mock
 import responses
 from fastapi import status
@@ -33,9 +34,9 @@ def test_client():
 
 @responses.activate
 def test_http_retry_logic(mocker):
-    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/", status=500)
-    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/", status=503)
-    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/", status=200)
+    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/batch", status=500)
+    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/batch", status=503)
+    responses.add(responses.POST, f"{SERVER_URL}/api/v1/updated/batch", status=200, json={"accepted": [123456789], "rejected": []})
 
     mock_get_links = mocker.patch(
         "src.notification_service.main.get_links_from_database"
@@ -58,30 +59,34 @@ async def test_fallback_to_kafka_if_http_fails(mocker):
         side_effect=[[111222333], []]
     )
 
-    mocker.patch("src.notification_service.main.send_with_http", side_effect=Exception("HTTP failed"))
+    mocker.patch("src.notification_service.delivery.send_with_http", side_effect=Exception("HTTP failed"))
+
+    async def deliver_with_kafka(update_notification, ledger, start, stop):
+        ledger.mark_delivered(0, "KAFKA")
 
     mock_send_kafka = mocker.patch(
-        "src.notification_service.main.send_with_kafka",
-        return_value={"status": "fallback success"}
+        "src.notification_service.delivery.send_with_kafka",
+        side_effect=deliver_with_kafka
     )
 
     mocker.patch.dict("os.environ", {"MESSAGE_TRANSPORT": "HTTP"})
 
     payload = LinkUpdated(**TEST_PAYLOAD)
-    response = await link_updated(payload)
+    response = await link_updated(payload, idempotency_key=None)
 
-    assert response == {"status": "fallback success"}
+    assert response["status"] == "ok"
+    assert response["delivered"] == 1
     assert mock_send_kafka.called
 
 @responses.activate
 def test_circuit_breaker_fast_failure(mocker):
     responses.add(
         responses.POST,
-        "http://mock-server/api/v1/updated/",
+        "http://mock-server/api/v1/updated/batch",
         body=lambda req: time.sleep(5) or (200, {}, "OK"),
     )
 
-    mocker.patch("src.notification_service.main.SERVER_URL", "http://mock-server")
+    mocker.patch("src.notification_service.delivery.SERVER_URL", "http://mock-server")
     mocker.patch("src.notification_service.main.get_links_from_database", side_effect=[[123456789], []])
 
     mocker.patch.dict("os.environ", {
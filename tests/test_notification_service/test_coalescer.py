@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from pydantic import BaseModel
+
+from src.notification_service.coalescer import UpdateCoalescer
+from src.notification_service.delivery_ledger import LedgerRegistry
+
+class Update(BaseModel):
+    link_id: int
+    title: str
+    more_changes: int = 0
+
+@pytest.mark.asyncio
+async def test_bursty_updates_are_merged_into_one_fan_out():
+    flushed = []
+
+    async def flush(update, job_id):
+        flushed.append(update)
+
+    coalescer = UpdateCoalescer(flush, window=0.05)
+    for i in range(5):
+        await coalescer.submit(Update(link_id=1, title=f"change {i}"))
+    await coalescer.submit(Update(link_id=2, title="other"))
+
+    await asyncio.sleep(0.1)
+
+    by_link = {update.link_id: update for update in flushed}
+    assert len(flushed) == 2
+    assert by_link[1].title == "change 4"
+    assert by_link[1].more_changes == 4
+    assert by_link[2].more_changes == 0
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried_with_newer_changes():
+    attempts = []
+
+    async def flush(update, job_id):
+        attempts.append(update)
+        if len(attempts) == 1:
+            await coalescer.submit(Update(link_id=1, title="newer"))
+            raise RuntimeError("transport down")
+
+    coalescer = UpdateCoalescer(flush, window=0.02)
+    await coalescer.submit(Update(link_id=1, title="first"))
+    await asyncio.sleep(0.08)
+
+    assert len(attempts) == 2
+    assert attempts[1].title == "newer"
+    assert attempts[1].more_changes == 1
+    assert not coalescer.pending
+
+@pytest.mark.asyncio
+async def test_flush_all_drains_pending_updates():
+    flushed = []
+
+    async def flush(update, job_id):
+        flushed.append(update)
+
+    coalescer = UpdateCoalescer(flush, window=60)
+    await coalescer.submit(Update(link_id=1, title="a"))
+    await coalescer.flush_all()
+
+    assert [update.title for update in flushed] == ["a"]
+    assert not coalescer.timers
+
+@pytest.mark.asyncio
+async def test_flush_all_waits_for_fan_out_in_progress():
+    finished = []
+
+    async def flush(update, job_id):
+        await asyncio.sleep(0.05)
+        finished.append(update.title)
+
+    coalescer = UpdateCoalescer(flush, window=0.01)
+    await coalescer.submit(Update(link_id=1, title="a"))
+    await asyncio.sleep(0.02)
+    await coalescer.flush_all()
+
+    assert finished == ["a"]
+
+@pytest.mark.asyncio
+async def test_dropped_update_releases_every_merged_dedupe_key():
+    released = []
+
+    async def flush(update, job_id):
+        raise RuntimeError("transport down")
+
+    async def release(job_id, keys):
+        released.extend(keys)
+
+    coalescer = UpdateCoalescer(flush, window=0.01, max_retries=1, release_callback=release)
+    await coalescer.submit(Update(link_id=1, title="a"), "key-a")
+    await coalescer.submit(Update(link_id=1, title="b"), "key-b")
+    await asyncio.sleep(0.015)
+    await coalescer.submit(Update(link_id=1, title="c"), "key-c")
+    await asyncio.sleep(0.05)
+
+    assert sorted(released) == ["key-a", "key-b", "key-c"]
+    assert not coalescer.pending
+
+@pytest.mark.asyncio
+async def test_retry_merged_with_newer_update_resumes_the_failed_ledger():
+    registry = LedgerRegistry()
+    job_ids, sent = [], []
+
+    async def flush(update, job_id):
+        job_ids.append(job_id)
+        ledger = registry.get_or_create(job_id)
+        for position in range(4):
+            if ledger.is_delivered(position):
+                continue
+            if len(job_ids) == 1 and position == 2:
+                await coalescer.submit(Update(link_id=1, title="newer"), "key-newer")
+                raise RuntimeError("transport down")
+            sent.append((update.title, position))
+            ledger.mark_delivered(position, "http")
+        registry.discard(job_id)
+
+    coalescer = UpdateCoalescer(flush, window=0.02)
+    await coalescer.submit(Update(link_id=1, title="first"), "key-first")
+    await asyncio.sleep(0.08)
+
+    assert job_ids == ["key-first:coalesced"] * 2
+    assert sent == [("first", 0), ("first", 1), ("newer", 2), ("newer", 3)]
+    assert not registry.ledgers
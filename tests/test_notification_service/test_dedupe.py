@@ -0,0 +1,45 @@
+import pytest
+from unittest import mock
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from src.notification_service.dedupe import (
+    InMemoryDedupeStore,
+    RedisDedupeStore,
+    build_idempotency_key,
+)
+
+def test_idempotency_key_prefers_explicit_header():
+    assert build_idempotency_key(1, "2024-01-01T00:00:00") == "link_updated:1:2024-01-01T00:00:00"
+    assert build_idempotency_key(1, "2024-01-01T00:00:00", "abc") == "link_updated:abc"
+
+@pytest.mark.asyncio
+async def test_in_memory_store_drops_repeats_until_released():
+    store = InMemoryDedupeStore(ttl=60, max_entries=10)
+
+    assert await store.check_and_set("key") is True
+    assert await store.check_and_set("key") is False
+
+    await store.release("key")
+    assert await store.check_and_set("key") is True
+
+@pytest.mark.asyncio
+async def test_in_memory_store_expires_and_evicts(mocker):
+    clock = mocker.patch("src.notification_service.dedupe.time.monotonic", return_value=0)
+    store = InMemoryDedupeStore(ttl=10, max_entries=2)
+
+    await store.check_and_set("a")
+    await store.check_and_set("b")
+    await store.check_and_set("c")
+    assert await store.check_and_set("a") is True
+
+    clock.return_value = 11
+    assert await store.check_and_set("c") is True
+
+@pytest.mark.asyncio
+async def test_redis_store_falls_back_to_memory():
+    client = mock.AsyncMock()
+    client.set.side_effect = RedisConnectionError("redis is down")
+    store = RedisDedupeStore(client, ttl=60)
+
+    assert await store.check_and_set("key") is True
+    assert await store.check_and_set("key") is False
@@ -0,0 +1,41 @@
+from src.notification_service.delivery_ledger import DeliveryLedger, LedgerRegistry
+
+def test_ledger_counts_delivered_failed_and_pending():
+    ledger = DeliveryLedger("job")
+    for position in range(10):
+        ledger.register(position)
+
+    ledger.mark_delivered(0, "HTTP")
+    ledger.mark_delivered(9, "HTTP")
+    ledger.mark_failed(5)
+
+    assert ledger.is_delivered(9)
+    assert not ledger.is_delivered(5)
+    assert ledger.counts() == {"delivered": 2, "failed": 1, "pending": 7}
+
+def test_fallback_delivery_clears_failure():
+    ledger = DeliveryLedger("job")
+    ledger.mark_delivered(0, "HTTP")
+    ledger.mark_failed(1)
+    ledger.mark_delivered(1, "KAFKA")
+    ledger.mark_delivered(1, "KAFKA")
+    ledger.finish()
+
+    assert ledger.is_complete()
+    assert ledger.acks == {"HTTP": 1, "KAFKA": 1}
+    assert ledger.counts() == {"delivered": 2, "failed": 0, "pending": 0}
+
+def test_registry_resumes_existing_job():
+    registry = LedgerRegistry(max_jobs=2)
+    ledger = registry.get_or_create("a")
+    ledger.mark_delivered(3, "HTTP")
+    ledger.finish()
+
+    resumed = registry.get_or_create("a")
+    assert resumed is ledger
+    assert resumed.is_delivered(3)
+    assert not resumed.exhausted
+
+    registry.get_or_create("b")
+    registry.get_or_create("c")
+    assert "a" not in registry.ledgers
@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+
+from src.notification_service.fanout_scheduler import FanoutScheduler, PRIORITY_LANE, BULK_LANE
+
+@pytest.mark.asyncio
+async def test_jobs_are_split_into_chunks():
+    scheduler = FanoutScheduler(concurrency=1, chunk_size=3, small_job_threshold=0)
+    ranges = []
+
+    async def deliver(start, stop):
+        ranges.append((start, stop))
+
+    await scheduler.run(1, 7, deliver)
+
+    assert ranges == [(0, 3), (3, 6), (6, 7)]
+    assert scheduler.available == 1
+
+@pytest.mark.asyncio
+async def test_small_job_is_not_blocked_by_mega_job():
+    scheduler = FanoutScheduler(concurrency=1, chunk_size=10, small_job_threshold=10, priority_weight=4)
+    order = []
+
+    def deliver_for(link_id):
+        async def deliver(start, stop):
+            order.append(link_id)
+            await asyncio.sleep(0.001)
+        return deliver
+
+    mega = asyncio.create_task(scheduler.run(1, 1000, deliver_for(1)))
+    await asyncio.sleep(0.005)
+    small = asyncio.create_task(scheduler.run(2, 5, deliver_for(2)))
+    await small
+
+    assert not mega.done()
+    assert order.index(2) < 10
+    await mega
+    assert order.count(1) == 100
+
+@pytest.mark.asyncio
+async def test_bulk_jobs_are_served_round_robin():
+    scheduler = FanoutScheduler(concurrency=1, chunk_size=1, small_job_threshold=0)
+    order = []
+
+    def deliver_for(link_id):
+        async def deliver(start, stop):
+            order.append(link_id)
+            await asyncio.sleep(0)
+        return deliver
+
+    await asyncio.gather(
+        scheduler.run(1, 3, deliver_for(1)),
+        scheduler.run(2, 3, deliver_for(2)),
+    )
+
+    assert order == [1, 2, 1, 2, 1, 2]
+
+def test_priority_lane_yields_to_bulk_after_weight():
+    scheduler = FanoutScheduler(priority_weight=2)
+    scheduler.waiters[PRIORITY_LANE].extend([None] * 5)
+    scheduler.waiters[BULK_LANE].extend([None] * 5)
+
+    lanes = [scheduler._next_lane() for _ in range(6)]
+
+    assert lanes == [PRIORITY_LANE, PRIORITY_LANE, BULK_LANE, PRIORITY_LANE, PRIORITY_LANE, BULK_LANE]
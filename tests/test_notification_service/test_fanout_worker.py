@@ -0,0 +1,160 @@
+import asyncio
+import subprocess
+import sys
+import zlib
+import pytest
+
+from src.notification_service.dedupe import InMemoryDedupeStore
+from src.notification_service.fanout_worker import (
+    FanoutTransport,
+    FanoutWorker,
+    build_chunk_jobs,
+    chunk_key,
+    publish_chunk_jobs,
+)
+
+class InMemoryFanoutTransport(FanoutTransport):
+    """
+    Stand-in for a partitioned Kafka topic consumed by one consumer group.
+    """
+
+    def __init__(self, partitions: int = 4):
+        self.partitions = [asyncio.Queue() for _ in range(partitions)]
+        self.acked = []
+
+    def consumer(self, assigned: list[int]) -> "InMemoryFanoutTransport":
+        consumer = InMemoryFanoutTransport.__new__(InMemoryFanoutTransport)
+        consumer.partitions = self.partitions
+        consumer.acked = self.acked
+        consumer.assigned = assigned
+        return consumer
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, key: str, job: dict) -> None:
+        await self.partitions[zlib.crc32(key.encode()) % len(self.partitions)].put(job)
+
+    async def jobs(self):
+        while True:
+            for partition in self.assigned:
+                if not self.partitions[partition].empty():
+                    yield self.partitions[partition].get_nowait()
+                    break
+            else:
+                await asyncio.sleep(0.001)
+
+    async def ack(self, job: dict) -> None:
+        self.acked.append(chunk_key(job))
+
+    async def drained(self) -> None:
+        while any(not partition.empty() for partition in self.partitions):
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+
+UPDATE = {"link_id": 7, "url": "https://github.com/a/b", "last_update": "2024-01-01T00:00:00"}
+
+def test_chunk_jobs_cover_all_recipients():
+    jobs = build_chunk_jobs("job", UPDATE, list(range(7)), chunk_size=3)
+
+    assert [job["start"] for job in jobs] == [0, 3, 6]
+    assert sum((job["telegram_ids"] for job in jobs), []) == list(range(7))
+
+@pytest.mark.asyncio
+async def test_resent_dispatch_publishes_only_the_missing_chunks():
+    published, failed = [], []
+
+    class FlakyTransport(InMemoryFanoutTransport):
+        async def publish(self, key, job):
+            if job["start"] == 6 and not failed:
+                failed.append(job["start"])
+                raise ConnectionError("broker down")
+            published.append(job["start"])
+
+    transport, store = FlakyTransport(), InMemoryDedupeStore()
+    jobs = build_chunk_jobs("job", UPDATE, list(range(10)), chunk_size=3)
+
+    with pytest.raises(ConnectionError):
+        await publish_chunk_jobs(transport, jobs, store)
+    assert await publish_chunk_jobs(transport, jobs, store) == 2
+
+    assert published == [0, 3, 6, 9]
+
+@pytest.mark.asyncio
+async def test_workers_in_a_group_deliver_every_chunk_once():
+    topic = InMemoryFanoutTransport(partitions=4)
+    delivered = []
+
+    async def deliver(job, ledger):
+        for position, telegram_id in enumerate(ledger.recipients):
+            delivered.append(telegram_id)
+            ledger.mark_delivered(position, "HTTP")
+
+    workers = [
+        FanoutWorker(topic.consumer([0, 1]), deliver),
+        FanoutWorker(topic.consumer([2, 3]), deliver),
+    ]
+    tasks = [asyncio.create_task(worker.run()) for worker in workers]
+
+    for job in build_chunk_jobs("job", UPDATE, list(range(100)), chunk_size=10):
+        await topic.publish(chunk_key(job), job)
+    await topic.drained()
+    for task in tasks:
+        task.cancel()
+
+    assert sorted(delivered) == list(range(100))
+    assert len(topic.acked) == 10
+    assert all(worker.processed > 0 for worker in workers)
+
+@pytest.mark.asyncio
+async def test_undelivered_recipients_are_requeued():
+    topic = InMemoryFanoutTransport(partitions=1)
+    attempts = []
+
+    async def deliver(job, ledger):
+        attempts.append(list(ledger.recipients))
+        for position, telegram_id in enumerate(ledger.recipients):
+            if telegram_id != 2 or job["attempt"] > 0:
+                ledger.mark_delivered(position, "HTTP")
+
+    worker = FanoutWorker(topic.consumer([0]), deliver, max_attempts=3)
+    task = asyncio.create_task(worker.run())
+
+    for job in build_chunk_jobs("job", UPDATE, [1, 2, 3], chunk_size=10):
+        await topic.publish(chunk_key(job), job)
+    await topic.drained()
+    task.cancel()
+
+    assert attempts == [[1, 2, 3], [2]]
+
+@pytest.mark.asyncio
+async def test_stop_request_finishes_and_acks_job_in_hand():
+    topic = InMemoryFanoutTransport(partitions=1)
+    worker = None
+
+    async def deliver(job, ledger):
+        worker.request_stop()
+        await asyncio.sleep(0.01)
+        for position in range(len(ledger.recipients)):
+            ledger.mark_delivered(position, "HTTP")
+
+    worker = FanoutWorker(topic.consumer([0]), deliver)
+    for job in build_chunk_jobs("job", UPDATE, list(range(20)), chunk_size=10):
+        await topic.publish(chunk_key(job), job)
+    await asyncio.wait_for(worker.run(), timeout=1)
+
+    assert worker.processed == 1
+    assert topic.acked == ["7:0"]
+    assert topic.partitions[0].qsize() == 1
+
+def test_worker_does_not_import_the_api_module():
+    # main builds the app, Redis, the LISTEN connection and the limiter at import time.
+    code = (
+        "import sys, src.notification_service.fanout_worker; "
+        "sys.exit('src.notification_service.main' in sys.modules)"
+    )
+
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
@@ -0,0 +1,69 @@
+import psycopg2
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.db_replicas import ReplicaRouter
+from src.notification_service.database import orm_db
+from src.notification_service.database.orm_db import OrmDatabaseService
+from src.notification_service.database.sql_db import STATEMENTS, SqlDatabaseService
+from src.prepared_statements import PreparedStatements
+from tests.query_plans import (
+    SEARCH_PATH_OPTIONS,
+    SEED_LINK_ID,
+    explain_seq_scans,
+    migrated_index_names,
+    recording_cursor,
+)
+
+def sql_service(url, statements):
+    service = object.__new__(SqlDatabaseService)
+    service.conn = psycopg2.connect(url, options=SEARCH_PATH_OPTIONS, cursor_factory=recording_cursor(statements))
+    service.router = ReplicaRouter(())
+    service.statements = PreparedStatements(STATEMENTS)
+    return service
+
+def orm_service(url, statements):
+    service = object.__new__(OrmDatabaseService)
+    service.engine = create_engine(url, connect_args={"options": SEARCH_PATH_OPTIONS})
+
+    @event.listens_for(service.engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append(cursor.mogrify(statement, parameters).decode())
+
+    service.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=service.engine)
+    service.router = ReplicaRouter(())
+    return service
+
+@pytest.mark.parametrize("make_service", [sql_service, orm_service], ids=["sql", "orm"])
+@pytest.mark.parametrize("offset", [0, 500])
+def test_fan_out_query_plan_has_no_seq_scan(plan_database, make_service, offset):
+    statements = []
+    service = make_service(plan_database, statements)
+
+    service.get_users_by_link_id(SEED_LINK_ID, offset, 500)
+
+    assert statements
+    assert explain_seq_scans(plan_database, statements) == {}
+
+@pytest.mark.parametrize("make_service", [sql_service, orm_service], ids=["sql", "orm"])
+def test_keyset_fan_out_query_plan_has_no_seq_scan(plan_database, make_service):
+    statements = []
+    service = make_service(plan_database, statements)
+
+    service.get_all_users_by_link_id(SEED_LINK_ID, 500)
+
+    assert statements
+    assert explain_seq_scans(plan_database, statements) == {}
+
+def test_orm_schema_matches_migrations():
+    names = set()
+    for table in orm_db.Base.metadata.tables.values():
+        names |= {index.name for index in table.indexes}
+        names |= {
+            constraint.name for constraint in table.constraints
+            if constraint.name and constraint.name.startswith("uq_")
+        }
+
+    assert names == migrated_index_names()
@@ -0,0 +1,88 @@
+import psycopg2
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db_replicas import ReplicaRouter
+from src.notification_service.database.orm_db import OrmDatabaseService
+from src.notification_service.database.sql_db import STATEMENTS, SqlDatabaseService
+from src.notification_service.subscriber_cache import SubscriberCache, SubscriptionChangeListener
+from src.prepared_statements import PreparedStatements
+
+UNREACHABLE_REPLICA = "postgresql://postgres@127.0.0.1:1/postgres"
+
+def sql_service(primary_url, router):
+    service = object.__new__(SqlDatabaseService)
+    service.conn = psycopg2.connect(primary_url)
+    service.router = router
+    service.replica_conns = {}
+    service.statements = PreparedStatements(STATEMENTS)
+    return service
+
+def orm_service(primary_url, router):
+    service = object.__new__(OrmDatabaseService)
+    service.engine = create_engine(primary_url)
+    service.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=service.engine)
+    service.router = router
+    service.replica_sessions = {}
+    return service
+
+SERVICES = {"sql": sql_service, "orm": orm_service}
+
+def subscribe(url, telegram_id):
+    with psycopg2.connect(url) as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id", (telegram_id,))
+        user_id = cur.fetchone()[0]
+        cur.execute("INSERT INTO links (url, type, last_checked_at) VALUES ('https://github.com/a/b', 'github', NOW())")
+        cur.execute("INSERT INTO subscriptions (user_id, link_id, created_at) VALUES (%s, 1, NOW())", (user_id,))
+
+def subscribe_all(url, telegram_ids):
+    with psycopg2.connect(url) as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO links (url, type, last_checked_at) VALUES ('https://github.com/a/b', 'github', NOW())")
+        for telegram_id in telegram_ids:
+            cur.execute("INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id", (telegram_id,))
+            cur.execute("INSERT INTO subscriptions (user_id, link_id, created_at) VALUES (%s, 1, NOW())", (cur.fetchone()[0],))
+
+@pytest.mark.parametrize("backend", SERVICES)
+def test_fan_out_reads_from_replica(replica_databases, backend):
+    primary_url, replica_url = replica_databases
+    subscribe(primary_url, 1)
+    subscribe(replica_url, 2)
+    service = SERVICES[backend](primary_url, ReplicaRouter([replica_url]))
+
+    assert service.get_users_by_link_id(1, 0, 10) == [2]
+
+@pytest.mark.parametrize("backend", SERVICES)
+def test_fan_out_falls_back_to_primary(replica_databases, backend):
+    primary_url, _ = replica_databases
+    subscribe(primary_url, 1)
+    service = SERVICES[backend](primary_url, ReplicaRouter([UNREACHABLE_REPLICA]))
+
+    assert service.get_users_by_link_id(1, 0, 10) == [1]
+
+@pytest.mark.parametrize("backend", SERVICES)
+def test_reload_after_notify_reads_from_primary(replica_databases, backend):
+    primary_url, replica_url = replica_databases
+    subscribe(primary_url, 1)
+    subscribe(replica_url, 2)
+    router = ReplicaRouter([replica_url])
+    service = SERVICES[backend](primary_url, router)
+    listener = SubscriptionChangeListener(SubscriberCache(), router=router)
+
+    listener.handle_notify("1")
+
+    # The replica stands in for one that has not replayed the change yet.
+    assert service.get_users_by_link_id(1, 0, 10) == [1]
+    assert router.choose(2) == replica_url
+
+@pytest.mark.parametrize("backend", SERVICES)
+def test_all_pages_of_one_fan_out_come_from_one_replica(replica_databases, backend):
+    first_url, second_url = replica_databases
+    subscribe_all(first_url, [1, 2, 3])
+    subscribe_all(second_url, [4, 5, 6])
+    # Both instances act as replicas that disagree; rotating per page would mix their subscribers.
+    service = SERVICES[backend](first_url, ReplicaRouter([first_url, second_url]))
+
+    loads = [service.get_all_users_by_link_id(1, 1) for _ in range(2)]
+
+    assert sorted(loads) == [[1, 2, 3], [4, 5, 6]]
@@ -0,0 +1,48 @@
+from array import array
+
+from src.notification_service.subscriber_cache import (
+    SubscriberCache,
+    SubscriptionChangeListener,
+    ENTRY_OVERHEAD_BYTES,
+)
+
+def entry_size(count: int) -> int:
+    return count * 8 + ENTRY_OVERHEAD_BYTES
+
+def test_cache_hits_and_misses():
+    cache = SubscriberCache(max_bytes=1024)
+
+    assert cache.get(1) is None
+    cache.put(1, array("q", [10, 20]))
+
+    assert list(cache.get(1)) == [10, 20]
+    assert cache.hit_rate() == 0.5
+
+def test_cache_evicts_least_recently_used_within_budget():
+    cache = SubscriberCache(max_bytes=2 * entry_size(4))
+    cache.put(1, array("q", range(4)))
+    cache.put(2, array("q", range(4)))
+    cache.get(1)
+    cache.put(3, array("q", range(4)))
+
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.size_bytes == 2 * entry_size(4)
+
+def test_cache_skips_lists_larger_than_budget():
+    cache = SubscriberCache(max_bytes=entry_size(2))
+    cache.put(1, array("q", range(3)))
+
+    assert cache.get(1) is None
+    assert cache.size_bytes == 0
+
+def test_notify_invalidates_link_and_stale_loads_are_dropped():
+    cache = SubscriberCache(max_bytes=1024)
+    listener = SubscriptionChangeListener(cache)
+    cache.put(1, array("q", [10]))
+
+    generation = cache.generation
+    listener.handle_notify("1")
+    cache.put(1, array("q", [10]), generation)
+
+    assert cache.get(1) is None
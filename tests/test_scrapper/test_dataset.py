@@ -0,0 +1,34 @@
+import time
+from collections import Counter
+
+from benchmarks.dataset import DatasetSpec, link_rows, subscription_rows, timestamps
+
+SPEC = DatasetSpec(users=2000, links=5000, subscriptions=20000, updates=0, seed=7)
+STAMPS = timestamps(time.time())
+
+def parse(rows):
+    return [row.rstrip("\n").split("\t") for row in rows]
+
+def test_same_seed_gives_same_rows():
+    assert list(subscription_rows(SPEC, STAMPS)) == list(subscription_rows(SPEC, STAMPS))
+    assert list(link_rows(SPEC, STAMPS)) != list(link_rows(DatasetSpec(links=5000, seed=8), STAMPS))
+
+def test_subscriptions_are_unique_per_user_and_power_law():
+    rows = parse(subscription_rows(SPEC, STAMPS))
+    pairs = [(user_id, link_id) for _, user_id, link_id, _ in rows]
+
+    assert len(pairs) == len(set(pairs))
+    assert 0.5 * SPEC.subscriptions < len(rows) < 1.5 * SPEC.subscriptions
+    per_link = Counter(link_id for _, link_id in pairs)
+    per_user = Counter(user_id for user_id, _ in pairs)
+    # A handful of links and users carry far more than the average.
+    assert per_link.most_common(1)[0][1] > 20 * len(rows) / SPEC.links
+    assert per_user.most_common(1)[0][1] > 10 * len(rows) / SPEC.users
+
+def test_links_match_type_check():
+    rows = parse(link_rows(SPEC, STAMPS))
+    types = Counter(link_type for _, _, link_type, _ in rows)
+
+    assert set(types) == {"stackoverflow", "github"}
+    assert all(("stackoverflow.com" in url) == (link_type == "stackoverflow") for _, url, link_type, _ in rows)
+    assert len({url for _, url, _, _ in rows}) == SPEC.links
@@ -0,0 +1,13 @@
+import pytest
+
+from benchmarks.db_statements import MODES, run_benchmark
+from tests.query_plans import SEARCH_PATH_OPTIONS, SEED_LINK_ID
+
+@pytest.mark.asyncio
+async def test_short_run_reports_both_modes_for_every_case(plan_database):
+    result = await run_benchmark(dsn=plan_database, options=SEARCH_PATH_OPTIONS, calls=10, link_id=SEED_LINK_ID)
+
+    assert set(result["cases"]) == {"subscriptions_page", "subscriptions", "links", "link_updates", "subscribers", "all_subscribers"}
+    for stats in result["cases"].values():
+        assert all(stats[mode]["p50_us"] <= stats[mode]["p99_us"] for mode in MODES)
+        assert stats["p50_speedup"] > 0
@@ -0,0 +1,66 @@
+import psycopg2
+import pytest
+
+from src.prepared_statements import PreparedStatements, to_positional
+
+STATEMENTS = {
+    "add_one": "SELECT %s::int + 1",
+    "divide": "SELECT 10 / %s::int",
+}
+
+def prepared_names(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT name FROM pg_prepared_statements ORDER BY name")
+        return [row[0] for row in cur.fetchall()]
+
+def test_placeholders_become_positional():
+    assert to_positional("SELECT %s, %s FROM t LIMIT %s") == "SELECT $1, $2 FROM t LIMIT $3"
+    assert to_positional("SELECT 1") == "SELECT 1"
+
+def test_statement_is_prepared_once_and_cursor_reused(plan_database):
+    conn = psycopg2.connect(plan_database)
+    statements = PreparedStatements(STATEMENTS)
+
+    cursors = {id(statements.execute(conn, "add_one", (i,))) for i in range(3)}
+
+    assert statements.execute(conn, "add_one", (41,)).fetchone() == (42,)
+    assert len(cursors) == 1
+    assert prepared_names(conn) == ["add_one"]
+    conn.close()
+
+def test_failed_call_resyncs_prepared_names(plan_database):
+    conn = psycopg2.connect(plan_database)
+    statements = PreparedStatements(STATEMENTS)
+
+    with pytest.raises(psycopg2.errors.DivisionByZero):
+        statements.execute(conn, "divide", (0,))
+    conn.rollback()
+    # PREPARE survived the failed EXECUTE, so it must not be sent again.
+    assert statements.execute(conn, "divide", (5,)).fetchone() == (2,)
+
+    statements.execute(conn, "add_one", (1,))
+    with conn.cursor() as cur:
+        cur.execute("DEALLOCATE ALL")
+    with pytest.raises(psycopg2.errors.InvalidSqlStatementName):
+        statements.execute(conn, "add_one", (1,))
+    conn.rollback()
+    assert statements.execute(conn, "add_one", (1,)).fetchone() == (2,)
+    conn.close()
+
+def test_disabled_statements_run_as_plain_queries(plan_database):
+    conn = psycopg2.connect(plan_database)
+    statements = PreparedStatements(STATEMENTS, enabled=False)
+
+    assert statements.execute(conn, "add_one", (1,)).fetchone() == (2,)
+    assert prepared_names(conn) == []
+    conn.close()
+
+def test_resync_rolls_back_aborted_transaction(plan_database):
+    conn = psycopg2.connect(plan_database)
+    statements = PreparedStatements(STATEMENTS)
+
+    with pytest.raises(psycopg2.errors.DivisionByZero):
+        statements.execute(conn, "divide", (0,))
+    # No rollback by the caller: the resync must not run inside the aborted transaction.
+    assert statements.execute(conn, "add_one", (1,)).fetchone() == (2,)
+    conn.close()
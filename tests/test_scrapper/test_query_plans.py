@@ -0,0 +1,128 @@
+import datetime
+
+import psycopg2
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.db_replicas import ReplicaRouter
+from src.prepared_statements import PreparedStatements
+from src.scrapper.database import orm_db
+from src.scrapper.database.db_service import encode_update_cursor
+from src.scrapper.database.orm_db import OrmDatabaseService
+from src.scrapper.database.sql_db import STATEMENTS, SqlDatabaseService
+from src.scrapper.database.update_partitions import month_start, partition_month
+from tests.query_plans import (
+    SEARCH_PATH_OPTIONS,
+    SEED_LINK_ID,
+    SEED_SPEC,
+    SEED_TELEGRAM_ID,
+    explain_seq_scans,
+    migrated_index_names,
+    recording_cursor,
+    scanned_relations,
+)
+
+NEW_URL = "https://github.com/query-plans/{backend}"
+NOW = datetime.datetime.utcnow()
+HISTORY_SINCE = NOW - datetime.timedelta(days=7)
+# Link 1 is the most popular one and has the most seeded updates.
+HISTORY_LINK_ID = 1
+
+# get_all_user_ids reads every subscription by definition and is not on a request path.
+CASES = [
+    ("add_subscription", (SEED_TELEGRAM_ID, NEW_URL)),
+    ("delete_subscription", (SEED_TELEGRAM_ID, NEW_URL)),
+    ("get_subscriptions", (SEED_TELEGRAM_ID,)),
+    ("get_subscriptions_page", (SEED_TELEGRAM_ID, 20)),
+    ("get_subscriptions_page", (SEED_TELEGRAM_ID, 20, 1)),
+    ("get_links", (0, 500)),
+    ("update_last_checked_at", (SEED_LINK_ID,)),
+    ("get_link_updates", (HISTORY_LINK_ID, 20, HISTORY_SINCE)),
+    ("get_link_updates", (HISTORY_LINK_ID, 20, HISTORY_SINCE, encode_update_cursor(NOW, 0))),
+]
+
+def sql_service(url, statements):
+    service = object.__new__(SqlDatabaseService)
+    service.conn = psycopg2.connect(url, options=SEARCH_PATH_OPTIONS, cursor_factory=recording_cursor(statements))
+    service.router = ReplicaRouter(())
+    service.statements = PreparedStatements(STATEMENTS)
+    return service
+
+def orm_service(url, statements):
+    service = object.__new__(OrmDatabaseService)
+    service.engine = create_engine(url, connect_args={"options": SEARCH_PATH_OPTIONS})
+
+    @event.listens_for(service.engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany:
+            statements.append(cursor.mogrify(statement, parameters).decode())
+
+    service.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=service.engine)
+    service.router = ReplicaRouter(())
+    return service
+
+SERVICES = {"sql": sql_service, "orm": orm_service}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+@pytest.mark.parametrize(("method", "args"), CASES, ids=[f"{method}{len(args)}" for method, args in CASES])
+async def test_query_plan_has_no_seq_scan(plan_database, backend, method, args):
+    statements = []
+    service = SERVICES[backend](plan_database, statements)
+    args = tuple(arg.format(backend=backend) if isinstance(arg, str) else arg for arg in args)
+
+    await getattr(service, method)(*args)
+
+    assert statements
+    assert explain_seq_scans(plan_database, statements) == {}
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+async def test_link_history_reads_only_recent_partitions(plan_database, backend):
+    statements = []
+    service = SERVICES[backend](plan_database, statements)
+
+    await service.get_link_updates(HISTORY_LINK_ID, 20, HISTORY_SINCE)
+
+    with psycopg2.connect(plan_database, options=SEARCH_PATH_OPTIONS) as conn, conn.cursor() as cur:
+        cur.execute(f"EXPLAIN (FORMAT JSON) {statements[-1]}")
+        relations = scanned_relations(cur.fetchone()[0][0]["Plan"])
+    months = [partition_month(relation) for relation in relations]
+
+    assert relations
+    assert all(month is None or month >= month_start(HISTORY_SINCE.date()) for month in months)
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+async def test_added_updates_are_paged_newest_first(plan_database, backend):
+    service = SERVICES[backend](plan_database, [])
+    link_id = SEED_SPEC.links
+    # Ahead of every seeded row, so `since` selects only these.
+    since = NOW + datetime.timedelta(minutes=30)
+    updates = [
+        {"link_id": link_id, "created_at": since + datetime.timedelta(minutes=i), "title": f"{backend} {i}"}
+        for i in range(3)
+    ]
+
+    try:
+        await service.add_updates(updates)
+        first = await service.get_link_updates(link_id, 2, since)
+        second = await service.get_link_updates(link_id, 2, since, first["next_cursor"])
+    finally:
+        with psycopg2.connect(plan_database, options=SEARCH_PATH_OPTIONS) as conn, conn.cursor() as cur:
+            cur.execute("DELETE FROM updates WHERE link_id = %s AND created_at >= %s", (link_id, since))
+
+    assert [item["title"] for item in first["items"] + second["items"]] == [f"{backend} {i}" for i in (2, 1, 0)]
+    assert second["next_cursor"] is None
+
+def test_orm_schema_matches_migrations():
+    names = set()
+    for table in orm_db.Base.metadata.tables.values():
+        names |= {index.name for index in table.indexes}
+        names |= {
+            constraint.name for constraint in table.constraints
+            if constraint.name and constraint.name.startswith("uq_")
+        }
+
+    assert names == migrated_index_names()
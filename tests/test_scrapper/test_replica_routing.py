@@ -0,0 +1,170 @@
+import psycopg2
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db_replicas import ReplicaRouter, parse_replica_dsns
+from src.prepared_statements import PreparedStatements
+from src.scrapper.database.orm_db import OrmDatabaseService
+from src.scrapper.database.sql_db import STATEMENTS, SqlDatabaseService
+
+TELEGRAM_ID = 1001
+OTHER_TELEGRAM_ID = 1002
+UNREACHABLE_REPLICA = "postgresql://postgres@127.0.0.1:1/postgres"
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def healthy(replica):
+    pass
+
+def test_reads_rotate_over_healthy_replicas():
+    router = ReplicaRouter(["a", "b"], check=healthy)
+
+    assert [router.choose() for _ in range(3)] == ["a", "b", "a"]
+
+def test_reads_stick_to_primary_after_own_write():
+    clock = Clock()
+    router = ReplicaRouter(["a"], check=healthy, sticky_seconds=5, clock=clock)
+
+    router.record_write(TELEGRAM_ID)
+
+    assert router.choose(TELEGRAM_ID) is None
+    assert router.choose(OTHER_TELEGRAM_ID) == "a"
+    clock.now = 5
+    assert router.choose(TELEGRAM_ID) == "a"
+
+def test_failed_replica_is_skipped_until_retry():
+    clock = Clock()
+    failing = {"a"}
+
+    def check(replica):
+        if replica in failing:
+            raise ConnectionError(replica)
+
+    router = ReplicaRouter(["a", "b"], check=check, check_interval=1, retry_seconds=30, clock=clock)
+
+    assert [router.choose() for _ in range(2)] == ["b", "b"]
+    failing.clear()
+    clock.now = 29
+    assert router.choose() == "b"
+    clock.now = 30
+    assert {router.choose(), router.choose()} == {"a", "b"}
+
+def test_health_is_checked_at_most_once_per_interval():
+    clock = Clock()
+    checks = []
+    router = ReplicaRouter(["a"], check=checks.append, check_interval=5, clock=clock)
+
+    for _ in range(3):
+        router.choose()
+    clock.now = 5
+    router.choose()
+
+    assert checks == ["a", "a"]
+
+def test_without_replicas_everything_reads_from_primary():
+    router = ReplicaRouter(parse_replica_dsns(" , "))
+
+    assert router.choose() is None
+
+def sql_service(primary_url, router):
+    service = object.__new__(SqlDatabaseService)
+    service.conn = psycopg2.connect(primary_url)
+    service.router = router
+    service.replica_conns = {}
+    service.statements = PreparedStatements(STATEMENTS)
+    return service
+
+def orm_service(primary_url, router):
+    service = object.__new__(OrmDatabaseService)
+    service.engine = create_engine(primary_url)
+    service.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=service.engine)
+    service.router = router
+    service.replica_sessions = {}
+    return service
+
+SERVICES = {"sql": sql_service, "orm": orm_service}
+
+def subscribe(url, telegram_id, link_url):
+    with psycopg2.connect(url) as conn, conn.cursor() as cur:
+        cur.execute("INSERT INTO users (telegram_id) VALUES (%s) RETURNING user_id", (telegram_id,))
+        user_id = cur.fetchone()[0]
+        cur.execute(
+            "INSERT INTO links (url, type, last_checked_at) VALUES (%s, 'github', NOW()) RETURNING link_id",
+            (link_url,),
+        )
+        cur.execute("INSERT INTO subscriptions (user_id, link_id, created_at) VALUES (%s, %s, NOW())", (user_id, cur.fetchone()[0]))
+
+def urls(subscriptions):
+    return [subscription["url"] for subscription in subscriptions]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+async def test_reads_go_to_replica_except_right_after_own_write(replica_databases, backend):
+    primary_url, replica_url = replica_databases
+    clock = Clock()
+    service = SERVICES[backend](primary_url, ReplicaRouter([replica_url], sticky_seconds=5, clock=clock))
+    subscribe(replica_url, OTHER_TELEGRAM_ID, "https://github.com/replica/only")
+
+    created = await service.add_subscription(TELEGRAM_ID, "https://github.com/primary/only")
+
+    assert urls(await service.get_subscriptions(TELEGRAM_ID)) == ["https://github.com/primary/only"]
+    assert (await service.get_subscriptions_page(TELEGRAM_ID, 10))["items"] == [created]
+    assert urls(await service.get_subscriptions(OTHER_TELEGRAM_ID)) == ["https://github.com/replica/only"]
+    clock.now = 5
+    # The instances do not replicate, so once stickiness ends the write is not visible.
+    assert await service.get_subscriptions(TELEGRAM_ID) == []
+    assert (await service.get_subscriptions_page(OTHER_TELEGRAM_ID, 10))["items"][0]["url"] == "https://github.com/replica/only"
+    assert [link["url"] for link in await service.get_links(0, 10)] == ["https://github.com/replica/only"]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+async def test_unreachable_replica_falls_back_to_primary(replica_databases, backend):
+    primary_url, _ = replica_databases
+    router = ReplicaRouter([UNREACHABLE_REPLICA])
+    service = SERVICES[backend](primary_url, router)
+    subscribe(primary_url, TELEGRAM_ID, "https://github.com/primary/only")
+
+    assert urls(await service.get_subscriptions(TELEGRAM_ID)) == ["https://github.com/primary/only"]
+    assert router.down_until[UNREACHABLE_REPLICA] > 0
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", SERVICES)
+async def test_replica_failing_mid_read_is_retried_on_primary(replica_databases, backend):
+    primary_url, _ = replica_databases
+    # The health check passes, then the read itself cannot connect.
+    router = ReplicaRouter([UNREACHABLE_REPLICA], check=healthy)
+    service = SERVICES[backend](primary_url, router)
+    subscribe(primary_url, TELEGRAM_ID, "https://github.com/primary/only")
+
+    assert urls(await service.get_subscriptions(TELEGRAM_ID)) == ["https://github.com/primary/only"]
+    assert router.choose() is None
+
+@pytest.mark.asyncio
+async def test_failed_primary_read_does_not_poison_the_connection(replica_databases):
+    primary_url, _ = replica_databases
+    service = sql_service(primary_url, ReplicaRouter([]))
+    subscribe(primary_url, TELEGRAM_ID, "https://github.com/primary/only")
+
+    with pytest.raises(psycopg2.errors.NumericValueOutOfRange):
+        await service.get_subscriptions(2 ** 70)
+
+    assert urls(await service.get_subscriptions(TELEGRAM_ID)) == ["https://github.com/primary/only"]
+    assert [link["url"] for link in await service.get_links(0, 10)] == ["https://github.com/primary/only"]
+
+@pytest.mark.asyncio
+async def test_close_releases_primary_and_replica_connections(replica_databases):
+    primary_url, replica_url = replica_databases
+    service = sql_service(primary_url, ReplicaRouter([replica_url]))
+    await service.get_subscriptions(TELEGRAM_ID)
+    connections = [service.conn, *service.replica_conns.values()]
+
+    service.close()
+
+    assert len(connections) == 2
+    assert all(conn.closed for conn in connections)
@@ -0,0 +1,36 @@
+from src.scrapper.database.db_service import build_subscription_page
+
+def rows(*ids):
+    return [{"id": i, "url": f"https://github.com/a/{i}"} for i in ids]
+
+def test_first_page_has_only_next_cursor():
+    page = build_subscription_page(rows(1, 2, 3), limit=2)
+
+    assert [item["id"] for item in page["items"]] == [1, 2]
+    assert page["next_cursor"] == 2
+    assert page["prev_cursor"] is None
+
+def test_last_page_has_only_prev_cursor():
+    page = build_subscription_page(rows(3, 4), limit=2, after=2)
+
+    assert page["next_cursor"] is None
+    assert page["prev_cursor"] == 3
+
+def test_backward_page_is_returned_in_ascending_order():
+    page = build_subscription_page(rows(4, 3, 2), limit=2, before=5)
+
+    assert [item["id"] for item in page["items"]] == [3, 4]
+    assert page["prev_cursor"] == 3
+    assert page["next_cursor"] == 4
+
+def test_backward_page_reaching_the_start_has_no_prev_cursor():
+    page = build_subscription_page(rows(2, 1), limit=2, before=3)
+
+    assert [item["id"] for item in page["items"]] == [1, 2]
+    assert page["prev_cursor"] is None
+
+def test_empty_page_after_deletions_still_links_back():
+    page = build_subscription_page([], limit=2, after=10)
+
+    assert page["items"] == []
+    assert page["prev_cursor"] == 11
@@ -0,0 +1,108 @@
+import datetime
+
+import psycopg2
+import pytest
+
+from src.scrapper import subscription_service
+from src.scrapper.database.db_service import build_update_page, decode_update_cursor, encode_update_cursor
+from src.scrapper.database.update_partitions import (
+    expired_partitions,
+    maintain_update_partitions,
+    months_to_keep,
+    partition_name,
+)
+from src.scrapper.subscription_service import SubscriptionService
+
+TODAY = datetime.date(2026, 3, 15)
+
+def test_partitions_cover_retention_window_and_months_ahead():
+    months = months_to_keep(TODAY, retention_days=60, months_ahead=2)
+
+    assert [partition_name(month) for month in months] == [
+        "updates_p2026_01", "updates_p2026_02", "updates_p2026_03", "updates_p2026_04", "updates_p2026_05",
+    ]
+
+def test_only_partitions_entirely_past_retention_expire():
+    names = ["updates_p2025_12", "updates_p2026_01", "updates_p2026_02", "updates_default", "updates_archive"]
+
+    # The cutoff is 2026-01-14, so January still holds rows that must be kept.
+    assert expired_partitions(names, TODAY, retention_days=60) == ["updates_p2025_12"]
+
+def test_months_roll_over_the_year():
+    months = months_to_keep(datetime.date(2026, 12, 31), retention_days=0, months_ahead=1)
+
+    assert [partition_name(month) for month in months] == ["updates_p2026_12", "updates_p2027_01"]
+
+def test_update_cursor_round_trips():
+    created_at = datetime.datetime(2026, 3, 15, 12, 30, 1, 5)
+
+    assert decode_update_cursor(encode_update_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_update_cursor("42")
+
+def test_update_page_continues_from_the_oldest_returned_row():
+    rows = [
+        (3, 1, datetime.datetime(2026, 3, 15, 12), "c", None, None),
+        (2, 1, datetime.datetime(2026, 3, 15, 11), "b", None, None),
+        (1, 1, datetime.datetime(2026, 3, 15, 10), "a", None, None),
+    ]
+
+    page = build_update_page(rows, limit=2)
+
+    assert [item["id"] for item in page["items"]] == [3, 2]
+    assert decode_update_cursor(page["next_cursor"]) == (datetime.datetime(2026, 3, 15, 11), 2)
+    assert build_update_page(rows[2:], limit=2)["next_cursor"] is None
+
+def test_partition_maintenance_survives_rows_stranded_in_default(replica_databases):
+    primary_url, _ = replica_databases
+    conn = psycopg2.connect(primary_url)
+    with conn.cursor() as cur:
+        cur.execute("CREATE TABLE updates_default PARTITION OF updates DEFAULT")
+        cur.execute("CREATE TABLE updates_p2025_10 PARTITION OF updates FOR VALUES FROM ('2025-10-01') TO ('2025-11-01')")
+        cur.execute("INSERT INTO links (url, type, last_checked_at) VALUES ('https://github.com/a/b', 'github', NOW())")
+        cur.execute("INSERT INTO updates (link_id, created_at, title) VALUES (1, '2026-04-10', 'stranded')")
+        # A leftover table that is not a partition makes creating May fail.
+        cur.execute("CREATE TABLE updates_p2026_05 (id INT)")
+    conn.commit()
+
+    result = maintain_update_partitions(conn, today=TODAY, retention_days=60, months_ahead=2)
+
+    assert result["created"] == ["updates_p2026_01", "updates_p2026_02", "updates_p2026_03", "updates_p2026_04"]
+    assert result["dropped"] == ["updates_p2025_10"]
+    with conn.cursor() as cur:
+        cur.execute("SELECT tableoid::regclass::text, title FROM updates")
+        assert cur.fetchall() == [("updates_p2026_04", "stranded")]
+    conn.close()
+
+class FakeDatabaseService:
+    def __init__(self, links):
+        self.links = links
+        self.batches = []
+
+    async def get_links(self, offset, limit):
+        return self.links[offset:offset + limit]
+
+    async def update_last_checked_at(self, link_id):
+        pass
+
+    async def add_updates(self, updates):
+        self.batches.append([update["link_id"] for update in updates])
+
+@pytest.mark.asyncio
+async def test_sweep_records_updates_in_batches(monkeypatch):
+    monkeypatch.setattr(subscription_service, "UPDATES_INSERT_BATCH_SIZE", 2)
+    db_service = FakeDatabaseService([{"link_id": i, "url": f"https://github.com/a/{i}"} for i in range(5)])
+    service = SubscriptionService(db_service, stackoverflow_client=None, github_client=None)
+
+    async def check_for_updates(link):
+        return True
+
+    async def send_update_notification(link):
+        return {"link_id": link["link_id"], "title": None, "user_name": None, "preview": None}
+
+    monkeypatch.setattr(service, "_check_for_updates", check_for_updates)
+    monkeypatch.setattr(service, "_send_update_notification", send_update_notification)
+
+    await service.check_updates()
+
+    assert db_service.batches == [[0, 1], [2, 3], [4]]
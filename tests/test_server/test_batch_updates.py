@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+from fastapi import HTTPException
+
+from src.server import main
+from src.server.telegram_client import SendScheduler
+
+UPDATE = {"url": "https://github.com/a/b", "last_update": "now", "title": "t", "preview": ""}
+
+class QueueingClient:
+    def __init__(self, scheduler: SendScheduler):
+        self.scheduler = scheduler
+
+    def enqueue_message(self, user_id, message, priority=1):
+        return self.scheduler.try_enqueue(user_id, message, priority)
+
+@pytest.mark.asyncio
+async def test_batch_is_rendered_once_and_queued_per_recipient():
+    sent = []
+
+    async def send(chat_id, message):
+        sent.append(chat_id)
+
+    scheduler = SendScheduler(send, global_rate=1000, per_chat_interval=0)
+    scheduler.start()
+    batch = main.UpdateBatch(update=main.UpdateBody(**UPDATE), user_ids=[1, 2, 3])
+
+    response = await main.send_update_batch(batch, telegram_client=QueueingClient(scheduler))
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    assert response == {"status": "ok", "accepted": [1, 2, 3], "rejected": []}
+    assert sorted(sent) == [1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_recipients_over_queue_limit_are_rejected():
+    scheduler = SendScheduler(mock.AsyncMock(), global_rate=1000, per_chat_interval=0, max_queue=2)
+    scheduler.dispatcher = asyncio.get_running_loop().create_future()
+    batch = main.UpdateBatch(update=main.UpdateBody(**UPDATE), user_ids=[1, 2, 3])
+
+    response = await main.send_update_batch(batch, telegram_client=QueueingClient(scheduler))
+
+    assert response["accepted"] == [1, 2]
+    assert response["rejected"] == [3]
+
+@pytest.mark.asyncio
+async def test_failed_queued_send_goes_to_dlq(mocker):
+    send_to_dlq = mocker.patch.object(main, "send_to_dlq", new=mock.AsyncMock())
+    scheduler = SendScheduler(mock.AsyncMock(side_effect=RuntimeError("blocked")), global_rate=1000, per_chat_interval=0)
+    scheduler.start()
+    batch = main.UpdateBatch(update=main.UpdateBody(**UPDATE), user_ids=[7])
+
+    await main.send_update_batch(batch, telegram_client=QueueingClient(scheduler))
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    send_to_dlq.assert_awaited_once()
+    assert send_to_dlq.await_args.args[0].key == b"7"
+
+@pytest.mark.asyncio
+async def test_single_update_failure_raises_http_exception():
+    telegram_client = SimpleNamespace(send_message=mock.AsyncMock(side_effect=RuntimeError("down")))
+
+    with pytest.raises(HTTPException):
+        await main.send_update_notification(main.UpdateNotification(user_id=1, **UPDATE), telegram_client=telegram_client)
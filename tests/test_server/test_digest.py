@@ -0,0 +1,186 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.server import main
+from src.server.digest import TELEGRAM_MESSAGE_LIMIT, DigestBuffer, DigestPreferences, RedisDigestStore, render_digest
+
+def make_update(user_id: int, title: str) -> main.UpdateNotification:
+    return main.UpdateNotification(user_id=user_id, url=f"https://github.com/{title}", last_update="now", title=title)
+
+class StaticPreferences:
+    def __init__(self, users):
+        self.users = set(users)
+
+    async def is_enabled(self, user_id):
+        return user_id in self.users
+
+    async def enabled_users(self, user_ids):
+        return self.users.intersection(user_ids)
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_when_window_expires():
+    flushed = []
+
+    async def flush(user_id, updates):
+        flushed.append((user_id, [update.title for update in updates]))
+
+    buffer = DigestBuffer(flush, window=0.05, max_items=10)
+    await buffer.add(make_update(1, "a"))
+    await buffer.add(make_update(1, "b"))
+    await buffer.add(make_update(2, "c"))
+    await asyncio.sleep(0.1)
+
+    assert sorted(flushed) == [(1, ["a", "b"]), (2, ["c"])]
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_early_at_max_items():
+    flushed = []
+
+    async def flush(user_id, updates):
+        flushed.append(len(updates))
+
+    buffer = DigestBuffer(flush, window=60, max_items=3)
+    for title in "abc":
+        await buffer.add(make_update(1, title))
+    await asyncio.sleep(0)
+
+    assert flushed == [3]
+    assert buffer.timers == {}
+
+@pytest.mark.asyncio
+async def test_add_does_not_wait_for_the_early_flush():
+    sending = asyncio.Event()
+    flushed = []
+
+    async def flush(user_id, updates):
+        await sending.wait()
+        flushed.append(len(updates))
+
+    buffer = DigestBuffer(flush, window=60, max_items=2)
+    await buffer.add(make_update(1, "a"))
+    assert await asyncio.wait_for(buffer.add(make_update(1, "b")), timeout=1) == 0
+    assert flushed == [] and len(buffer.flushing) == 1
+
+    sending.set()
+    await buffer.flush_all()
+
+    assert flushed == [2]
+    assert not buffer.flushing
+
+def test_digest_lists_every_update():
+    [(message, listed)] = render_digest([make_update(1, "a"), make_update(1, "b")])
+
+    assert message.startswith("Дайджест: 2 обновлений")
+    assert "https://github.com/a" in message and "https://github.com/b" in message
+    assert [update.title for update in listed] == ["a", "b"]
+
+def test_long_digest_is_split_without_dropping_updates():
+    updates = [make_update(1, f"{i:03d}" + "x" * 200) for i in range(60)]
+
+    parts = render_digest(updates)
+
+    assert len(parts) > 1
+    assert all(len(message) <= TELEGRAM_MESSAGE_LIMIT for message, _ in parts)
+    assert [update for _, listed in parts for update in listed] == updates
+    assert all(update.url in message for message, listed in parts for update in listed)
+
+@pytest.mark.asyncio
+async def test_only_unsent_digest_parts_go_to_dlq(mocker):
+    send_message = mock.AsyncMock(side_effect=[None, RuntimeError("flood wait")])
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    send_to_dlq = mocker.patch.object(main, "send_to_dlq", mock.AsyncMock())
+    updates = [make_update(1, f"{i:03d}" + "x" * 200) for i in range(30)]
+    parts = render_digest(updates)
+
+    await main.send_digest(1, updates)
+
+    assert send_message.await_count == 2
+    assert send_to_dlq.await_count == len(updates) - len(parts[0][1])
+
+@pytest.mark.asyncio
+async def test_batch_recipients_in_digest_mode_are_buffered(mocker):
+    mocker.patch.object(main, "digest_preferences", StaticPreferences({1}))
+    mocker.patch.object(main, "digest_buffer", DigestBuffer(mock.AsyncMock(), window=60, max_items=10))
+    telegram_client = SimpleNamespace(enqueue_message=mock.Mock(return_value=asyncio.get_running_loop().create_future()))
+    batch = main.UpdateBatch(update=main.UpdateBody(url="https://github.com/a/b", last_update="now"), user_ids=[1, 2])
+
+    response = await main.send_update_batch(batch, telegram_client=telegram_client)
+
+    assert response["accepted"] == [1, 2]
+    assert [update.user_id for update in main.digest_buffer.pending[1]] == [1]
+    telegram_client.enqueue_message.assert_called_once()
+
+@pytest.mark.asyncio
+async def test_opted_in_users_get_one_message_per_digest(mocker):
+    send_message = mock.AsyncMock()
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    mocker.patch.object(main, "digest_preferences", StaticPreferences({1}))
+    mocker.patch.object(main, "digest_buffer", DigestBuffer(main.send_digest, window=60, max_items=10))
+
+    for title in ("a", "b", "c"):
+        msg = SimpleNamespace(key=b"1", value=json.dumps(make_update(1, title).model_dump(exclude_none=True)).encode(), headers=())
+        assert await main.deliver_update(msg)
+    send_message.assert_not_awaited()
+
+    await main.digest_buffer.flush_all()
+
+    send_message.assert_awaited_once()
+    assert send_message.await_args.args[1].startswith("Дайджест: 3")
+
+@pytest.mark.asyncio
+async def test_batch_preferences_are_read_in_one_round_trip():
+    fakeredis = pytest.importorskip("fakeredis")
+    client = fakeredis.aioredis.FakeRedis()
+    preferences = DigestPreferences(client)
+    await client.sadd(preferences.key, "1", "3")
+    await preferences.set_enabled(2, False)
+    calls = []
+    smismember = client.smismember
+
+    async def recording_smismember(key, values):
+        calls.append(values)
+        return await smismember(key, values)
+
+    client.smismember = recording_smismember
+
+    assert await preferences.enabled_users([1, 2, 3, 4]) == {1, 3}
+    assert await preferences.enabled_users([1, 2, 3, 4]) == {1, 3}
+    assert calls == [["1", "3", "4"]]
+
+@pytest.mark.asyncio
+async def test_buffered_updates_survive_a_restart():
+    fakeredis = pytest.importorskip("fakeredis")
+    store = RedisDigestStore(fakeredis.aioredis.FakeRedis(), main.UpdateNotification)
+    buffer = DigestBuffer(mock.AsyncMock(), window=60, max_items=10, store=store)
+    await buffer.add(make_update(1, "a"))
+    await buffer.add(make_update(1, "b"))
+    for timer in buffer.timers.values():
+        timer.cancel()
+
+    flushed = []
+
+    async def flush(user_id, updates):
+        flushed.append((user_id, [update.title for update in updates]))
+
+    restarted = DigestBuffer(flush, window=60, max_items=10, store=store)
+    assert await restarted.restore() == 2
+    await restarted.flush_all()
+
+    assert flushed == [(1, ["a", "b"])]
+    assert await store.load() == {}
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_updates_in_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    store = RedisDigestStore(fakeredis.aioredis.FakeRedis(), main.UpdateNotification)
+    buffer = DigestBuffer(mock.AsyncMock(side_effect=RuntimeError("kafka is down")), window=60, max_items=10, store=store)
+    await buffer.add(make_update(1, "a"))
+
+    await buffer.flush(1)
+
+    assert [update.title for update in buffer.pending[1]] == ["a"]
+    assert [update.title for update in (await store.load())[1]] == ["a"]
+    await buffer.flush_all()
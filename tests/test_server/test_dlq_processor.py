@@ -0,0 +1,103 @@
+import asyncio
+import json
+import time
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.server import main
+
+def make_message(headers=()):
+    value = {"user_id": 1, "url": "https://github.com/a/b", "last_update": "now", "title": "t", "preview": ""}
+    return SimpleNamespace(key=b"1", value=json.dumps(value).encode(), offset=0, headers=tuple(headers))
+
+def sent_headers(producer) -> dict:
+    return dict(producer.send_and_wait.await_args.kwargs["headers"])
+
+@pytest.mark.asyncio
+async def test_failed_delivery_is_dead_lettered_with_backoff_headers(mocker):
+    producer = mocker.patch.object(main, "kafka_dlq_producer", SimpleNamespace(send_and_wait=mock.AsyncMock()))
+    msg = make_message([(main.ATTEMPT_HEADER, b"2"), ("trace", b"abc")])
+
+    before = time.time()
+    await main.send_to_dlq(msg)
+
+    headers = sent_headers(producer)
+    assert headers[main.ATTEMPT_HEADER] == b"3"
+    assert headers["trace"] == b"abc"
+    assert float(headers[main.NEXT_ATTEMPT_HEADER]) >= before + main.dlq_backoff(3)
+
+def test_backoff_grows_exponentially_up_to_the_cap(mocker):
+    mocker.patch.object(main, "DLQ_BACKOFF_BASE_SECONDS", 1)
+    mocker.patch.object(main, "DLQ_MAX_BACKOFF_SECONDS", 5)
+
+    assert [main.dlq_backoff(attempt) for attempt in range(1, 6)] == [1, 2, 4, 5, 5]
+
+@pytest.mark.asyncio
+async def test_retry_waits_until_next_attempt_and_delivers(mocker):
+    send_message = mock.AsyncMock()
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    msg = make_message([(main.ATTEMPT_HEADER, b"1"), (main.NEXT_ATTEMPT_HEADER, str(time.time() + 0.1).encode())])
+
+    started = time.monotonic()
+    outcome = await main.retry_dead_letter(msg)
+
+    assert outcome == "delivered"
+    assert time.monotonic() - started >= 0.09
+    send_message.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_exhausted_message_goes_to_parking_lot(mocker):
+    producer = mocker.patch.object(main, "kafka_dlq_producer", SimpleNamespace(send_and_wait=mock.AsyncMock()))
+    send_message = mock.AsyncMock()
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    msg = make_message([(main.ATTEMPT_HEADER, str(main.DLQ_MAX_ATTEMPTS).encode())])
+
+    outcome = await main.retry_dead_letter(msg)
+
+    assert outcome == "parked"
+    assert producer.send_and_wait.await_args.kwargs["topic"] == main.KAFKA_PARKING_LOT_TOPIC
+    send_message.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_reinject_mode_republishes_to_main_topic(mocker):
+    producer = mocker.patch.object(main, "kafka_dlq_producer", SimpleNamespace(send_and_wait=mock.AsyncMock()))
+    mocker.patch.object(main, "DLQ_RETRY_MODE", "REINJECT")
+    msg = make_message([(main.ATTEMPT_HEADER, b"1")])
+
+    outcome = await main.retry_dead_letter(msg)
+
+    assert outcome == "reinjected"
+    assert producer.send_and_wait.await_args.kwargs["topic"] == main.KAFKA_TOPIC_TO_SERVER
+    assert sent_headers(producer)[main.ATTEMPT_HEADER] == b"1"
+
+@pytest.mark.asyncio
+async def test_drain_leaves_retries_that_are_not_due_uncommitted(mocker):
+    mocker.patch.object(main, "draining", asyncio.Event())
+    send_message = mock.AsyncMock()
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    due = make_message([(main.ATTEMPT_HEADER, b"1")])
+    later = make_message([(main.ATTEMPT_HEADER, b"1"), (main.NEXT_ATTEMPT_HEADER, str(time.time() + 60).encode())])
+    due.offset, later.offset = 10, 11
+
+    retry = asyncio.create_task(main.retry_partition([due, later]))
+    await asyncio.sleep(0.01)
+    main.draining.set()
+
+    assert await asyncio.wait_for(retry, timeout=1) == 11
+    send_message.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_retry_due_later_does_not_hold_back_messages_behind_it(mocker):
+    producer = mocker.patch.object(main, "kafka_dlq_producer", SimpleNamespace(send_and_wait=mock.AsyncMock()))
+    send_message = mock.AsyncMock()
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    later = make_message([(main.ATTEMPT_HEADER, b"3"), (main.NEXT_ATTEMPT_HEADER, str(time.time() + 60).encode())])
+    due = make_message([(main.ATTEMPT_HEADER, b"1")])
+    later.offset, due.offset = 10, 11
+
+    assert await asyncio.wait_for(main.retry_partition([later, due]), timeout=1) == 12
+
+    send_message.assert_awaited_once()
+    assert producer.send_and_wait.await_args.kwargs["topic"] == main.KAFKA_DLQ_TOPIC
+    assert sent_headers(producer) == dict(later.headers)
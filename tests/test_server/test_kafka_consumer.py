@@ -0,0 +1,44 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+from unittest import mock
+
+from src.server import main
+
+def make_message(user_id: int, title: str, offset: int):
+    value = {"user_id": user_id, "url": "https://github.com/a/b", "last_update": "now", "title": title, "preview": ""}
+    return SimpleNamespace(key=str(user_id).encode(), value=json.dumps(value).encode(), offset=offset)
+
+@pytest.mark.asyncio
+async def test_batch_keeps_per_user_order_and_runs_users_concurrently(mocker):
+    sent = []
+    in_flight = 0
+    max_in_flight = 0
+
+    async def send_message(user_id, message):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        sent.append((user_id, message.splitlines()[0]))
+        in_flight -= 1
+
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    messages = [make_message(user_id, f"t{i}", i) for i in range(3) for user_id in (1, 2, 3)]
+
+    await main.process_batch(messages, asyncio.Semaphore(8))
+
+    for user_id in (1, 2, 3):
+        assert [title for uid, title in sent if uid == user_id] == ["Обновление: t0", "Обновление: t1", "Обновление: t2"]
+    assert max_in_flight == 3
+
+@pytest.mark.asyncio
+async def test_failed_send_goes_to_dlq(mocker):
+    send_message = mock.AsyncMock(side_effect=RuntimeError("flood"))
+    mocker.patch.object(main.app, "tg_client", SimpleNamespace(send_message=send_message), create=True)
+    send_to_dlq = mocker.patch.object(main, "send_to_dlq", new=mock.AsyncMock())
+
+    await main.process_batch([make_message(1, "t", 0)], asyncio.Semaphore(1))
+
+    send_to_dlq.assert_awaited_once()
@@ -0,0 +1,67 @@
+import pytest
+from telethon.tl.types import InputPeerUser, InputPeerChat
+
+from src.peer_cache import FilePeerStore, PeerCache
+from src.server.telegram_client import TelegramClientManager
+
+class FakeTelegramClient:
+    def __init__(self):
+        self.resolved = []
+        self.sent = []
+
+    async def get_input_entity(self, user_id):
+        self.resolved.append(user_id)
+        return InputPeerUser(user_id=user_id, access_hash=user_id * 10)
+
+    async def send_message(self, entity, message):
+        self.sent.append(entity)
+
+@pytest.mark.asyncio
+async def test_peers_are_shared_through_the_file_store(tmp_path):
+    path = str(tmp_path / "peers.json")
+    bot_cache = PeerCache(FilePeerStore(path))
+    server_cache = PeerCache(FilePeerStore(path))
+
+    await bot_cache.remember(InputPeerUser(user_id=1, access_hash=111))
+    await bot_cache.remember(InputPeerChat(chat_id=2))
+
+    assert await server_cache.warm() == 1
+    assert await server_cache.get_input_peer(1) == InputPeerUser(user_id=1, access_hash=111)
+    assert await server_cache.get_input_peer(2) is None
+
+@pytest.mark.asyncio
+async def test_peer_learned_after_warm_up_is_read_through(tmp_path):
+    path = str(tmp_path / "peers.json")
+    server_cache = PeerCache(FilePeerStore(path))
+    await server_cache.warm()
+
+    await PeerCache(FilePeerStore(path)).remember(InputPeerUser(user_id=5, access_hash=555))
+
+    assert await server_cache.get_input_peer(5) == InputPeerUser(user_id=5, access_hash=555)
+
+@pytest.mark.asyncio
+async def test_send_resolves_a_user_only_once(tmp_path):
+    manager = TelegramClientManager("test", 1, "hash", "token", PeerCache(FilePeerStore(str(tmp_path / "peers.json"))))
+    manager.client = FakeTelegramClient()
+
+    await manager._send_now(7, "first")
+    await manager._send_now(7, "second")
+
+    assert manager.client.resolved == [7]
+    assert manager.client.sent == [InputPeerUser(user_id=7, access_hash=70)] * 2
+
+@pytest.mark.asyncio
+async def test_file_store_reads_the_file_only_after_it_changes(tmp_path, mocker):
+    path = str(tmp_path / "peers.json")
+    store = FilePeerStore(path)
+    await store.put(1, 111)
+    read = mocker.spy(store, "_read")
+
+    assert [await store.get(1) for _ in range(3)] == [111] * 3
+    assert read.call_count == 0
+
+    await FilePeerStore(path).put(2, 222)
+
+    assert await store.get(2) == 222
+    assert await store.get(1) == 111
+    assert read.call_count == 1
@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+import pytest
+
+from src.http_client import AsyncCircuitBreaker, is_server_failure
+from src.server.scrapper_client import ScrapperClient
+
+def make_client(handler, **kwargs) -> ScrapperClient:
+    kwargs.setdefault("backoff_factor", 0)
+    return ScrapperClient("http://scrapper", transport=httpx.MockTransport(handler), **kwargs)
+
+@pytest.mark.asyncio
+async def test_requests_share_one_connection_pool():
+    async def handler(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, json=[{"url": "https://github.com/a/b"}])
+
+    client = make_client(handler)
+    results = await asyncio.gather(*(client.get_subscriptions(user_id) for user_id in range(20)))
+    await client.aclose()
+
+    assert all(result == [{"url": "https://github.com/a/b"}] for result in results)
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        return httpx.Response(503) if len(calls) < 3 else httpx.Response(200, json={"status": "ok"})
+
+    client = make_client(handler, retries=3)
+
+    assert await client.create_subscription(url="https://github.com/a/b", user_id=1) == {"status": "ok"}
+    assert len(calls) == 3
+
+@pytest.mark.asyncio
+async def test_breaker_state_persists_across_requests():
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        raise httpx.ConnectError("scrapper is down")
+
+    breaker = AsyncCircuitBreaker(fail_max=2, reset_timeout=60, is_failure=is_server_failure)
+    client = make_client(handler, retries=0, breaker=breaker)
+
+    for _ in range(5):
+        result = await client.get_subscriptions(1)
+        assert result["status"] == "fallback"
+
+    assert len(calls) == 2
+    assert breaker.state == AsyncCircuitBreaker.OPEN
+
+@pytest.mark.asyncio
+async def test_client_errors_do_not_open_the_breaker():
+    client = make_client(lambda request: httpx.Response(404), retries=0)
+
+    for _ in range(10):
+        await client.delete_subscription(1, "https://github.com/a/b")
+
+    assert client.breaker.state == AsyncCircuitBreaker.CLOSED
+
+@pytest.mark.asyncio
+async def test_half_open_breaker_closes_after_successful_trial():
+    healthy = False
+
+    def handler(request):
+        if not healthy:
+            raise httpx.ConnectError("down")
+        return httpx.Response(200, json=[])
+
+    breaker = AsyncCircuitBreaker(fail_max=1, reset_timeout=0.05, is_failure=is_server_failure)
+    client = make_client(handler, retries=0, breaker=breaker)
+
+    await client.get_subscriptions(1)
+    assert breaker.state == AsyncCircuitBreaker.OPEN
+
+    healthy = True
+    await asyncio.sleep(0.06)
+    assert await client.get_subscriptions(1) == []
+    assert breaker.state == AsyncCircuitBreaker.CLOSED
+
+@pytest.mark.asyncio
+async def test_cancelled_half_open_trial_does_not_block_the_breaker():
+    breaker = AsyncCircuitBreaker(fail_max=1, reset_timeout=0)
+    breaker.state = AsyncCircuitBreaker.OPEN
+
+    trial = asyncio.create_task(breaker.call(lambda: asyncio.sleep(10)))
+    await asyncio.sleep(0)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+
+    assert breaker.trial_in_flight is False
+    assert await breaker.call(lambda: asyncio.sleep(0, result="ok")) == "ok"
+    assert breaker.state == AsyncCircuitBreaker.CLOSED
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import pytest
+from unittest import mock
+from telethon.errors import FloodWaitError
+
+from src.server.telegram_client import SendScheduler, TokenBucket, PRIORITY_HIGH, PRIORITY_LOW
+
+def test_token_bucket_spaces_out_bursts():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    waits = [bucket.reserve() for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.01)
+    assert waits[3] == pytest.approx(0.2, abs=0.01)
+
+@pytest.mark.asyncio
+async def test_higher_priority_messages_are_sent_first():
+    sent = []
+
+    async def send(chat_id, message):
+        sent.append(message)
+
+    scheduler = SendScheduler(send, global_rate=1000, per_chat_interval=0)
+    submissions = [
+        asyncio.create_task(scheduler.submit(1, "low", PRIORITY_LOW)),
+        asyncio.create_task(scheduler.submit(2, "high", PRIORITY_HIGH)),
+    ]
+    await asyncio.sleep(0)
+    scheduler.start()
+    await asyncio.gather(*submissions)
+    await scheduler.stop()
+
+    assert sent == ["high", "low"]
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_block_other_chats():
+    sent = []
+
+    async def send(chat_id, message):
+        sent.append((chat_id, time.monotonic()))
+
+    scheduler = SendScheduler(send, global_rate=1000, per_chat_interval=0.2)
+    scheduler.start()
+    await asyncio.gather(
+        scheduler.submit(1, "a"),
+        scheduler.submit(1, "b"),
+        scheduler.submit(2, "c"),
+    )
+    await scheduler.stop()
+
+    assert [chat_id for chat_id, _ in sent] == [1, 2, 1]
+    assert sent[2][1] - sent[0][1] >= 0.19
+
+@pytest.mark.asyncio
+async def test_flood_wait_pauses_for_requested_seconds_and_retries():
+    attempts = []
+
+    async def send(chat_id, message):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise FloodWaitError(request=None, capture=1)
+
+    scheduler = SendScheduler(send, global_rate=1000, per_chat_interval=0)
+    scheduler.start()
+    await scheduler.submit(1, "a")
+    await scheduler.stop()
+
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 1
+
+@pytest.mark.asyncio
+async def test_drain_waits_for_messages_delayed_by_chat_interval():
+    sent = []
+
+    async def send(chat_id, message):
+        sent.append(message)
+
+    scheduler = SendScheduler(send, global_rate=1000, per_chat_interval=0.1)
+    scheduler.start()
+    submissions = [asyncio.create_task(scheduler.submit(1, text)) for text in ("a", "b")]
+    await asyncio.sleep(0.01)
+
+    assert await scheduler.drain(timeout=1)
+    await scheduler.stop()
+    await asyncio.gather(*submissions)
+
+    assert sent == ["a", "b"]
+
+@pytest.mark.asyncio
+async def test_stop_fails_messages_left_after_drain_deadline():
+    scheduler = SendScheduler(mock.AsyncMock(), global_rate=1000, per_chat_interval=10)
+    scheduler.start()
+    first = asyncio.create_task(scheduler.submit(1, "a"))
+    second = asyncio.create_task(scheduler.submit(1, "b"))
+    await asyncio.sleep(0.01)
+
+    assert not await scheduler.drain(timeout=0.05)
+    await scheduler.stop()
+    await first
+
+    with pytest.raises(ConnectionError):
+        await second
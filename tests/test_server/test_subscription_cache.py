@@ -0,0 +1,114 @@
+import asyncio
+import json
+import pytest
+from types import SimpleNamespace
+
+from src.server import main
+from src.server.subscription_cache import SubscriptionReadCache
+
+class SlowScrapper:
+    def __init__(self):
+        self.calls = 0
+        self.links = [{"url": "https://github.com/a/b"}]
+
+    async def get_subscriptions(self, user_id):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return list(self.links)
+
+@pytest.mark.asyncio
+async def test_concurrent_reads_share_one_upstream_call():
+    cache = SubscriptionReadCache(ttl=60)
+    scrapper = SlowScrapper()
+
+    results = await asyncio.gather(*(cache.get(1, lambda: scrapper.get_subscriptions(1)) for _ in range(10)))
+
+    assert scrapper.calls == 1
+    assert len({etag for etag, _ in results}) == 1
+
+@pytest.mark.asyncio
+async def test_invalidation_discards_result_of_read_in_flight():
+    cache = SubscriptionReadCache(ttl=60)
+    scrapper = SlowScrapper()
+
+    read = asyncio.create_task(cache.get(1, lambda: scrapper.get_subscriptions(1)))
+    await asyncio.sleep(0)
+    scrapper.links.append({"url": "https://github.com/c/d"})
+    cache.invalidate(1)
+    await read
+
+    _, links = await cache.get(1, lambda: scrapper.get_subscriptions(1))
+    assert len(links) == 2
+    assert scrapper.calls == 2
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_the_leader_is_cancelled():
+    cache = SubscriptionReadCache(ttl=60)
+    scrapper = SlowScrapper()
+
+    leader = asyncio.create_task(cache.get(1, lambda: scrapper.get_subscriptions(1)))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(cache.get(1, lambda: scrapper.get_subscriptions(1)))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    _, links = await waiter
+    assert links == scrapper.links
+    assert leader.cancelled()
+    assert scrapper.calls == 2
+
+@pytest.mark.asyncio
+async def test_failed_load_is_not_cached():
+    cache = SubscriptionReadCache(ttl=60)
+
+    async def failing():
+        raise RuntimeError("scrapper down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get(1, failing)
+    assert cache.entries == {}
+
+@pytest.mark.asyncio
+async def test_list_endpoint_returns_etag_and_304(mocker):
+    mocker.patch.object(main, "subscription_read_cache", SubscriptionReadCache(ttl=60))
+    scrapper = SlowScrapper()
+
+    response = await main.list_subscriptions(1, if_none_match=None, scrapper_client=scrapper)
+    etag = response.headers["ETag"]
+    assert json.loads(response.body) == scrapper.links
+
+    response = await main.list_subscriptions(1, if_none_match=etag, scrapper_client=scrapper)
+    assert response.status_code == 304
+    assert scrapper.calls == 1
+
+@pytest.mark.asyncio
+async def test_fallback_response_is_not_cached(mocker):
+    mocker.patch.object(main, "subscription_read_cache", SubscriptionReadCache(ttl=60))
+    calls = []
+
+    async def get_subscriptions(user_id):
+        calls.append(user_id)
+        return {"status": "fallback", "message": "GET failed"}
+
+    scrapper = SimpleNamespace(get_subscriptions=get_subscriptions)
+    await main.list_subscriptions(1, if_none_match=None, scrapper_client=scrapper)
+    await main.list_subscriptions(1, if_none_match=None, scrapper_client=scrapper)
+
+    assert calls == [1, 1]
+
+@pytest.mark.asyncio
+async def test_pages_are_cached_per_cursor_and_invalidated_together(mocker):
+    mocker.patch.object(main, "subscription_read_cache", SubscriptionReadCache(ttl=60))
+    calls = []
+
+    async def get_subscriptions_page(user_id, limit, after=None, before=None):
+        calls.append(after)
+        return {"items": [], "next_cursor": None, "prev_cursor": after}
+
+    scrapper = SimpleNamespace(get_subscriptions_page=get_subscriptions_page)
+    for after in (None, 20, None, 20):
+        await main.list_subscriptions(1, limit=20, after=after, if_none_match=None, scrapper_client=scrapper)
+    main.subscription_read_cache.invalidate(1)
+    await main.list_subscriptions(1, limit=20, after=20, if_none_match=None, scrapper_client=scrapper)
+
+    assert calls == [None, 20, 20]